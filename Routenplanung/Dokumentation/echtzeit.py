@@ -0,0 +1,224 @@
+import json
+import os
+import queue
+import threading
+import time
+from routen_berechnung import verspaetete_verbindungen
+
+
+# Echtzeitfahrplan: Verspätungsmeldungen aus einem Feed (Datei oder Warteschlange) werden laufend auf einen
+# gemeinsamen Verspätungs-Overlay über dem kompilierten Fahrplan angewendet. Jede Änderung erzeugt einen neuen
+# Overlay (nur die betroffenen Bahnhöfe werden neu berechnet, alle anderen übernommen) und eine neue Version.
+# Anfragen lesen einmal echtzeit["overlay"] und sehen so bis zum Ende einen konsistenten Stand.
+
+
+# erstellt einen leeren Echtzeitfahrplan zu einem kompilierten Fahrplan
+def erstelle_echtzeitfahrplan(kompilierter_fahrplan):
+    return {
+        "kompilierter_fahrplan": kompilierter_fahrplan,
+        # Aktuelle Verspätungen je Abfahrtsbahnhof: {station_id: {(ziel_id, zug_id): (dep_delay, arr_delay)}}
+        "verspaetungen": {},
+        "overlay": {"ersetzt": {}, "zusatz": {}, "zusammengefuehrt": {}},
+        "version": 0,
+        "aktualisiert_um": None,
+        "lock": threading.Lock(),
+        # Wird der Fahrplan ersetzt (neuer Snapshot), leitet der alte Echtzeitfahrplan Meldungen an den neuen weiter
+        "nachfolger": None,
+    }
+
+
+"""
+wendet Verspätungsmeldungen auf den Echtzeitfahrplan an. Jede Meldung ist ein Dictionary mit from_station,
+to_station, train_number, dep_delay und arr_delay (Minuten); eine Verspätung von 0/0 hebt eine frühere Meldung auf.
+Nur die Bahnhöfe, an denen sich etwas geändert hat, werden neu berechnet; der neue Overlay wird danach durch eine
+einzige Zuweisung veröffentlicht. Gibt die neue Version zurück.
+"""
+
+def wende_verspaetungen_an(echtzeit, meldungen):
+    with echtzeit["lock"]:
+        if echtzeit["nachfolger"] is not None:
+            return wende_verspaetungen_an(echtzeit["nachfolger"], meldungen)
+
+        kompiliert = echtzeit["kompilierter_fahrplan"]
+        station_id = kompiliert["station_id"]
+        zug_id = kompiliert["zug_id"]
+
+        # Geänderte Bahnhöfe sammeln (Kopie der Verspätungen je Bahnhof, der alte Stand bleibt unverändert)
+        geaendert = {}
+        for meldung in meldungen:
+            von = station_id.get(meldung["from_station"])
+            nach = station_id.get(meldung["to_station"])
+            zug = zug_id.get(meldung["train_number"])
+            if von is None or nach is None or zug is None:
+                continue
+
+            if von not in geaendert:
+                geaendert[von] = dict(echtzeit["verspaetungen"].get(von, {}))
+            verspaetung = (meldung.get("dep_delay", 0), meldung.get("arr_delay", 0))
+            if verspaetung == (0, 0):
+                geaendert[von].pop((nach, zug), None)
+            else:
+                geaendert[von][(nach, zug)] = verspaetung
+
+        if not geaendert:
+            return echtzeit["version"]
+
+        # Neuer Overlay: unveränderte Bahnhöfe werden übernommen, nur die geänderten neu berechnet
+        alt = echtzeit["overlay"]
+        overlay = {
+            "ersetzt": dict(alt["ersetzt"]),
+            "zusatz": dict(alt["zusatz"]),
+            "zusammengefuehrt": {s: v for s, v in alt["zusammengefuehrt"].items() if s not in geaendert},
+        }
+        verspaetungen = dict(echtzeit["verspaetungen"])
+        for von, verspaetungen_von in geaendert.items():
+            overlay["ersetzt"].pop(von, None)
+            overlay["zusatz"].pop(von, None)
+            verspaetungen.pop(von, None)
+            if verspaetungen_von:
+                ersetzt, zusatz = verspaetete_verbindungen(kompiliert, von, verspaetungen_von)
+                verspaetungen[von] = verspaetungen_von
+                if ersetzt:
+                    overlay["ersetzt"][von] = ersetzt
+                    overlay["zusatz"][von] = zusatz
+
+        echtzeit["verspaetungen"] = verspaetungen
+        echtzeit["overlay"] = overlay
+        echtzeit["version"] += 1
+        echtzeit["aktualisiert_um"] = time.time()
+        return echtzeit["version"]
+
+
+# gibt die aktuellen Verspätungen als Meldungen mit Namen zurück (z.B. um sie in einen neuen Fahrplan zu übernehmen)
+def aktuelle_meldungen(echtzeit):
+    kompiliert = echtzeit["kompilierter_fahrplan"]
+    return [
+        {
+            "from_station": kompiliert["stationen"][von],
+            "to_station": kompiliert["stationen"][nach],
+            "train_number": kompiliert["zuege"][zug],
+            "dep_delay": dep_delay,
+            "arr_delay": arr_delay,
+        }
+        for von, verspaetungen_von in echtzeit["verspaetungen"].items()
+        for (nach, zug), (dep_delay, arr_delay) in verspaetungen_von.items()
+    ]
+
+
+# übernimmt alle Verspätungen in einen neuen Echtzeitfahrplan; spätere Meldungen an den alten werden weitergeleitet
+def uebertrage_echtzeitfahrplan(alt, neu):
+    with alt["lock"]:
+        wende_verspaetungen_an(neu, aktuelle_meldungen(alt))
+        alt["nachfolger"] = neu
+
+
+# liest eine Meldung aus einer Zeile des Feeds (JSON); ungültige Zeilen werden übersprungen
+def lies_meldung(zeile):
+    zeile = zeile.strip()
+    if not zeile:
+        return None
+    try:
+        meldung = json.loads(zeile)
+    except json.JSONDecodeError:
+        print(f"❗ Ungültige Verspätungsmeldung übersprungen: {zeile[:80]}")
+        return None
+    if not isinstance(meldung, dict) or not all(k in meldung for k in ("from_station", "to_station", "train_number")):
+        return None
+
+    # Verspätungen als ganze Minuten (z.B. "5" wird akzeptiert, "x" nicht)
+    try:
+        meldung["dep_delay"] = int(meldung.get("dep_delay", 0))
+        meldung["arr_delay"] = int(meldung.get("arr_delay", 0))
+    except (TypeError, ValueError):
+        print(f"❗ Ungültige Verspätung in Meldung übersprungen: {zeile[:80]}")
+        return None
+    return meldung
+
+
+"""
+folgt einer Feed-Datei mit einer JSON-Meldung pro Zeile (wie `tail -f`): neue Zeilen werden gesammelt und als
+ein Block angewendet. `hole_echtzeit` liefert den Echtzeitfahrplan, auf den angewendet wird (z.B. den des aktiven
+Snapshots). Läuft bis `stop` gesetzt wird; existiert die Datei noch nicht, wird auf sie gewartet.
+Wird die Datei gekürzt, wird sie von vorne gelesen; wird sie ersetzt (Rotation per Umbenennen), wird der Rest der
+alten Datei noch verarbeitet und danach die neue geöffnet. Fehler eines Blocks werden protokolliert, der Feed läuft
+weiter.
+"""
+
+def folge_feed_datei(hole_echtzeit, pfad, intervall_sekunden=1.0, stop=None):
+    if stop is None:
+        stop = threading.Event()
+
+    datei = None
+    rest = ""
+    while not stop.is_set():
+        try:
+            if datei is None:
+                if not os.path.exists(pfad):
+                    stop.wait(intervall_sekunden)
+                    continue
+                datei = open(pfad, "r", encoding="utf-8")
+                rest = ""
+
+            # Datei ersetzt oder gelöscht: andere Inode (bzw. keine Datei mehr) unter dem Pfad
+            try:
+                stand = os.stat(pfad)
+            except FileNotFoundError:
+                stand = None
+            ersetzt = stand is None or stand.st_ino != os.fstat(datei.fileno()).st_ino
+
+            # Datei wurde gekürzt → von vorne lesen
+            if not ersetzt and stand.st_size < datei.tell():
+                datei.seek(0)
+                rest = ""
+
+            daten = datei.read()
+            if ersetzt:
+                datei.close()
+                datei = None
+            if not daten:
+                if not ersetzt:
+                    stop.wait(intervall_sekunden)
+                continue
+
+            # Nur vollständige Zeilen verarbeiten, eine angefangene Zeile bleibt für den nächsten Durchlauf
+            zeilen = (rest + daten).split("\n")
+            rest = zeilen.pop()
+            meldungen = [m for m in map(lies_meldung, zeilen) if m is not None]
+            if meldungen:
+                wende_verspaetungen_an(hole_echtzeit(), meldungen)
+        except Exception as e:
+            print(f"❌ Fehler im Verspätungsfeed {pfad}: {e}")
+            stop.wait(intervall_sekunden)
+
+    if datei is not None:
+        datei.close()
+
+
+# verarbeitet Meldungen aus einer Warteschlange (queue.Queue); alle bereits wartenden Meldungen bilden einen Block
+def folge_feed_warteschlange(hole_echtzeit, warteschlange, stop=None):
+    if stop is None:
+        stop = threading.Event()
+
+    while not stop.is_set():
+        try:
+            meldungen = [warteschlange.get(timeout=0.5)]
+        except queue.Empty:
+            continue
+        while True:
+            try:
+                meldungen.append(warteschlange.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            wende_verspaetungen_an(hole_echtzeit(), meldungen)
+        except Exception as e:
+            print(f"❌ Fehler im Verspätungsfeed (Warteschlange): {e}")
+
+
+# startet einen Hintergrund-Thread, der der Feed-Datei folgt; gibt das Stop-Event zurück
+def starte_feed_thread(hole_echtzeit, pfad, intervall_sekunden=1.0):
+    stop = threading.Event()
+    threading.Thread(
+        target=folge_feed_datei, args=(hole_echtzeit, pfad, intervall_sekunden, stop), daemon=True
+    ).start()
+    return stop
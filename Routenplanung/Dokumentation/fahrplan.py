@@ -0,0 +1,285 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from array import array
+import bisect
+
+
+MINUTEN_PRO_TAG = 24 * 60
+
+
+# vergibt für Namen (Bahnhöfe, Zugnummern) fortlaufende ganzzahlige IDs; gibt (Liste ID → Name, Dictionary Name → ID) zurück
+def erstelle_namensindex(namen):
+    liste = sorted(set(namen), key=str)
+    return liste, {name: idx for idx, name in enumerate(liste)}
+
+
+# wandelt eine Uhrzeit (datetime- oder time-Objekt) in Minuten seit Mitternacht um
+def zeit_in_minuten(zeit):
+    if isinstance(zeit, datetime):
+        zeit = zeit.time()
+    return zeit.hour * 60 + zeit.minute
+
+
+# wandelt Minuten seit Mitternacht des Reisedatums wieder in ein datetime-Objekt um (auch > 24 Stunden)
+def minuten_in_datetime(minuten, travel_date):
+    return datetime.combine(travel_date, datetime.min.time()) + timedelta(minutes=minuten)
+
+
+# Minuten zwischen Mitternacht des Reisedatums und einem Zeitpunkt (z.B. der gewünschten Abfahrtszeit)
+def datetime_in_minuten(zeitpunkt, travel_date):
+    mitternacht = datetime.combine(travel_date, datetime.min.time())
+    return int((zeitpunkt - mitternacht).total_seconds() // 60)
+
+
+"""
+erstellt aus station_departures ein Dictionary namens zugfahrten, in dem für jeden Zug alle Fahrtabschnitte
+in Fahrtreihenfolge (halt_nummer) gelistet sind. Abfahrt und Ankunft werden als Minuten seit Beginn des
+Betriebstages gespeichert und über Mitternacht hinaus fortlaufend gezählt (z.B. 00:30 nach 23:50 → 1470).
+Jeder Abschnitt: (von, nach, abfahrt_min, ankunft_min, verbindung), wobei verbindung das Originaltupel ist.
+"""
+
+def erstelle_zugfahrten(station_departures):
+
+    # Alle Abschnitte eines Zuges einsammeln
+    abschnitte_pro_zug = defaultdict(list)
+    for from_station, connections in station_departures.items():
+        for connection in connections:
+            abschnitte_pro_zug[connection[0]].append((from_station, connection))
+
+    zugfahrten = {}
+    for train, abschnitte in abschnitte_pro_zug.items():
+
+        # Nach Haltereihenfolge sortieren, falls vorhanden – sonst nach Abfahrtszeit
+        if all(connection[5] is not None for _, connection in abschnitte):
+            abschnitte.sort(key=lambda x: x[1][5])
+        else:
+            abschnitte.sort(key=lambda x: zeit_in_minuten(x[1][2]))
+
+        fahrt = []
+        tagesversatz = 0
+        letzte_ankunft = None
+        for from_station, connection in abschnitte:
+            (_train, to_station, dep_time, arr_time, zugtyp, halt_nummer, train_avg_30, station_avg_30) = connection
+
+            # Abfahrt vor der letzten Ankunft → der Zug ist über Mitternacht gefahren
+            abfahrt = zeit_in_minuten(dep_time) + tagesversatz
+            if letzte_ankunft is not None and abfahrt < letzte_ankunft:
+                tagesversatz += MINUTEN_PRO_TAG
+                abfahrt += MINUTEN_PRO_TAG
+
+            # Ankunft vor der Abfahrt → Tageswechsel innerhalb des Abschnitts
+            ankunft = zeit_in_minuten(arr_time) + tagesversatz
+            if ankunft < abfahrt:
+                tagesversatz += MINUTEN_PRO_TAG
+                ankunft += MINUTEN_PRO_TAG
+
+            fahrt.append((from_station, to_station, abfahrt, ankunft, connection))
+            letzte_ankunft = ankunft
+
+        zugfahrten[train] = fahrt
+
+    return zugfahrten
+
+
+"""
+erstellt aus den Zugfahrten eine globale, nach Abfahrtszeit sortierte Verbindungsliste (Connection Scan).
+Der Tagesfahrplan wird über `tage` Betriebstage ausgerollt (inkl. Vortag für Züge, die über Mitternacht fahren),
+sodass Nachtverbindungen ohne Tageskorrektur gefunden werden. Jede Kombination (Zug, Tag) ist eine eigene Fahrt.
+Die Liste wird als Dictionary paralleler Listen zurückgegeben.
+"""
+
+def erstelle_verbindungsliste(station_departures, tage=2):
+    zugfahrten = erstelle_zugfahrten(station_departures)
+    ende = tage * MINUTEN_PRO_TAG
+
+    eintraege = []
+    fahrt_zug = []
+    for train, fahrt in zugfahrten.items():
+        for tag in range(-1, tage):
+            versatz = tag * MINUTEN_PRO_TAG
+            fahrt_id = len(fahrt_zug)
+            fahrt_zug.append(train)
+            for position, (from_station, to_station, abfahrt, ankunft, connection) in enumerate(fahrt):
+                if 0 <= abfahrt + versatz < ende:
+                    eintraege.append((abfahrt + versatz, ankunft + versatz, fahrt_id, position,
+                                      from_station, to_station, connection))
+
+    # Sortierung nach Abfahrt, bei gleicher Abfahrt nach Ankunft (Abschnitte ohne Fahrzeit zuerst)
+    eintraege.sort(key=lambda x: (x[0], x[1]))
+
+    verbindungen = {
+        "abfahrt": [e[0] for e in eintraege],
+        "ankunft": [e[1] for e in eintraege],
+        "fahrt": [e[2] for e in eintraege],
+        "von": [e[4] for e in eintraege],
+        "nach": [e[5] for e in eintraege],
+        "verbindung": [e[6] for e in eintraege],
+        "vorgaenger": [-1] * len(eintraege),
+        "fahrt_zug": fahrt_zug,
+    }
+
+    # Vorgängerabschnitt derselben Fahrt merken (für die Rekonstruktion in O(Abschnitte))
+    letzter_index = {}
+    for idx, e in enumerate(eintraege):
+        key = (e[2], e[3] - 1)
+        if key in letzter_index:
+            verbindungen["vorgaenger"][idx] = letzter_index[key]
+        letzter_index[(e[2], e[3])] = idx
+
+    return verbindungen
+
+
+# findet den Index der ersten Verbindung, die zum Zeitpunkt `minuten` oder später abfährt
+def finde_erste_abfahrt(abfahrten, minuten):
+    return bisect.bisect_left(abfahrten, minuten)
+
+
+"""
+fasst die Zugfahrten zu Linienmustern (route patterns) zusammen: Alle Fahrten mit identischer Halte-Reihenfolge
+bilden ein Muster, sofern sie sich nicht gegenseitig überholen (sonst wird ein weiteres Muster angelegt).
+Je Muster werden die Fahrten nach Abfahrt sortiert und nur ihre Zeiten pro Halt als array('i') gespeichert. Der
+Tagesfahrplan wird wie bei der Verbindungsliste über `tage` Betriebstage (plus Vortag) ausgerollt.
+Die Prognosedaten (zugtyp, halt_nummer, train_avg_30, station_avg_30) stehen einmal je Zug und Halt in den
+Spalten info_* (gleiches Format wie im kompilierten Fahrplan, lesbar mit verbindungsinfo); je Fahrt verweist
+info[fahrt][pos] auf die Zeile des Abschnitts ab Halt pos. Die ausgerollten Tage eines Zuges teilen sich diese Liste.
+"""
+
+def erstelle_linienmuster(station_departures, tage=2):
+    zugfahrten = erstelle_zugfahrten(station_departures)
+    zugtypen, zugtyp_id = erstelle_namensindex(
+        abschnitt[4][4] for fahrt in zugfahrten.values() for abschnitt in fahrt
+    )
+
+    linienmuster = {
+        "muster": [],
+        "muster_pro_halt": defaultdict(list),
+        "zugtypen": zugtypen,
+        "info_zugtyp": array("i"),
+        "info_halt_nummer": array("i"),
+        "info_train_avg_30": array("d"),
+        "info_station_avg_30": array("d"),
+    }
+
+    # Fahrten nach Halte-Reihenfolge gruppieren, Prognosedaten je Zug und Halt in die Spalten übernehmen
+    fahrten_pro_folge = defaultdict(list)
+    for train, fahrt in zugfahrten.items():
+        halte = tuple([abschnitt[0] for abschnitt in fahrt] + [fahrt[-1][1]])
+        abfahrten = [abschnitt[2] for abschnitt in fahrt] + [fahrt[-1][3]]
+        ankuenfte = [fahrt[0][2]] + [abschnitt[3] for abschnitt in fahrt]
+
+        info = array("i")
+        for abschnitt in fahrt:
+            (_train, _to, _dep, _arr, zugtyp, halt_nummer, train_avg_30, station_avg_30) = abschnitt[4]
+            info.append(len(linienmuster["info_zugtyp"]))
+            linienmuster["info_zugtyp"].append(zugtyp_id[zugtyp])
+            linienmuster["info_halt_nummer"].append(-1 if halt_nummer is None else int(halt_nummer))
+            linienmuster["info_train_avg_30"].append(float("nan") if train_avg_30 is None else float(train_avg_30))
+            linienmuster["info_station_avg_30"].append(float("nan") if station_avg_30 is None else float(station_avg_30))
+
+        for tag in range(-1, tage):
+            versatz = tag * MINUTEN_PRO_TAG
+            fahrten_pro_folge[halte].append((
+                [zeit + versatz for zeit in abfahrten],
+                [zeit + versatz for zeit in ankuenfte],
+                train, info
+            ))
+
+    muster_liste = linienmuster["muster"]
+    for halte, fahrten in fahrten_pro_folge.items():
+        fahrten.sort(key=lambda x: x[0][0])
+
+        # Überholende Fahrten in eigene Muster verschieben, damit jedes Muster FIFO-sortiert ist
+        gruppen = []
+        for fahrt in fahrten:
+            for gruppe in gruppen:
+                letzte = gruppe[-1]
+                if all(a <= b for a, b in zip(letzte[0], fahrt[0])) and all(a <= b for a, b in zip(letzte[1], fahrt[1])):
+                    gruppe.append(fahrt)
+                    break
+            else:
+                gruppen.append([fahrt])
+
+        for gruppe in gruppen:
+            muster_id = len(muster_liste)
+            muster_liste.append({
+                "halte": halte,
+                "abfahrt": [array("i", fahrt[0]) for fahrt in gruppe],
+                "ankunft": [array("i", fahrt[1]) for fahrt in gruppe],
+                "zug": [fahrt[2] for fahrt in gruppe],
+                "info": [fahrt[3] for fahrt in gruppe],
+                # Abfahrtszeiten aller Fahrten je Halt (sortiert) für die Suche per bisect
+                "abfahrt_pro_halt": [array("i", [fahrt[0][pos] for fahrt in gruppe]) for pos in range(len(halte))],
+            })
+            for pos, halt in enumerate(halte):
+                linienmuster["muster_pro_halt"][halt].append((muster_id, pos))
+
+    linienmuster["muster_pro_halt"] = dict(linienmuster["muster_pro_halt"])
+    return linienmuster
+
+
+"""
+Trip-Index für die Trip-Based-Routensuche: für jede Fahrt (Linienmuster, Fahrt) und jeden Halt die Liste der
+möglichen Umstiege (muster_id, fahrt, einstieg_pos) auf die jeweils erste erreichbare Fahrt anderer Muster,
+unter Einhaltung von `min_transfer_minutes`. Umstiege, die an keinem Bahnhof eine frühere Ankunft ermöglichen
+als das Weiterfahren oder ein späterer Umstieg derselben Fahrt, werden verworfen (Reduktion nach Witt).
+umstiege[muster_id][fahrt][pos] = [(muster_id, fahrt, einstieg_pos), ...]
+"""
+
+def erstelle_trip_umstiege(linienmuster, min_transfer_minutes=5):
+    muster_liste = linienmuster["muster"]
+    muster_pro_halt = linienmuster["muster_pro_halt"]
+
+    umstiege = []
+    for muster_id, muster in enumerate(muster_liste):
+        halte = muster["halte"]
+        umstiege_muster = []
+        for fahrt in range(len(muster["zug"])):
+            ankuenfte = muster["ankunft"][fahrt]
+            umstiege_fahrt = [[] for _ in halte]
+
+            # Halte rückwärts: frueheste[station] ist die beste Ankunft über das Weiterfahren oder spätere Umstiege
+            frueheste = {}
+            for pos in range(len(halte) - 1, 0, -1):
+                station = halte[pos]
+                if ankuenfte[pos] < frueheste.get(station, float("inf")):
+                    frueheste[station] = ankuenfte[pos]
+
+                schwelle = ankuenfte[pos] + min_transfer_minutes
+                for ziel_muster_id, ziel_pos in muster_pro_halt.get(station, []):
+                    ziel_muster = muster_liste[ziel_muster_id]
+                    if ziel_pos == len(ziel_muster["halte"]) - 1:
+                        continue
+
+                    # Erste erreichbare Fahrt; Umstieg in dieselbe Fahrt bzw. zurück auf dasselbe Muster entfällt
+                    ziel_fahrt = bisect.bisect_left(ziel_muster["abfahrt_pro_halt"][ziel_pos], schwelle)
+                    if ziel_fahrt >= len(ziel_muster["zug"]):
+                        continue
+                    if ziel_muster_id == muster_id and (ziel_fahrt <= fahrt or ziel_pos <= pos):
+                        continue
+
+                    # Nur behalten, wenn die Fahrt danach irgendwo früher ankommt
+                    nuetzlich = False
+                    ziel_ankuenfte = ziel_muster["ankunft"][ziel_fahrt]
+                    for ausstieg in range(ziel_pos + 1, len(ziel_muster["halte"])):
+                        halt = ziel_muster["halte"][ausstieg]
+                        if ziel_ankuenfte[ausstieg] < frueheste.get(halt, float("inf")):
+                            frueheste[halt] = ziel_ankuenfte[ausstieg]
+                            nuetzlich = True
+                    if nuetzlich:
+                        umstiege_fahrt[pos].append((ziel_muster_id, ziel_fahrt, ziel_pos))
+
+            umstiege_muster.append(umstiege_fahrt)
+        umstiege.append(umstiege_muster)
+
+    return umstiege
+
+
+# erstellt den Trip-Index (Linienmuster und vorberechnete Umstiege) für routenplanung_trip
+def erstelle_tripindex(station_departures, min_transfer_minutes=5, linienmuster=None):
+    if linienmuster is None:
+        linienmuster = erstelle_linienmuster(station_departures)
+    return {
+        "linienmuster": linienmuster,
+        "umstiege": erstelle_trip_umstiege(linienmuster, min_transfer_minutes),
+        "min_transfer_minutes": min_transfer_minutes,
+    }
@@ -1,15 +1,226 @@
 from flask import Flask, request, jsonify
 from datetime import datetime
+import hmac
+import os
 import pickle
-from routen_berechnung import routenplanung
-from replan import analyse_and_replan  
+import threading
+import time
+from collections import OrderedDict
+from routen_berechnung import routenplanung, kompiliere_station_departures, speichere_kompilierten_fahrplan, lade_kompilierten_fahrplan, erstelle_untergrenzen
+from routen_berechnung_csa import routenplanung_csa
+from routen_berechnung_raptor import routenplanung_raptor, routenplanung_profil
+from routen_berechnung_trip import routenplanung_trip
+from routen_berechnung_zuverlaessig import routenplanung_zuverlaessig
+from fahrplan import erstelle_verbindungsliste, erstelle_linienmuster, erstelle_tripindex
+from replan import analyse_and_replan, erstelle_replan_cache
+from echtzeit import erstelle_echtzeitfahrplan, uebertrage_echtzeitfahrplan, starte_feed_thread
+from korridor import KORRIDORE, erstelle_raumindex, erlaubte_stationen, load_station_coordinates_pickle
+from umstiegsmuster import routenplanung_muster, load_umstiegsmuster_pickle
+from zuverlaessigkeit import bewerte_routen
 
 app = Flask(__name__)
 
 
-with open("station_departure.pkl", "rb") as f:
-    station_departures = pickle.load(f)
-print("station_departures geladen")
+"""
+Fahrplan-Snapshots: Jede Fahrplanversion liegt in einem eigenen Verzeichnis fahrplaene/<version>/ mit
+station_departure.pkl (und der daraus erstellten station_departure.fpl). Die Datei fahrplaene/AKTUELL enthält
+die Version, die der Dienst verwenden soll. Ohne dieses Verzeichnis werden die Dateien im Arbeitsverzeichnis
+als Version "basis" verwendet.
+Ein Snapshot ist ein Dictionary mit dem kompilierten Fahrplan und den bei Bedarf erstellten Strukturen für
+CSA/RAPTOR. Eine Anfrage holt sich einmal die Referenz auf den aktiven Snapshot und arbeitet bis zum Ende damit;
+ein neuer Snapshot wird im Hintergrund geladen und danach durch eine einzige Zuweisung aktiviert.
+"""
+
+FAHRPLAN_VERZEICHNIS = "fahrplaene"
+VERSIONSDATEI = os.path.join(FAHRPLAN_VERZEICHNIS, "AKTUELL")
+BASISVERSION = "basis"
+
+# Verspätungsfeed (eine JSON-Meldung pro Zeile), dem der Dienst im Hintergrund folgt
+VERSPAETUNGSFEED = "verspaetungen.jsonl"
+
+# Wie oft (Sekunden) eine Anfrage prüft, ob in der Versionsdatei eine neue Version eingetragen wurde
+VERSIONSPRUEFUNG_SEKUNDEN = 30
+
+# Token für /admin/fahrplan (Header X-Admin-Token); ohne Token sind die Admin-Endpunkte nur lokal erreichbar
+ADMIN_TOKEN = os.environ.get("FAHRPLAN_ADMIN_TOKEN")
+LOKALE_ADRESSEN = ("127.0.0.1", "::1")
+
+
+# liest die in fahrplaene/AKTUELL eingetragene Version (None, falls nicht vorhanden)
+def lies_aktuelle_version():
+    if not os.path.exists(VERSIONSDATEI):
+        return None
+    with open(VERSIONSDATEI, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+# lädt einen Fahrplan-Snapshot; der kompilierte Fahrplan wird per mmap geladen und fehlt er, einmalig erstellt
+def lade_snapshot(version):
+    verzeichnis = "." if version == BASISVERSION else os.path.join(FAHRPLAN_VERZEICHNIS, version)
+    pfad_pkl = os.path.join(verzeichnis, "station_departure.pkl")
+    pfad_fpl = os.path.join(verzeichnis, "station_departure.fpl")
+
+    kompiliert = lade_kompilierten_fahrplan(pfad_fpl)
+    if kompiliert is None:
+        with open(pfad_pkl, "rb") as f:
+            speichere_kompilierten_fahrplan(kompiliere_station_departures(pickle.load(f)), pfad_fpl)
+        kompiliert = lade_kompilierten_fahrplan(pfad_fpl)
+
+    print(f"Fahrplan-Snapshot {version} geladen")
+    return {
+        "version": version,
+        "pfad_pkl": pfad_pkl,
+        "geladen_um": datetime.now(),
+        "kompilierter_fahrplan": kompiliert,
+        # Echtzeitfahrplan: Verspätungen aus dem Feed als Overlay über dem kompilierten Fahrplan
+        "echtzeit": erstelle_echtzeitfahrplan(kompiliert),
+        # station_departures und die Strukturen für CSA/RAPTOR/ALT/Korridor werden erst bei der ersten Anfrage geladen, die sie braucht
+        "daten": {},
+        # lock schützt nur kurze Zugriffe auf daten; gebaut wird unter dem Lock der jeweiligen Struktur (baulocks)
+        "lock": threading.RLock(),
+        "baulocks": {},
+    }
+
+
+# erstellt eine bei Bedarf geladene Struktur eines Snapshots (siehe hole_daten)
+def erstelle_daten(snapshot, name):
+    wert = None
+    if name == "station_departures":
+        with open(snapshot["pfad_pkl"], "rb") as f:
+            wert = pickle.load(f)
+        print("station_departures geladen")
+    elif name == "verbindungen":
+        # Globale, nach Abfahrt sortierte Verbindungsliste für den Connection Scan
+        wert = erstelle_verbindungsliste(hole_daten(snapshot, "station_departures"))
+        print("Verbindungsliste erstellt")
+    elif name == "linienmuster":
+        # Linienmuster (Züge mit gleicher Halte-Reihenfolge) für RAPTOR
+        wert = erstelle_linienmuster(hole_daten(snapshot, "station_departures"))
+        print("Linienmuster erstellt")
+    elif name == "tripindex":
+        # Vorberechnete Umstiege zwischen Fahrten für Trip-Based Routing (teilt die Linienmuster mit RAPTOR)
+        wert = erstelle_tripindex(
+            hole_daten(snapshot, "station_departures"),
+            linienmuster=hole_daten(snapshot, "linienmuster")
+        )
+        print("Trip-Index erstellt")
+    elif name == "untergrenzen":
+        # Untere Schranken der Fahrzeit (Landmarken) zum Verwerfen von Zuständen in der Heap-Suche
+        wert = erstelle_untergrenzen(snapshot["kompilierter_fahrplan"])
+        print("Untere Schranken erstellt")
+    elif name == "umstiegsmuster":
+        # Offline berechnete Umstiegsmuster der Hub-Paare (None ohne umstiegsmuster.pkl im Snapshot)
+        wert = load_umstiegsmuster_pickle(os.path.join(os.path.dirname(snapshot["pfad_pkl"]), "umstiegsmuster.pkl"))
+        print("Umstiegsmuster geladen" if wert is not None else "Keine Umstiegsmuster gefunden")
+    elif name == "suchkontexte":
+        # Suchkontexte der letzten Heap-Suchen für die Neuplanung (siehe merke_suchkontext)
+        wert = OrderedDict()
+    elif name == "direktverbindungen":
+        # Tabellen der direkten Zugfahrten je Abschnitt, werden von routenplanung_muster gefüllt
+        wert = {}
+    elif name == "raumindex":
+        # Raumindex über den Bahnhofskoordinaten für den Korridor-Filter (None ohne station_coordinates.pkl)
+        station_coordinates = load_station_coordinates_pickle()
+        wert = erstelle_raumindex(snapshot["kompilierter_fahrplan"], station_coordinates) if station_coordinates else None
+        print("Raumindex erstellt" if wert is not None else "Keine Bahnhofskoordinaten gefunden")
+    return wert
+
+
+# liefert eine Struktur des Snapshots und erstellt sie bei der ersten Anfrage. Gebaut wird außerhalb des
+# Snapshot-Locks (nur je Struktur ein eigener Lock), sodass Anfragen, die die Struktur nicht brauchen, nicht warten
+def hole_daten(snapshot, name):
+    daten = snapshot["daten"]
+    with snapshot["lock"]:
+        if name in daten:
+            return daten[name]
+        baulock = snapshot["baulocks"].setdefault(name, threading.Lock())
+
+    with baulock:
+        with snapshot["lock"]:
+            if name in daten:
+                return daten[name]
+        wert = erstelle_daten(snapshot, name)
+        with snapshot["lock"]:
+            daten[name] = wert
+    return wert
+
+
+# Aktiver Snapshot und Zustand des Hintergrund-Ladevorgangs
+aktiver_snapshot = lade_snapshot(lies_aktuelle_version() or BASISVERSION)
+_wechsel = {"laedt": None, "fehler": None, "geprueft_um": time.time()}
+_wechsel_lock = threading.Lock()
+
+# Verspätungsmeldungen laufend auf den Echtzeitfahrplan des aktiven Snapshots anwenden
+starte_feed_thread(lambda: aktiver_snapshot["echtzeit"], VERSPAETUNGSFEED)
+
+
+# lädt `version` in einem Hintergrund-Thread und aktiviert sie danach; gibt False zurück, falls bereits geladen wird
+def starte_snapshot_wechsel(version):
+    with _wechsel_lock:
+        if _wechsel["laedt"] is not None:
+            return False
+        _wechsel["laedt"] = version
+        _wechsel["fehler"] = None
+
+    def laden():
+        global aktiver_snapshot
+        try:
+            snapshot = lade_snapshot(version)
+            # Bisherige Verspätungen übernehmen; Meldungen an den alten Snapshot werden ab jetzt weitergeleitet
+            uebertrage_echtzeitfahrplan(aktiver_snapshot["echtzeit"], snapshot["echtzeit"])
+            # Laufende Anfragen behalten ihre Referenz auf den alten Snapshot
+            aktiver_snapshot = snapshot
+        except Exception as e:
+            print(f"❌ Fahrplan-Snapshot {version} konnte nicht geladen werden: {e}")
+            _wechsel["fehler"] = str(e)
+        finally:
+            with _wechsel_lock:
+                _wechsel["laedt"] = None
+
+    threading.Thread(target=laden, daemon=True).start()
+    return True
+
+
+# prüft höchstens alle VERSIONSPRUEFUNG_SEKUNDEN, ob eine neue Version eingetragen wurde (so wechseln alle Worker)
+def pruefe_fahrplanversion():
+    jetzt = time.time()
+    if jetzt - _wechsel["geprueft_um"] < VERSIONSPRUEFUNG_SEKUNDEN:
+        return
+    _wechsel["geprueft_um"] = jetzt
+
+    version = lies_aktuelle_version()
+    if version is not None and version != aktiver_snapshot["version"] and _wechsel["laedt"] is None:
+        starte_snapshot_wechsel(version)
+
+
+# Anzahl der Suchkontexte je Snapshot, die für /api/analyse_and_replan aufbewahrt werden (älteste fallen heraus)
+MAX_SUCHKONTEXTE = 200
+
+
+# speichert den Suchkontext einer Heap-Suche unter (Start, Ziel, Reisedatum, Echtzeit-Version)
+def merke_suchkontext(snapshot, schluessel, suchkontext):
+    suchkontexte = hole_daten(snapshot, "suchkontexte")
+    with snapshot["lock"]:
+        suchkontexte[schluessel] = suchkontext
+        suchkontexte.move_to_end(schluessel)
+        while len(suchkontexte) > MAX_SUCHKONTEXTE:
+            suchkontexte.popitem(last=False)
+
+
+# Suchkontexte, die mit den aktuellen Verspätungen berechnet wurden, als {(Start, Ziel, Reisedatum): Kontext}
+def aktuelle_suchkontexte(snapshot):
+    echtzeit_version = snapshot["echtzeit"]["version"]
+    suchkontexte = hole_daten(snapshot, "suchkontexte")
+    with snapshot["lock"]:
+        return {schluessel[:3]: kontext for schluessel, kontext in suchkontexte.items() if schluessel[3] == echtzeit_version}
+
+
+# Alternativrouten von /api/analyse_and_replan, geteilt von allen Anfragen; gültig je Fahrplan- und Echtzeit-Version
+replan_cache = erstelle_replan_cache()
+
+
+# Verfügbare Suchverfahren für /route (Parameter `engine`)
+ENGINES = ("heap", "csa", "raptor", "profil", "muster", "trip", "zuverlaessig")
 
 
 @app.route("/", methods=["GET"])
@@ -24,28 +235,147 @@ def route():
         target = request.args.get("target")
         date = request.args.get("date")
         time = request.args.get("time")
+        engine = request.args.get("engine", "heap")
+        window_hours = request.args.get("window_hours", 6, type=int)
+        corridor = request.args.get("corridor")
+        corridor_km = request.args.get("corridor_km", 200, type=int)
+
+        # Die Anfrage arbeitet durchgehend mit dem Snapshot, der zu ihrem Beginn aktiv war
+        pruefe_fahrplanversion()
+        snapshot = aktiver_snapshot
 
         if not all([source, target, date, time]):
             return jsonify({"error": "Missing required parameters: source, target, date, time"}), 400
 
+        if engine not in ENGINES:
+            return jsonify({"error": f"Unknown engine '{engine}', expected one of: {', '.join(ENGINES)}"}), 400
+
+        if corridor is not None and corridor not in KORRIDORE:
+            return jsonify({"error": f"Unknown corridor '{corridor}', expected one of: {', '.join(KORRIDORE)}"}), 400
+
         try:
             travel_date = datetime.strptime(date, "%Y-%m-%d").date()
             departure_time = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
         except ValueError as e:
             return jsonify({"error": f"Invalid date or time format: {str(e)}"}), 400
 
-        routes = routenplanung(
-            source=source,
-            target=target,
-            station_departures=station_departures,
-            departure_time=departure_time,
-            travel_date=travel_date
-        )
+        # Rückmeldung der Suche (z.B. partial=True, wenn das Zeitlimit vor Abschluss erreicht wurde)
+        status = {"partial": False}
+
+        # Umstiegsmuster gibt es nur für Hub-Paare; alle anderen Anfragen werden mit der Heap-Suche beantwortet
+        if engine == "muster":
+            routes = routenplanung_muster(
+                source=source,
+                target=target,
+                station_departures=None,
+                departure_time=departure_time,
+                travel_date=travel_date,
+                umstiegsmuster=hole_daten(snapshot, "umstiegsmuster"),
+                kompilierter_fahrplan=snapshot["kompilierter_fahrplan"],
+                direktverbindungen_cache=hole_daten(snapshot, "direktverbindungen"),
+                status=status
+            )
+            if routes is None:
+                engine = "heap"
+
+        if engine == "csa":
+            routes = routenplanung_csa(
+                source=source,
+                target=target,
+                station_departures=None,
+                departure_time=departure_time,
+                travel_date=travel_date,
+                verbindungen=hole_daten(snapshot, "verbindungen"),
+                status=status
+            )
+        elif engine == "raptor":
+            routes = routenplanung_raptor(
+                source=source,
+                target=target,
+                station_departures=None,
+                departure_time=departure_time,
+                travel_date=travel_date,
+                linienmuster=hole_daten(snapshot, "linienmuster"),
+                status=status
+            )
+        elif engine == "zuverlaessig":
+            anschlusswahrscheinlichkeiten = []
+            routes = routenplanung_zuverlaessig(
+                source=source,
+                target=target,
+                station_departures=None,
+                departure_time=departure_time,
+                travel_date=travel_date,
+                linienmuster=hole_daten(snapshot, "linienmuster"),
+                anschlusswahrscheinlichkeiten=anschlusswahrscheinlichkeiten,
+                status=status
+            )
+        elif engine == "trip":
+            routes = routenplanung_trip(
+                source=source,
+                target=target,
+                station_departures=None,
+                departure_time=departure_time,
+                travel_date=travel_date,
+                tripindex=hole_daten(snapshot, "tripindex"),
+                status=status
+            )
+        elif engine == "profil":
+            routes = routenplanung_profil(
+                source=source,
+                target=target,
+                station_departures=None,
+                departure_time=departure_time,
+                travel_date=travel_date,
+                fenster_stunden=window_hours,
+                linienmuster=hole_daten(snapshot, "linienmuster"),
+                status=status
+            )
+        elif engine == "heap":
+            # Optionaler Korridor-Filter (nur Heap-Suche); ohne Koordinaten wird ohne Filter gesucht
+            korridor_maske = None
+            raumindex = hole_daten(snapshot, "raumindex") if corridor is not None else None
+            if raumindex is not None:
+                korridor_maske = erlaubte_stationen(
+                    raumindex, snapshot["kompilierter_fahrplan"], source, target, corridor, puffer_km=corridor_km
+                )
+
+            # Suchbaum für spätere Neuplanungen aufbewahren (Version vor dem Overlay lesen: im Zweifel gilt er als veraltet)
+            suchkontext = {}
+            echtzeit_version = snapshot["echtzeit"]["version"]
+            routes = routenplanung(
+                source=source,
+                target=target,
+                station_departures=None,
+                departure_time=departure_time,
+                travel_date=travel_date,
+                kompilierter_fahrplan=snapshot["kompilierter_fahrplan"],
+                verspaetungsoverlay=snapshot["echtzeit"]["overlay"],
+                status=status,
+                untergrenzen=hole_daten(snapshot, "untergrenzen"),
+                erlaubte_stationen=korridor_maske,
+                suchkontext=suchkontext
+            )
+            if routes:
+                merke_suchkontext(snapshot, (source, target, travel_date, echtzeit_version), suchkontext)
 
         if not routes:
             return jsonify({"error": "No routes found."}), 404
 
-        return jsonify(routes)
+        # Zuverlässigkeit je Route (Monte-Carlo-Simulation) als eigene Liste parallel zu den Routen; die Abschnitte
+        # behalten ihr Format (sie werden z.B. unverändert an /api/analyse_and_replan geschickt)
+        # Unvollständige Ergebnisse (Zeitlimit) werden im Header gekennzeichnet, der Body bleibt unverändert
+        ergebnis = {"routes": routes, "zuverlaessigkeit": bewerte_routen(routes)}
+        if engine == "zuverlaessig":
+            ergebnis["anschlusswahrscheinlichkeit"] = anschlusswahrscheinlichkeiten
+        response = jsonify(ergebnis)
+        response.headers["X-Route-Partial"] = "true" if status["partial"] else "false"
+
+        # Verspätungen aus dem Echtzeitfeed wendet nur die Heap-Suche an (Linienmuster und Trip-Index setzen die
+        # Reihenfolge der Fahrten im Sollfahrplan voraus); liegen Verspätungen vor, wird das Ergebnis gekennzeichnet
+        echtzeit_angewendet = engine == "heap" or not snapshot["echtzeit"]["overlay"]["ersetzt"]
+        response.headers["X-Route-Realtime"] = "true" if echtzeit_angewendet else "false"
+        return response
     except Exception as e:
         print(f"Error in /route: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -82,7 +412,17 @@ def api_analyse_and_replan():
                     }), 400
 
        
-        analysed_routes = analyse_and_replan(detailed_routes, station_departures)
+        # Gefährdete Umstiege: zuerst aus dem Suchbaum der ursprünglichen /route-Suche, sonst gebündelt neu geplant.
+        # station_departures und die Verbindungsliste werden erst geladen, wenn eine Route neu berechnet werden muss
+        pruefe_fahrplanversion()
+        snapshot = aktiver_snapshot
+        analysed_routes = analyse_and_replan(
+            detailed_routes, None, snapshot["kompilierter_fahrplan"],
+            hole_verbindungen=lambda: hole_daten(snapshot, "verbindungen"),
+            suchkontexte=aktuelle_suchkontexte(snapshot),
+            replan_cache=replan_cache,
+            cache_version=(snapshot["version"], snapshot["echtzeit"]["version"])
+        )
 
         return jsonify({
             "status": "success",
@@ -96,5 +436,60 @@ def api_analyse_and_replan():
             "message": str(e)
         }), 500
 
+# prüft den Zugriff auf die Admin-Endpunkte: Antwort bei verweigertem Zugriff, sonst None
+def pruefe_admin_zugriff():
+    if ADMIN_TOKEN:
+        token = request.headers.get("X-Admin-Token", "")
+        if hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+            return None
+    elif request.remote_addr in LOKALE_ADRESSEN:
+        return None
+    return jsonify({"error": "Forbidden"}), 403
+
+
+@app.route("/admin/fahrplan", methods=["GET"])
+def admin_fahrplan_version():
+    verweigert = pruefe_admin_zugriff()
+    if verweigert:
+        return verweigert
+
+    snapshot = aktiver_snapshot
+    return jsonify({
+        "version": snapshot["version"],
+        "geladen_um": snapshot["geladen_um"].isoformat(),
+        "echtzeit_version": snapshot["echtzeit"]["version"],
+        "eingetragene_version": lies_aktuelle_version(),
+        "laedt": _wechsel["laedt"],
+        "fehler": _wechsel["fehler"]
+    })
+
+
+@app.route("/admin/fahrplan", methods=["POST"])
+def admin_fahrplan_wechseln():
+    verweigert = pruefe_admin_zugriff()
+    if verweigert:
+        return verweigert
+
+    data = request.get_json(silent=True) or {}
+    version = data.get("version")
+
+    if not version:
+        return jsonify({"error": "Missing required parameter: version"}), 400
+
+    verzeichnis = "." if version == BASISVERSION else os.path.join(FAHRPLAN_VERZEICHNIS, version)
+    if os.path.basename(version) != version or not os.path.exists(os.path.join(verzeichnis, "station_departure.pkl")):
+        return jsonify({"error": f"Unknown timetable version '{version}'"}), 404
+
+    if not starte_snapshot_wechsel(version):
+        return jsonify({"error": f"Timetable version '{_wechsel['laedt']}' is currently being loaded"}), 409
+
+    # Eintrag in der Versionsdatei, damit auch die übrigen Worker wechseln
+    if os.path.isdir(FAHRPLAN_VERZEICHNIS):
+        with open(VERSIONSDATEI, "w", encoding="utf-8") as f:
+            f.write(version)
+
+    return jsonify({"status": "loading", "version": version, "active_version": aktiver_snapshot["version"]}), 202
+
+
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=5001, debug=True)
@@ -0,0 +1,231 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from routen_berechnung import oeffne_datenbank
+
+
+# Korridor-Filter für die Routensuche: beschränkt die Suche auf Bahnhöfe in einem Umkreis um den Startbahnhof
+# (radius) oder in einem Rechteck entlang der Luftlinie Start → Ziel (rechteck), wie in experimental/ erprobt.
+# Die Koordinaten werden einmal in einen Raumindex (Gitter in Streifen über projizierten Koordinaten) übertragen;
+# eine Anfrage prüft dann nur die Bahnhöfe der betroffenen Gitterzellen, vektorisiert mit numpy.
+
+ERDRADIUS_KM = 6371.0
+
+# Verfügbare Korridor-Filter (Parameter `corridor` der Flask-App)
+KORRIDORE = ("radius", "rechteck")
+
+
+"""
+liest die Koordinaten (Breitengrad und Längengrad) aller Bahnhöfe aus der Tabelle stations und gibt sie als
+Dictionary {Bahnhof: (Breitengrad, Längengrad)} zurück; Bahnhöfe ohne Koordinaten werden ausgelassen.
+"""
+
+def lade_stationskoordinaten(connection):
+    stations_df = pd.read_sql("SELECT station_name, latitude, longitude FROM stations;", connection)
+    stations_df = stations_df.dropna(subset=["latitude", "longitude"])
+    return {
+        station: (float(lat), float(lon))
+        for station, lat, lon in zip(stations_df["station_name"], stations_df["latitude"], stations_df["longitude"])
+    }
+
+
+def load_station_coordinates_pickle(filename="station_coordinates.pkl"):
+    if os.path.exists(filename):
+        with open(filename, "rb") as f:
+            data = pickle.load(f)
+            if isinstance(data, dict) and data:
+                return data
+            print("Keine gültige station_coordinates Pickle-Datei gefunden.")
+    return None
+
+
+def save_station_coordinates_pickle(data, filename="station_coordinates.pkl"):
+    with open(filename, "wb") as f:
+        pickle.dump(data, f)
+    print(f"station_coordinates wurde als Pickle-Datei gespeichert: {filename}")
+
+
+"""
+erstellt den Raumindex für die Bahnhöfe eines kompilierten Fahrplans (Zugriff über die Bahnhofs-IDs).
+Die Koordinaten werden in Kilometer projiziert (x nach Osten, y nach Norden, Bezugsbreite ist die mittlere Breite
+aller Bahnhöfe) und in senkrechte Streifen der Breite `zellgroesse_km` einsortiert; innerhalb eines Streifens sind
+die Bahnhöfe nach y sortiert. Bahnhöfe ohne Koordinaten sind in jedem Korridor enthalten.
+"""
+
+def erstelle_raumindex(kompilierter_fahrplan, station_coordinates, zellgroesse_km=50):
+    stationen = kompilierter_fahrplan["stationen"]
+    breite = np.full(len(stationen), np.nan)
+    laenge = np.full(len(stationen), np.nan)
+    for station_id, station in enumerate(stationen):
+        if station in station_coordinates:
+            breite[station_id], laenge[station_id] = station_coordinates[station]
+
+    mit_koordinaten = np.flatnonzero(~np.isnan(breite))
+    bezugsbreite = np.radians(breite[mit_koordinaten].mean()) if len(mit_koordinaten) else 0.0
+    x = ERDRADIUS_KM * np.radians(laenge) * np.cos(bezugsbreite)
+    y = ERDRADIUS_KM * np.radians(breite)
+
+    # Einheitsvektoren auf der Kugel: Großkreisentfernung über das Skalarprodukt (statt Haversine je Paar)
+    einheit = np.column_stack((
+        np.cos(np.radians(breite)) * np.cos(np.radians(laenge)),
+        np.cos(np.radians(breite)) * np.sin(np.radians(laenge)),
+        np.sin(np.radians(breite)),
+    ))
+
+    # Sortierschlüssel: Streifen (x) und darin y; so liefert eine binäre Suche je Streifen den y-Bereich
+    y_min = y[mit_koordinaten].min() if len(mit_koordinaten) else 0.0
+    spanne = (y[mit_koordinaten].max() - y_min + 1.0) if len(mit_koordinaten) else 1.0
+    streifen = np.floor(x[mit_koordinaten] / zellgroesse_km).astype(np.int64)
+    erster_streifen = int(streifen.min()) if len(streifen) else 0
+    schluessel = (streifen - erster_streifen) * spanne + (y[mit_koordinaten] - y_min)
+    reihenfolge = np.argsort(schluessel, kind="stable")
+
+    return {
+        "zellgroesse_km": zellgroesse_km,
+        "bezugsbreite": bezugsbreite,
+        "x": x,
+        "y": y,
+        "einheit": einheit,
+        "sortiert": mit_koordinaten[reihenfolge],
+        "schluessel": schluessel[reihenfolge],
+        "erster_streifen": erster_streifen,
+        "anzahl_streifen": int(streifen.max()) - erster_streifen + 1 if len(streifen) else 0,
+        "y_min": y_min,
+        "spanne": spanne,
+        # Ohne Koordinaten: immer erlaubt (Grundmaske jeder Anfrage)
+        "grundmaske": np.isnan(breite),
+    }
+
+
+# liefert die IDs aller Bahnhöfe mit Koordinaten im Bereich [x_min, x_max] × [y_min, y_max] (über die Streifen)
+def kandidaten_im_bereich(raumindex, x_min, x_max, y_min, y_max):
+    zellgroesse = raumindex["zellgroesse_km"]
+    von = max(int(np.floor(x_min / zellgroesse)) - raumindex["erster_streifen"], 0)
+    bis = min(int(np.floor(x_max / zellgroesse)) - raumindex["erster_streifen"], raumindex["anzahl_streifen"] - 1)
+    if von > bis:
+        return raumindex["sortiert"][:0]
+
+    # Eine binäre Suche je Streifen für Anfang und Ende des y-Bereichs, alle Streifen auf einmal
+    streifen = np.arange(von, bis + 1) * raumindex["spanne"]
+    unten = max(y_min - raumindex["y_min"], 0.0)
+    oben = min(y_max - raumindex["y_min"], raumindex["spanne"] - 1.0)
+    if unten > oben:
+        return raumindex["sortiert"][:0]
+    anfang = np.searchsorted(raumindex["schluessel"], streifen + unten, "left")
+    ende = np.searchsorted(raumindex["schluessel"], streifen + oben, "right")
+
+    # Bereiche [anfang, ende) zu einer Indexliste zusammensetzen
+    laengen = ende - anfang
+    gesamt = int(laengen.sum())
+    if gesamt == 0:
+        return raumindex["sortiert"][:0]
+    positionen = np.repeat(anfang - np.cumsum(laengen) + laengen, laengen) + np.arange(gesamt)
+    return raumindex["sortiert"][positionen]
+
+
+# Großkreisentfernung in km von einem Bahnhof zu den Bahnhöfen `kandidaten`, vektorisiert
+def luftlinien(raumindex, station_id, kandidaten):
+    einheit = raumindex["einheit"]
+    return ERDRADIUS_KM * np.arccos(np.clip(einheit[kandidaten] @ einheit[station_id], -1.0, 1.0))
+
+
+# wandelt die ausgewählten Bahnhöfe in die Maske für routenplanung um (bytes, 1 = erlaubt; Start und Ziel immer)
+def korridor_maske(raumindex, erlaubt, source_id, target_id):
+    maske = raumindex["grundmaske"].copy()
+    maske[erlaubt] = True
+    maske[source_id] = True
+    maske[target_id] = True
+    return maske.tobytes()
+
+
+"""
+Umkreis um den Startbahnhof mit dem Radius Entfernung(Start, Ziel) + `puffer_km` (wie routen_berechnung_radius).
+Gibt die Maske der erlaubten Bahnhöfe zurück oder None, wenn Start oder Ziel keine Koordinaten haben.
+"""
+
+def stationen_im_radius(raumindex, source_id, target_id, puffer_km=200):
+    if raumindex["grundmaske"][source_id] or raumindex["grundmaske"][target_id]:
+        return None
+
+    radius_km = luftlinien(raumindex, source_id, np.array([target_id]))[0] + puffer_km
+    winkel = min(radius_km / ERDRADIUS_KM, np.pi)
+
+    # Gitterzellen um den Umkreis: nach Norden und Süden höchstens der Radius (y ist längentreu), nach Osten und
+    # Westen die größte Längendifferenz der Kugelkappe; polwärts der Bezugsbreite ist die Projektion in x gestreckt
+    x, y = raumindex["x"][source_id], raumindex["y"][source_id]
+    einheit = raumindex["einheit"]
+    breite = np.arcsin(np.clip(einheit[source_id][2], -1.0, 1.0))
+    if np.sin(winkel) < np.cos(breite) and winkel < np.pi / 2:
+        laengendifferenz = np.arcsin(np.sin(winkel) / np.cos(breite))
+        rand_x = ERDRADIUS_KM * laengendifferenz * np.cos(raumindex["bezugsbreite"]) + 1.0
+        x_min, x_max = x - rand_x, x + rand_x
+    else:
+        # Kappe enthält einen Pol: alle Längen
+        x_min, x_max = np.nanmin(raumindex["x"]), np.nanmax(raumindex["x"])
+    kandidaten = kandidaten_im_bereich(raumindex, x_min, x_max, y - radius_km - 1.0, y + radius_km + 1.0)
+
+    # Entfernung <= Radius ⇔ Skalarprodukt der Einheitsvektoren >= cos(Radius / Erdradius)
+    erlaubt = kandidaten[einheit[kandidaten] @ einheit[source_id] >= np.cos(winkel)]
+    return korridor_maske(raumindex, erlaubt, source_id, target_id)
+
+
+"""
+Rechteck entlang der Luftlinie Start → Ziel: um `verlaengerung` (Anteil der Strecke) über Start und Ziel hinaus
+verlängert und seitlich `puffer_km` breit (wie station_in_extended_rectangle aus routen_berechnung_rechteck,
+aber in projizierten Kilometern statt in Grad). Gibt die Maske der erlaubten Bahnhöfe zurück oder None.
+"""
+
+def stationen_im_rechteck(raumindex, source_id, target_id, puffer_km=200, verlaengerung=0.2):
+    if raumindex["grundmaske"][source_id] or raumindex["grundmaske"][target_id]:
+        return None
+
+    sx, sy = raumindex["x"][source_id], raumindex["y"][source_id]
+    dx, dy = raumindex["x"][target_id] - sx, raumindex["y"][target_id] - sy
+    laenge = np.hypot(dx, dy)
+    if laenge == 0:
+        return None
+    dx, dy = dx / laenge, dy / laenge
+
+    # Eckpunkte des Rechtecks → Gitterzellen
+    anfang, ende = -verlaengerung * laenge, (1 + verlaengerung) * laenge
+    ecken_x = [sx + t * dx + s * -dy for t in (anfang, ende) for s in (-puffer_km, puffer_km)]
+    ecken_y = [sy + t * dy + s * dx for t in (anfang, ende) for s in (-puffer_km, puffer_km)]
+    kandidaten = kandidaten_im_bereich(raumindex, min(ecken_x), max(ecken_x), min(ecken_y), max(ecken_y))
+
+    # Lage relativ zur Strecke: Projektion (entlang) und orthogonaler Abstand (seitlich)
+    px = raumindex["x"][kandidaten] - sx
+    py = raumindex["y"][kandidaten] - sy
+    entlang = px * dx + py * dy
+    seitlich = np.abs(px * dy - py * dx)
+    erlaubt = kandidaten[(entlang >= anfang) & (entlang <= ende) & (seitlich <= puffer_km)]
+    return korridor_maske(raumindex, erlaubt, source_id, target_id)
+
+
+# wählt den Korridor-Filter nach Namen (radius, rechteck) für die Bahnhöfe `source` und `target`
+def erlaubte_stationen(raumindex, kompilierter_fahrplan, source, target, korridor, puffer_km=200):
+    station_id = kompilierter_fahrplan["station_id"]
+    if source not in station_id or target not in station_id:
+        return None
+    if korridor == "radius":
+        maske = stationen_im_radius(raumindex, station_id[source], station_id[target], puffer_km)
+    elif korridor == "rechteck":
+        maske = stationen_im_rechteck(raumindex, station_id[source], station_id[target], puffer_km)
+    else:
+        raise ValueError(f"Unbekannter Korridor '{korridor}', erwartet: {', '.join(KORRIDORE)}")
+
+    if maske is None:
+        print(f"⚠️ Koordinaten von {source} oder {target} fehlen – suche ohne Korridor-Filter.")
+    else:
+        print(f"📐 Korridor ({korridor}): {maske.count(1)} von {len(maske)} Bahnhöfen")
+    return maske
+
+
+if __name__ == "__main__":
+
+    # Bahnhofskoordinaten einmal aus der Datenbank lesen und für die Flask-App speichern
+    connection = oeffne_datenbank()
+    try:
+        save_station_coordinates_pickle(lade_stationskoordinaten(connection))
+    finally:
+        connection.close()
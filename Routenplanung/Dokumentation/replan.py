@@ -1,10 +1,30 @@
 from datetime import datetime, timedelta
-from routen_berechnung_2 import routenplanung, reconstruct_route_details, find_start_index, load_station_departures_pickle, save_station_departures_pickle, create_station_departures_from_db
+from collections import defaultdict, OrderedDict
+import threading
+import time
+from routen_berechnung import routenplanung, repariere_route, reconstruct_route_details, find_start_index, load_station_departures_pickle, save_station_departures_pickle, create_station_departures_from_db
+from routen_berechnung_csa import profil_zum_ziel, profilroute, verbindungen_als_routendetails
+from fahrplan import datetime_in_minuten
+from zuverlaessigkeit import bewerte_routen
 
-def replan(abschnitt, route, station_departures):
+
+# Suchhorizont der gebündelten Neuplanung: Abfahrten bis so viele Stunden nach dem spätesten Neustart
+REPLAN_HORIZONT_STUNDEN = 24
+
+# Cache der Alternativrouten: Gültigkeitsdauer, maximale Anzahl Einträge (LRU) und Intervall der Neustartzeiten,
+# die sich einen Eintrag teilen
+REPLAN_CACHE_TTL_SEKUNDEN = 300
+REPLAN_CACHE_MAX_EINTRAEGE = 2000
+REPLAN_CACHE_RUNDUNG_MINUTEN = 5
+
+# Wie lange (Sekunden) auf eine gleiche, bereits laufende Neuplanung einer anderen Anfrage gewartet wird
+REPLAN_CACHE_WARTEZEIT_SEKUNDEN = 30
+
+
+def gefaehrdeter_umstieg(abschnitt, route):
     """
-    Prüft, ob der Umstieg gefährdet ist, und plant ggf. eine Alternativroute.
-    Gibt ein Ergebnis-Dictionary zurück oder None, falls kein Problem erkannt wurde.
+    Prüft, ob der Umstieg am Ende des Abschnitts durch die erwartete Verspätung gefährdet ist.
+    Gibt (umsteigeort, ziel, neue Abfahrtszeit, Reisedatum) für die Neuplanung zurück oder None.
     """
 
     # Prüfung der Eingabedaten
@@ -18,24 +38,80 @@ def replan(abschnitt, route, station_departures):
     if umsteigezeit_minuten >= predicted_delay:
         return None  # Umstieg ist nicht gefährdet
 
-    
-    # Verspätung gefährdet den Umstieg – alternative Route muss geplant werden
+    # Verspätung gefährdet den Umstieg – neue Abfahrt frühestens nach der verspäteten Ankunft
     neue_startzeit = abschnitt["planned_arrival_to"] + timedelta(minutes=predicted_delay)
-    ziel = route[-1]["station_to"]
     travel_date = abschnitt["departure_date"]
+    return umsteigeort, route[-1]["station_to"], datetime.combine(travel_date, neue_startzeit.time()), travel_date
+
+
+def bekannte_fortsetzung(suchkontext, umstieg):
+    """
+    Liefert aus dem Suchkontext der ursprünglichen routenplanung eine Route ab dem Umsteigeort (repariere_route),
+    sofern der Kontext zum selben Ziel gehört und der Suchbaum eine Fortsetzung enthält; sonst None.
+    Die Route dient bei der Neuplanung als obere Schranke für die Ankunft.
+    """
+    umsteigeort, ziel, departure_time, _travel_date = umstieg
+    if suchkontext is None or suchkontext["target"] != ziel:
+        return None
+    return repariere_route(suchkontext, umsteigeort, departure_time)
+
+
+def fruehere_route(route_a, route_b):
+    """
+    Gibt von zwei Routen (jeweils auch None) die mit der früheren Ankunft am Ziel zurück, bei Gleichstand route_a.
+    """
+    if route_b is None or (route_a is not None and route_a[-1]["planned_arrival_to"] <= route_b[-1]["planned_arrival_to"]):
+        return route_a
+    return route_b
+
+
+def neue_route_einzeln(umstieg, station_departures, kompilierter_fahrplan=None, bekannte_route=None):
+    """
+    Sucht mit routenplanung eine neue Route ab dem Umsteigeort (umstieg wie von gefaehrdeter_umstieg).
+    Eine bekannte Fortsetzung (bekannte_fortsetzung) begrenzt die Suche: es wird nur noch nach Routen gesucht,
+    die nicht später ankommen. Gibt die Route mit der früheren Ankunft zurück oder None.
+    """
+    umsteigeort, ziel, departure_time, travel_date = umstieg
 
     # Routenplaner wird aufgerufen
     neue_routen = routenplanung(
         source=umsteigeort,
         target=ziel,
         station_departures=station_departures,
-        departure_time=datetime.combine(travel_date, neue_startzeit.time()),
-        travel_date=travel_date
+        departure_time=departure_time,
+        travel_date=travel_date,
+        kompilierter_fahrplan=kompilierter_fahrplan,
+        ankunftsschranke=bekannte_route[-1]["planned_arrival_to"] if bekannte_route else None
     )
 
+    return fruehere_route(neue_routen[0] if neue_routen else None, bekannte_route)
+
+
+def replan(abschnitt, route, station_departures, kompilierter_fahrplan=None, suchkontext=None):
+    """
+    Prüft, ob der Umstieg gefährdet ist, und plant ggf. eine Alternativroute.
+    Mit `suchkontext` (aus der routenplanung der Route) begrenzt die bekannte Fortsetzung aus dem Suchbaum
+    die neue Suche.
+    Gibt ein Ergebnis-Dictionary zurück oder None, falls kein Problem erkannt wurde.
+    """
+
+    umstieg = gefaehrdeter_umstieg(abschnitt, route)
+    if umstieg is None:
+        return None
+
+    neue_route = neue_route_einzeln(umstieg, station_departures, kompilierter_fahrplan,
+                                    bekannte_fortsetzung(suchkontext, umstieg))
+    return replan_ergebnis(route, umstieg[0], neue_route)
+
+
+def replan_ergebnis(route, umsteigeort, neue_route):
+    """
+    Baut das Ergebnis-Dictionary der Neuplanung: Teilroute bis zum Umsteigeort plus neue Route
+    und die dadurch entstehende Verspätung am Ziel (neue_route None: keine Verbindung gefunden).
+    """
+
     # Wenn eine alternative Route gefunden wurde: Verspätung berechnen
-    if neue_routen:
-        neue_route = neue_routen[0]
+    if neue_route:
         neue_ankunftszeit = neue_route[-1]["planned_arrival_to"]
         alte_ankunftszeit = route[-1]["planned_arrival_to"]
         verspaetung_minuten = (neue_ankunftszeit - alte_ankunftszeit).total_seconds() / 60
@@ -66,7 +142,194 @@ def replan(abschnitt, route, station_departures):
             "alternative_route": None,
             "status": "KEINE VERBINDUNG GEFUNDEN"
         }
-    
+
+
+def replan_gebuendelt(umstiege, verbindungen, min_transfer_minutes=5):
+    """
+    Plant alle gefährdeten Umstiege gemeinsam neu: je Ziel und Reisedatum eine einzige Profilsuche
+    (profil_zum_ziel), aus der jede Neuplanung nur noch ausgelesen wird.
+    `umstiege`: Liste von ((umsteigeort, ziel, neue Abfahrtszeit, Reisedatum), bekannte_route) mit dem
+    Umstieg wie von gefaehrdeter_umstieg und optional einer bekannten Fortsetzung (bekannte_fortsetzung).
+    Sind für alle Umstiege einer Gruppe Fortsetzungen bekannt, endet die Profilsuche bei deren spätester Ankunft
+    statt REPLAN_HORIZONT_STUNDEN nach dem spätesten Neustart.
+    Gibt die neuen Routen ab dem Umsteigeort (oder None) in derselben Reihenfolge zurück.
+    """
+
+    # Gefährdete Umstiege nach Ziel und Reisedatum gruppieren
+    gruppen = defaultdict(list)
+    for nummer, ((umsteigeort, ziel, departure_time, travel_date), bekannte_route) in enumerate(umstiege):
+        start_minuten = datetime_in_minuten(departure_time, travel_date)
+        if bekannte_route:
+            horizont = datetime_in_minuten(bekannte_route[-1]["planned_arrival_to"], travel_date) + 1
+        else:
+            horizont = start_minuten + REPLAN_HORIZONT_STUNDEN * 60
+        gruppen[(ziel, travel_date)].append((nummer, umsteigeort, start_minuten, horizont))
+
+    neue_routen = [None] * len(umstiege)
+    for (ziel, travel_date), anfragen in gruppen.items():
+        profil, naechste = profil_zum_ziel(
+            verbindungen, ziel, min(anfrage[2] for anfrage in anfragen), max(anfrage[3] for anfrage in anfragen),
+            min_transfer_minutes=min_transfer_minutes
+        )
+
+        for nummer, umsteigeort, start_minuten, _horizont in anfragen:
+            neue_route = profilroute(profil, naechste, umsteigeort, start_minuten)
+            if neue_route:
+                neue_route = verbindungen_als_routendetails(verbindungen, neue_route, travel_date)
+            neue_routen[nummer] = fruehere_route(neue_route, umstiege[nummer][1])
+
+    return neue_routen
+
+
+def erstelle_replan_cache(ttl_sekunden=REPLAN_CACHE_TTL_SEKUNDEN, max_eintraege=REPLAN_CACHE_MAX_EINTRAEGE):
+    """
+    Erstellt einen leeren Cache für Alternativrouten (siehe plane_umstiege). Einträge verfallen nach
+    `ttl_sekunden`; sind mehr als `max_eintraege` gespeichert, fällt der am längsten nicht genutzte heraus.
+    Neustarts innerhalb von REPLAN_CACHE_RUNDUNG_MINUTEN teilen sich einen Eintrag (replan_cache_eintrag).
+    Der Cache kann von mehreren Threads gleichzeitig genutzt werden.
+    """
+    return {
+        # Eintrag → (Zeitpunkt der Berechnung, Route ab Umsteigeort oder None, Neustartzeit der Suche)
+        "eintraege": OrderedDict(),
+        "laufend": {},  # Eintrag → threading.Event der Anfrage, die diese Route gerade berechnet
+        "ttl_sekunden": ttl_sekunden,
+        "max_eintraege": max_eintraege,
+        "lock": threading.Lock(),
+    }
+
+
+# rundet eine Neustartzeit auf volle `minuten` ab (Neustarts im selben Intervall teilen sich einen Cache-Eintrag)
+def gerundete_startzeit(departure_time, minuten=REPLAN_CACHE_RUNDUNG_MINUTEN):
+    rest = (departure_time.hour * 60 + departure_time.minute) % minuten
+    return departure_time.replace(second=0, microsecond=0) - timedelta(minutes=rest)
+
+
+# Eintrag im Cache zu einem Schlüssel (cache_version, umsteigeort, Neustartzeit, ziel): die Neustartzeit wird auf
+# volle REPLAN_CACHE_RUNDUNG_MINUTEN abgerundet, gesucht wird aber immer ab der genauen Neustartzeit
+def replan_cache_eintrag(schluessel):
+    cache_version, umsteigeort, startzeit, ziel = schluessel
+    return cache_version, umsteigeort, gerundete_startzeit(startzeit), ziel
+
+
+# prüft, ob eine ab `gesucht_ab` gefundene Route auch für einen Neustart um `startzeit` die beste ist: Sie muss
+# frühestens zur Neustartzeit abfahren, und die Suche darf nicht später begonnen haben (sonst fehlen Abfahrten)
+def route_gilt_ab(neue_route, gesucht_ab, startzeit):
+    return gesucht_ab <= startzeit and (neue_route is None or neue_route[0]["planned_departure_from"] >= startzeit)
+
+
+def replan_cache_lesen(cache, schluessel):
+    """
+    Liest eine Alternativroute aus dem Cache. Rückgabe (True, Route) bei einem gültigen Eintrag, dessen Route auch
+    ab der Neustartzeit von `schluessel` gilt (route_gilt_ab); sonst (False, Event), wenn eine andere Anfrage den
+    Eintrag gerade berechnet, oder (False, None) – dann ist er für den Aufrufer reserviert und muss mit
+    replan_cache_schreiben (oder replan_cache_freigeben) beendet werden.
+    """
+    eintrag_schluessel = replan_cache_eintrag(schluessel)
+    with cache["lock"]:
+        eintrag = cache["eintraege"].get(eintrag_schluessel)
+        if eintrag is not None:
+            if time.monotonic() - eintrag[0] > cache["ttl_sekunden"]:
+                del cache["eintraege"][eintrag_schluessel]
+            elif route_gilt_ab(eintrag[1], eintrag[2], schluessel[2]):
+                cache["eintraege"].move_to_end(eintrag_schluessel)
+                return True, eintrag[1]
+
+        laufend = cache["laufend"].get(eintrag_schluessel)
+        if laufend is not None:
+            return False, laufend
+        cache["laufend"][eintrag_schluessel] = threading.Event()
+        return False, None
+
+
+def replan_cache_schreiben(cache, schluessel, neue_route):
+    """
+    Speichert eine ab der Neustartzeit von `schluessel` berechnete Alternativroute (auch None: keine Verbindung)
+    und weckt wartende Anfragen. Der Fahrplan-/Verspätungsstand ist Teil des Schlüssels (schluessel[0]); Einträge
+    älterer Stände werden nicht mehr gelesen und fallen über TTL bzw. LRU heraus.
+    """
+    eintrag_schluessel = replan_cache_eintrag(schluessel)
+    with cache["lock"]:
+        cache["eintraege"][eintrag_schluessel] = (time.monotonic(), neue_route, schluessel[2])
+        cache["eintraege"].move_to_end(eintrag_schluessel)
+        while len(cache["eintraege"]) > cache["max_eintraege"]:
+            cache["eintraege"].popitem(last=False)
+    replan_cache_freigeben(cache, schluessel)
+
+
+def replan_cache_freigeben(cache, schluessel):
+    """
+    Gibt die Reservierung eines Schlüssels frei (z.B. nach einem Fehler) und weckt wartende Anfragen.
+    """
+    with cache["lock"]:
+        laufend = cache["laufend"].pop(replan_cache_eintrag(schluessel), None)
+    if laufend is not None:
+        laufend.set()
+
+
+def plane_umstiege(umstiege, station_departures, kompilierter_fahrplan=None, verbindungen=None,
+                   replan_cache=None, hole_verbindungen=None):
+    """
+    Berechnet die neuen Routen für gefährdete Umstiege: `umstiege` ordnet jedem Cache-Schlüssel
+    (cache_version, umsteigeort, Neustartzeit, ziel) den Umstieg und eine optionale bekannte Fortsetzung zu.
+    Mit `verbindungen` werden alle Routen gebündelt berechnet (replan_gebuendelt), sonst einzeln.
+    Statt der Verbindungsliste kann `hole_verbindungen` übergeben werden, eine Funktion, die sie liefert; sie wird
+    erst aufgerufen, wenn tatsächlich eine Route berechnet werden muss (nicht bei Cache-Treffern).
+    Mit `replan_cache` werden gespeicherte Routen wiederverwendet und neue gespeichert; gleiche Schlüssel, die
+    eine andere Anfrage gerade berechnet, werden abgewartet statt erneut berechnet.
+    Gibt ein Dictionary Schlüssel → Route ab Umsteigeort (oder None) zurück.
+    """
+
+    def berechne(schluessel_liste):
+        if not schluessel_liste:
+            return {}
+        auftraege = [umstiege[schluessel] for schluessel in schluessel_liste]
+        liste = verbindungen if verbindungen is not None or hole_verbindungen is None else hole_verbindungen()
+        if liste is not None:
+            return dict(zip(schluessel_liste, replan_gebuendelt(auftraege, liste)))
+        return {
+            schluessel: neue_route_einzeln(umstieg, station_departures, kompilierter_fahrplan, bekannte_route)
+            for schluessel, (umstieg, bekannte_route) in zip(schluessel_liste, auftraege)
+        }
+
+    if replan_cache is None:
+        return berechne(list(umstiege))
+
+    # Cache befragen: Treffer übernehmen, eigene Reservierungen berechnen, fremde abwarten
+    neue_routen = {}
+    reserviert = []
+    abwarten = []
+    for schluessel in umstiege:
+        treffer, wert = replan_cache_lesen(replan_cache, schluessel)
+        if treffer:
+            neue_routen[schluessel] = wert
+        elif wert is None:
+            reserviert.append(schluessel)
+        else:
+            abwarten.append((schluessel, wert))
+
+    try:
+        berechnet = berechne(reserviert)
+        for schluessel, neue_route in berechnet.items():
+            replan_cache_schreiben(replan_cache, schluessel, neue_route)
+        neue_routen.update(berechnet)
+    finally:
+        for schluessel in reserviert:
+            replan_cache_freigeben(replan_cache, schluessel)
+
+    # Von anderen Anfragen berechnete Routen; fehlen sie (Fehler, Zeitlimit), werden sie selbst berechnet
+    fehlend = []
+    for schluessel, laufend in abwarten:
+        laufend.wait(REPLAN_CACHE_WARTEZEIT_SEKUNDEN)
+        with replan_cache["lock"]:
+            eintrag = replan_cache["eintraege"].get(replan_cache_eintrag(schluessel))
+        if eintrag is not None and route_gilt_ab(eintrag[1], eintrag[2], schluessel[2]):
+            neue_routen[schluessel] = eintrag[1]
+        else:
+            fehlend.append(schluessel)
+    if fehlend:
+        neue_routen.update(berechne(fehlend))
+
+    return neue_routen
 
 
 def berechne_gesamtverspaetungswahrscheinlichkeit(route):
@@ -132,41 +395,87 @@ def berechne_gesamtverspaetungswahrscheinlichkeit(route):
 
 
 
-def analyse_and_replan(detailed_routes, station_departures):
+def suchkontext_der_route(suchkontexte, route):
+    """
+    Sucht den Suchkontext der ursprünglichen routenplanung einer Route:
+    `suchkontexte` ordnet (Start, Ziel, Reisedatum) den Kontext zu.
+    """
+    if not suchkontexte:
+        return None
+    return suchkontexte.get((route[0].get("station_from"), route[-1].get("station_to"), route[0].get("departure_date")))
+
+
+def analyse_and_replan(detailed_routes, station_departures, kompilierter_fahrplan=None, verbindungen=None,
+                       suchkontexte=None, replan_cache=None, cache_version=None, hole_verbindungen=None):
     """
     Analysiert mehrere Verbindungen auf gefährdete Umstiege.
     Führt bei Bedarf Neuplanungen durch und berechnet Verspätungswahrscheinlichkeiten.
+    Mit `verbindungen` (Verbindungsliste) werden alle Neuplanungen gebündelt berechnet (replan_gebuendelt),
+    sonst einzeln mit routenplanung. `hole_verbindungen` liefert die Verbindungsliste erst bei Bedarf (siehe
+    plane_umstiege), z.B. wenn sie wie im Flask-Dienst beim ersten Aufruf geladen wird.
+    Mit `suchkontexte` begrenzen die Fortsetzungen aus dem Suchbaum der ursprünglichen Suche die Neuplanung
+    (siehe suchkontext_der_route).
+    Zusätzlich wird jede Route mit bewerte_routen simuliert (Risiko je Umstieg, Verteilung der Ankunftsverspätung).
+    Mit `replan_cache` (erstelle_replan_cache) werden Alternativrouten zwischen Anfragen wiederverwendet;
+    `cache_version` kennzeichnet den Fahrplan- und Verspätungsstand. Gesucht wird immer ab der genauen
+    Neustartzeit, nur der Cache fasst Neustarts innerhalb von REPLAN_CACHE_RUNDUNG_MINUTEN zusammen.
     Gibt eine Liste von Analyseergebnissen zurück.
     """
 
+    # Alle gefährdeten Umstiege vorab einsammeln; gleiche Neuplanungen (auch aus verschiedenen Routen) nur einmal
+    umstiege = {}
+    schluessel_pro_abschnitt = {}
+    for route_nr, route in enumerate(detailed_routes):
+        suchkontext = suchkontext_der_route(suchkontexte, route)
+        for abschnitt_nr, abschnitt in enumerate(route):
+            umstieg = gefaehrdeter_umstieg(abschnitt, route)
+            if umstieg is None:
+                continue
+            umsteigeort, ziel, departure_time, _travel_date = umstieg
+            schluessel = (cache_version, umsteigeort, departure_time, ziel)
+            bekannte_route = bekannte_fortsetzung(suchkontext, umstieg)
+            if schluessel in umstiege:
+                bekannte_route = fruehere_route(umstiege[schluessel][1], bekannte_route)
+            umstiege[schluessel] = (umstieg, bekannte_route)
+            schluessel_pro_abschnitt[(route_nr, abschnitt_nr)] = schluessel
+
+    neue_routen = plane_umstiege(umstiege, station_departures, kompilierter_fahrplan, verbindungen, replan_cache,
+                                 hole_verbindungen)
+
     # Vorbereitung Ergebnisliste
     neue_analyse = []
 
+    # Zuverlässigkeit aller Routen mit denselben simulierten Verspätungen (Monte-Carlo, siehe zuverlaessigkeit.py)
+    zuverlaessigkeiten = bewerte_routen(detailed_routes)
+
     #Schleife über alle Routen
-    for route in detailed_routes:
+    for route_nr, route in enumerate(detailed_routes):
         neue_route_info = {
             "urspruengliche_route": route,
             "alternative_routeninfos": [],
             "erwartete_gesamtverspaetung_minuten": None,
-            "gesamtverspaetungswahrscheinlichkeit": None
+            "gesamtverspaetungswahrscheinlichkeit": None,
+            "zuverlaessigkeit": zuverlaessigkeiten[route_nr]
         }
 
         umstiegsgefahr_gefunden = False
         erste_verspaetung_gesetzt = False
 
         # Einzelne Abschnitte auf Gefährdung eines Umstiegs analysieren und gegebenenfalls dadurch erwartete verspätung berechnen
-        for abschnitt in route:
-            replan_ergebnis = replan(abschnitt, route, station_departures)
-
+        for abschnitt_nr, abschnitt in enumerate(route):
+            ergebnis = None
+            schluessel = schluessel_pro_abschnitt.get((route_nr, abschnitt_nr))
+            if schluessel is not None:
+                ergebnis = replan_ergebnis(route, schluessel[1], neue_routen[schluessel])
 
-            if replan_ergebnis:
+            if ergebnis:
                 umstiegsgefahr_gefunden = True
 
-                if replan_ergebnis["verspaetung_minuten"] is not None and not erste_verspaetung_gesetzt:
-                    neue_route_info["erwartete_gesamtverspaetung_minuten"] = replan_ergebnis["verspaetung_minuten"]
+                if ergebnis["verspaetung_minuten"] is not None and not erste_verspaetung_gesetzt:
+                    neue_route_info["erwartete_gesamtverspaetung_minuten"] = ergebnis["verspaetung_minuten"]
                     erste_verspaetung_gesetzt = True
 
-                neue_route_info["alternative_routeninfos"].append(replan_ergebnis)
+                neue_route_info["alternative_routeninfos"].append(ergebnis)
 
         if not umstiegsgefahr_gefunden:
             letzter_abschnitt = route[-1]
@@ -8,14 +8,31 @@ from collections import defaultdict, Counter
 import time
 import psycopg2
 from pprint import pprint
+import sys
+import json
+import math
+import mmap
+from array import array
+from fahrplan import zeit_in_minuten, minuten_in_datetime, datetime_in_minuten, erstelle_namensindex, MINUTEN_PRO_TAG
 
-"""
-erstellt ein Dictionary namens station_departures, in dem für jeden Bahnhof alle bekannten Abfahrten 
-(basierend auf dem geplanten Fahrplan in der Datenbank) gelistet sind. 
-"""
+# Zug-ID für den Startzustand (noch kein Zug genutzt) im kompilierten Fahrplan
+KEIN_ZUG = -1
+
+# Vorgänger-Label des Startzustands (Anfang der Route)
+KEIN_LABEL = -1
+
+# Felder je Label im flachen Label-Array: vorgaenger, von, nach, abfahrt, ankunft, zug, info, erster_zug
+LABEL_FELDER = 8
+
+# Fahrzeit zu/von einem Bahnhof, der im Bahnhofsgraph nicht erreichbar ist (untere Schranken)
+UNERREICHBAR = 2**31 - 1
 
-def create_station_departures_from_db():
-    connection = psycopg2.connect(
+# Anzahl der Routen, die routenplanung höchstens zurückgibt
+MAX_ROUTEN = 4
+
+# öffnet die Verbindung zur Fahrplan-Datenbank
+def oeffne_datenbank():
+    return psycopg2.connect(
         host="35.246.149.161",
         port=5432,
         dbname="postgres",
@@ -23,71 +40,274 @@ def create_station_departures_from_db():
         password="UWP12345!"
     )
 
+
+# Spalten der Sollfahrplan-Abfrage (Reihenfolge wie im SELECT)
+SOLLFAHRPLAN_SPALTEN = ["train_number", "station_name", "planned_departure", "planned_arrival",
+                        "reihenfolge", "zugtyp", "train_avg_30", "station_avg_30"]
+
+
+"""
+liest den Sollfahrplan über einen serverseitigen (benannten) Cursor blockweise (`chunk_size` Zeilen) und gibt
+DataFrames zurück, die jeweils nur vollständige Züge enthalten. Mit `zuege` werden nur diese Züge gelesen.
+"""
+
+def lese_sollfahrplan_bloecke(connection, chunk_size=200000, zuege=None):
+
     # SQL-Abfrage: Ruft Zugverbindungsdaten sortiert nach Zugnummer und Haltestellenreihenfolge ab
     query = """
         SELECT zug AS train_number, halt AS station_name, abfahrt_geplant AS planned_departure,
                ankunft_geplant AS planned_arrival, halt_nummer AS reihenfolge,
                zugtyp, train_avg_30, station_avg_30
         FROM sollfahrplan_reihenfolge
+        {filter}
         ORDER BY zug, halt_nummer;
     """
+    cursor = connection.cursor(name="sollfahrplan_stream")
+    cursor.itersize = chunk_size
+    if zuege is None:
+        cursor.execute(query.format(filter=""))
+    else:
+        cursor.execute(query.format(filter="WHERE zug = ANY(%s)"), (list(zuege),))
+
+    rest = []
+    while True:
+        zeilen = cursor.fetchmany(chunk_size)
+        if not zeilen:
+            break
+        zeilen = rest + zeilen
+
+        # Die Zeilen des letzten Zuges zurückhalten, da seine weiteren Halte im nächsten Block folgen können
+        grenze = len(zeilen)
+        while grenze > 0 and zeilen[grenze - 1][0] == zeilen[-1][0]:
+            grenze -= 1
+        rest = zeilen[grenze:]
+        if grenze > 0:
+            yield pd.DataFrame.from_records(zeilen[:grenze], columns=SOLLFAHRPLAN_SPALTEN)
+
+    if rest:
+        yield pd.DataFrame.from_records(rest, columns=SOLLFAHRPLAN_SPALTEN)
+
+    cursor.close()
+
+
+"""
+erstellt ein Dictionary namens station_departures, in dem für jeden Bahnhof alle bekannten Abfahrten 
+(basierend auf dem geplanten Fahrplan in der Datenbank) gelistet sind. 
+Die Zeilen werden blockweise gelesen und zugweise verarbeitet, sodass nie die ganze Tabelle gleichzeitig
+als Abfrageergebnis und DataFrame im Speicher liegt.
+"""
+
+def create_station_departures_from_db(chunk_size=200000):
+    connection = oeffne_datenbank()
+
+    # Einheitliches Datum für alle Blöcke (auch wenn der Import über Mitternacht läuft)
+    base_date = datetime.today().date()
+    station_departures = station_departures_aus_bloecken(lese_sollfahrplan_bloecke(connection, chunk_size), base_date)
 
-    # Ausführen der Abfrage und Laden in ein Pandas DataFrame
-    df = pd.read_sql(query, connection)
     connection.close()
+    return station_departures
 
-    # Umwandlung von Zeit-Strings in `datetime.time`-Objekte (z.B. "14:25:00" → `datetime.time`)
-    df["planned_departure"] = pd.to_datetime(df["planned_departure"], format="%H:%M:%S", errors="coerce").dt.time
-    df["planned_arrival"] = pd.to_datetime(df["planned_arrival"], format="%H:%M:%S", errors="coerce").dt.time
 
-    # Sortieren nach Zug und Reihenfolge
-    df.sort_values(by=["train_number", "reihenfolge"], inplace=True)
+# Sortierschlüssel der Abfahrtslisten: Abfahrtszeit, bei gleicher Zeit Zugnummer (unabhängig von der Lesereihenfolge)
+def abfahrt_und_zug(connection):
+    return connection[2], connection[0]
 
-    # Für jede Zeile die nächste Station und geplante Ankunftszeit dieser Station berechnen
-    df["next_station"] = df.groupby("train_number")["station_name"].shift(-1)
-    df["next_arrival"] = df.groupby("train_number")["planned_arrival"].shift(-1)
 
-    # Dictionary, das für jeden Bahnhof eine Liste von Abfahrten speichert
+# erstellt station_departures aus Blöcken vollständiger Züge (DataFrames im Format der Sollfahrplan-Abfrage)
+def station_departures_aus_bloecken(bloecke, base_date):
     station_departures = defaultdict(list)
 
+    # Jeden Block vollständiger Züge umwandeln und an die Abfahrtslisten anhängen
+    for df in bloecke:
+        for station, connections in erstelle_station_departures_aus_dataframe(df, base_date).items():
+            station_departures[station].extend(connections)
+
+    # Sortierung der Verbindungen pro Abfahrtsbahnhof nach Abfahrtszeit und Zug
+    for connections in station_departures.values():
+        connections.sort(key=abfahrt_und_zug)
+
+    return dict(station_departures)
+
+
+# berechnet in der Datenbank je Zug eine Prüfsumme über alle seine Halte (ändert sich bei jeder Fahrplankorrektur)
+def lade_zug_pruefsummen(connection):
+    query = """
+        SELECT zug, md5(string_agg(
+                   concat_ws('|', halt, abfahrt_geplant, ankunft_geplant, halt_nummer, zugtyp, train_avg_30, station_avg_30),
+                   ';' ORDER BY halt_nummer))
+        FROM sollfahrplan_reihenfolge
+        GROUP BY zug;
+    """
+    cursor = connection.cursor()
+    cursor.execute(query)
+    pruefsummen = dict(cursor.fetchall())
+    cursor.close()
+    return pruefsummen
+
+
+"""
+erstellt den Aktualisierungsstand zu einem station_departures-Dictionary: die Prüfsumme je Zug, die Bahnhöfe,
+an denen der Zug abfährt, und das Datum, mit dem die Zeiten gespeichert sind. Wird neben der Pickle-Datei
+gespeichert und von aktualisiere_station_departures verwendet.
+"""
+
+def erstelle_aktualisierungsstand(station_departures, pruefsummen):
+    stationen_pro_zug = defaultdict(set)
+    base_date = None
+    for from_station, connections in station_departures.items():
+        for connection in connections:
+            stationen_pro_zug[connection[0]].add(from_station)
+            if base_date is None:
+                base_date = connection[2].date()
+
+    return {
+        "pruefsummen": pruefsummen,
+        "stationen_pro_zug": dict(stationen_pro_zug),
+        "base_date": base_date if base_date is not None else datetime.today().date(),
+    }
+
+
+"""
+aktualisiert station_departures inkrementell: Über die Prüfsummen je Zug werden geänderte, neue und gelöschte
+Züge erkannt. Nur deren Verbindungen werden entfernt bzw. neu aus der Datenbank gelesen, und nur die betroffenen
+Bahnhofslisten werden neu sortiert. Ohne Aktualisierungsstand wird der Fahrplan vollständig neu erstellt.
+Gibt (station_departures, aktualisierungsstand, geänderte Züge) zurück; station_departures wird direkt verändert.
+"""
+
+def aktualisiere_station_departures(station_departures, aktualisierungsstand, chunk_size=200000):
+    connection = oeffne_datenbank()
+    pruefsummen = lade_zug_pruefsummen(connection)
+
+    # Kein Stand vorhanden → vollständiger Neuaufbau
+    if station_departures is None or aktualisierungsstand is None:
+        connection.close()
+        station_departures = create_station_departures_from_db(chunk_size)
+        return station_departures, erstelle_aktualisierungsstand(station_departures, pruefsummen), set(pruefsummen)
+
+    try:
+        return uebernehme_zugaenderungen(
+            station_departures, aktualisierungsstand, pruefsummen,
+            lambda zuege: lese_sollfahrplan_bloecke(connection, chunk_size, zuege=zuege)
+        )
+    finally:
+        connection.close()
+
+
+"""
+übernimmt die Änderungen gegenüber dem Aktualisierungsstand in station_departures (ohne Datenbankzugriff).
+`pruefsummen` sind die aktuellen Prüfsummen je Zug, `lese_zuege(zuege)` liefert die Halte dieser Züge als Blöcke
+vollständiger Züge (DataFrames im Format der Sollfahrplan-Abfrage). Das Ergebnis entspricht einem vollständigen
+Neuaufbau mit station_departures_aus_bloecken. Rückgabe wie aktualisiere_station_departures.
+"""
+
+def uebernehme_zugaenderungen(station_departures, aktualisierungsstand, pruefsummen, lese_zuege):
+    alte_pruefsummen = aktualisierungsstand["pruefsummen"]
+    stationen_pro_zug = aktualisierungsstand["stationen_pro_zug"]
+    base_date = aktualisierungsstand["base_date"]
+
+    geaendert = {zug for zug, summe in pruefsummen.items() if alte_pruefsummen.get(zug) != summe}
+    entfernt = set(alte_pruefsummen) - set(pruefsummen)
+    betroffen = geaendert | entfernt
+    if not betroffen:
+        print(" Fahrplan unverändert")
+        return station_departures, aktualisierungsstand, betroffen
+
+    # Alte Verbindungen der betroffenen Züge entfernen (nur an den Bahnhöfen, an denen sie abfahren)
+    betroffene_stationen = set()
+    for zug in betroffen:
+        for station in stationen_pro_zug.pop(zug, ()):
+            betroffene_stationen.add(station)
+    for station in betroffene_stationen:
+        station_departures[station] = [c for c in station_departures[station] if c[0] not in betroffen]
+
+    # Neue Verbindungen der geänderten Züge lesen und anhängen
+    if geaendert:
+        for df in lese_zuege(geaendert):
+            for station, connections in erstelle_station_departures_aus_dataframe(df, base_date).items():
+                station_departures.setdefault(station, []).extend(connections)
+                betroffene_stationen.add(station)
+                for connection_tuple in connections:
+                    stationen_pro_zug.setdefault(connection_tuple[0], set()).add(station)
+
+    # Nur die betroffenen Bahnhofslisten neu sortieren (wie beim Neuaufbau); leere Listen entfallen
+    for station in betroffene_stationen:
+        if station_departures[station]:
+            station_departures[station].sort(key=abfahrt_und_zug)
+        else:
+            del station_departures[station]
+
+    aktualisierungsstand["pruefsummen"] = pruefsummen
+    print(f" {len(betroffen)} Züge aktualisiert, {len(betroffene_stationen)} Bahnhöfe neu sortiert")
+    return station_departures, aktualisierungsstand, betroffen
+
+
+"""
+baut station_departures spaltenweise (ohne Schleife über die Zeilen) aus dem DataFrame der Sollfahrplan-Abfrage:
+Zeitumwandlung, nächste Station/Ankunft per groupby-shift, Filtern ungültiger Zeilen und Sortierung nach
+Bahnhof und Abfahrt erfolgen vektorisiert in pandas. Erst zum Schluss werden die Tupel je Bahnhof erzeugt.
+"""
+
+def erstelle_station_departures_aus_dataframe(df, base_date=None):
+
     # Heutiges Datum als Basis (damit Zeitangaben zu datetime kombiniert werden können)
-    base_date = datetime.today().date()
+    if base_date is None:
+        base_date = datetime.today().date()
+    base_date = pd.Timestamp(base_date)
+
+    # Umwandlung von Zeit-Strings (z.B. "14:25:00") in datetime-Werte am heutigen Datum
+    def zeit_am_basisdatum(spalte):
+        zeitpunkt = pd.to_datetime(spalte, format="%H:%M:%S", errors="coerce")
+        return base_date + (zeitpunkt - zeitpunkt.dt.normalize())
+
+    df = pd.DataFrame({
+        "train_number": df["train_number"],
+        "station_name": df["station_name"],
+        "planned_departure": zeit_am_basisdatum(df["planned_departure"]),
+        "planned_arrival": zeit_am_basisdatum(df["planned_arrival"]),
+        "reihenfolge": df["reihenfolge"],
+        "zugtyp": df["zugtyp"],
+        "train_avg_30": df["train_avg_30"],
+        "station_avg_30": df["station_avg_30"],
+    })
 
+    # Sortieren nach Zug und Reihenfolge
+    df.sort_values(by=["train_number", "reihenfolge"], inplace=True, kind="stable")
 
-    # Iteration über jede Zeile des DataFrames
-    for _, row in df.iterrows():
+    # Für jede Zeile die nächste Station und geplante Ankunftszeit dieser Station berechnen
+    naechster_halt = df.groupby("train_number", sort=False)[["station_name", "planned_arrival"]].shift(-1)
+    df["next_station"] = naechster_halt["station_name"]
+    df["next_arrival"] = naechster_halt["planned_arrival"]
 
-        # Informationen für die Routenplanung
-        train = row["train_number"]
-        from_station = row["station_name"]
-        to_station = row["next_station"]
-        dep_time = row["planned_departure"]
-        arr_time = row["next_arrival"]
-        zugtyp = row["zugtyp"]
+    # Ungültige Daten überspringen
+    df = df[df["planned_departure"].notna() & df["next_arrival"].notna() & df["next_station"].notna()]
 
-        # Informationen für die Vorhersage
-        halt_nummer = row["reihenfolge"] if pd.notna(row["reihenfolge"]) else None
-        train_avg_30 = row["train_avg_30"]
-        station_avg_30 = row["station_avg_30"]
+    # Sortierung der Verbindungen pro Abfahrtsbahnhof nach Abfahrtszeit (stabil, d.h. innerhalb gleicher Zeit nach Zug)
+    df = df.sort_values(by=["station_name", "planned_departure"], kind="stable")
 
-        # Ungültige Daten überspringen
-        if pd.isna(dep_time) or pd.isna(arr_time) or pd.isna(to_station):
-            continue
+    # Namen werden internalisiert, damit jeder Name nur einmal im Speicher/Pickle liegt (einmal je eindeutigem Namen)
+    def internalisiere(spalte):
+        namen = {name: sys.intern(name) if isinstance(name, str) else name for name in spalte.unique()}
+        return spalte.map(namen).tolist()
 
-        dep_dt = datetime.combine(base_date, dep_time)
-        arr_dt = datetime.combine(base_date, arr_time)
+    halt_nummer = df["reihenfolge"].astype(object).where(df["reihenfolge"].notna(), None)
 
-        # Eintrag in das Dictionary für die Abfahrtsstation
-        station_departures[from_station].append((
-            train, to_station, dep_dt, arr_dt,
-            zugtyp, halt_nummer, train_avg_30, station_avg_30
-        ))
+    verbindungen = list(zip(
+        internalisiere(df["train_number"]),
+        internalisiere(df["next_station"]),
+        df["planned_departure"].dt.to_pydatetime().tolist(),
+        df["next_arrival"].dt.to_pydatetime().tolist(),
+        df["zugtyp"].tolist(),
+        halt_nummer.tolist(),
+        df["train_avg_30"].tolist(),
+        df["station_avg_30"].tolist()
+    ))
 
-    # Sortierung der Verbindungen pro Abfahrtsbahnhof nach Abfahrtszeit
-    for connections in station_departures.values():
-        connections.sort(key=lambda x: x[2]) 
+    # Dictionary, das für jeden Bahnhof eine Liste von Abfahrten speichert (zusammenhängende Blöcke nach der Sortierung)
+    station_departures = {}
+    for station, positionen in df.groupby("station_name", sort=False).indices.items():
+        station_departures[sys.intern(station)] = verbindungen[positionen[0]:positionen[-1] + 1]
 
-    return dict(station_departures)
+    return station_departures
 
 
 """
@@ -149,130 +369,567 @@ def save_station_departures_pickle(data, filename="station_departure_2.pkl"):
         pickle.dump(data, f)
     print(f" station_departures wurde als Pickle-Datei gespeichert: {filename}")
 
-# findet den Index der ersten Verbindung, deren Abfahrtszeit gleich oder nach der angegebenen Ankunftszeit liegt.
-def find_start_index(connections, arrival_time_only):
-    for idx, conn in enumerate(connections):
-        train, next_station, dep_time, arr_time, zugtyp, halt_nummer, train_avg_30, station_avg_30 = conn
+# lädt den Aktualisierungsstand (Prüfsummen je Zug) zu einer station_departures-Pickle-Datei
+def lade_aktualisierungsstand(filename="station_departure_2_stand.pkl"):
+    if os.path.exists(filename):
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+    return None
 
-        if isinstance(dep_time, datetime):
-            dep_time_only = dep_time.time()
-        else:
-            dep_time_only = dep_time
+# speichert den Aktualisierungsstand neben der station_departures-Pickle-Datei
+def speichere_aktualisierungsstand(aktualisierungsstand, filename="station_departure_2_stand.pkl"):
+    with open(filename, "wb") as f:
+        pickle.dump(aktualisierungsstand, f)
 
-        # Wenn Abfahrtszeit nach (>=) Ankunftszeit liegt, nehmen wir diese Verbindung
-        if dep_time_only >= arrival_time_only:
-            return idx
+"""
+kompiliert station_departures für die Routensuche in ein kompaktes Format aus flachen, typisierten Arrays
+(struct of arrays). Bahnhöfe und Züge erhalten fortlaufende ganzzahlige IDs (stationen/zuege übersetzen zurück,
+station_id/zug_id hin). Die Verbindungen aller Bahnhöfe liegen hintereinander, nach Bahnhof und Abfahrt sortiert:
+- offsets[s] bis offsets[s + 1]: Bereich der Verbindungen von Bahnhof s
+- abfahrt, ankunft: Minuten seit Mitternacht; der Tagesfahrplan wird über `tage` Tage wiederholt (48 Stunden),
+  sodass Verbindungen nach Mitternacht ohne Tageskorrektur folgen
+- zug, ziel: Zug-ID und ID des nächsten Bahnhofs
+- info: Index in die Prognosedaten (info_zugtyp, info_halt_nummer, info_train_avg_30, info_station_avg_30),
+  die je Originalverbindung nur einmal gespeichert werden
+So kommt die Hauptschleife ohne datetime-Objekte und Namensvergleiche aus.
+"""
 
-    # Wenn keine spätere Abfahrt gefunden wird ➔ ab Index 0 neu prüfen (nächster Tag)
-    return 0
+# Namen der Arrays des kompilierten Fahrplans (Reihenfolge = Reihenfolge in der Binärdatei)
+FAHRPLAN_ARRAYS = (
+    "offsets", "abfahrt", "ankunft", "zug", "ziel", "info",
+    "info_zugtyp", "info_halt_nummer", "info_train_avg_30", "info_station_avg_30"
+)
 
-def reconstruct_route_details(previous_stop, previous_train, arrival_states, source, target_key, station_departures, travel_date, prediction_information):
-    
-    # Initialisiere leere Routeliste
-    route = []
+def kompiliere_station_departures(station_departures, tage=2):
 
-    # Entpacke Zielknoten: Bahnhof, Ankunftszeit, Zugnummer
-    station, arrival_time, train = target_key
+    # Namen → IDs (auch Bahnhöfe, die nur als Ziel vorkommen)
+    stationen, station_id = erstelle_namensindex(
+        list(station_departures) + [c[1] for connections in station_departures.values() for c in connections]
+    )
+    zuege, zug_id = erstelle_namensindex(c[0] for connections in station_departures.values() for c in connections)
+    zugtypen, zugtyp_id = erstelle_namensindex(c[4] for connections in station_departures.values() for c in connections)
+
+    kompiliert = {
+        "tage": tage,
+        "stationen": stationen,
+        "station_id": station_id,
+        "zuege": zuege,
+        "zug_id": zug_id,
+        "zugtypen": zugtypen,
+        "offsets": array("i", [0]),
+        "abfahrt": array("i"),
+        "ankunft": array("i"),
+        "zug": array("i"),
+        "ziel": array("i"),
+        "info": array("i"),
+        "info_zugtyp": array("i"),
+        "info_halt_nummer": array("i"),
+        "info_train_avg_30": array("d"),
+        "info_station_avg_30": array("d"),
+    }
+
+    eintraege_pro_station = [[] for _ in stationen]
+    for from_station, connections in station_departures.items():
+        for connection in connections:
+            (train, next_station, dep_time, arr_time, zugtyp, halt_nummer, train_avg_30, station_avg_30) = connection
+            abfahrt = zeit_in_minuten(dep_time)
+            ankunft = zeit_in_minuten(arr_time)
+
+            # Ankunft nach Mitternacht
+            if ankunft < abfahrt:
+                ankunft += MINUTEN_PRO_TAG
+
+            # Prognosedaten einmal je Originalverbindung (fehlende Werte: -1 bzw. NaN)
+            info = len(kompiliert["info_zugtyp"])
+            kompiliert["info_zugtyp"].append(zugtyp_id[zugtyp])
+            kompiliert["info_halt_nummer"].append(-1 if halt_nummer is None else int(halt_nummer))
+            kompiliert["info_train_avg_30"].append(float("nan") if train_avg_30 is None else float(train_avg_30))
+            kompiliert["info_station_avg_30"].append(float("nan") if station_avg_30 is None else float(station_avg_30))
+
+            for tag in range(tage):
+                versatz = tag * MINUTEN_PRO_TAG
+                eintraege_pro_station[station_id[from_station]].append(
+                    (abfahrt + versatz, ankunft + versatz, zug_id[train], station_id[next_station], info)
+                )
 
-     # Set zur Erkennung von Zyklen
-    visited = set()
+    # Verbindungen bahnhofsweise nach Abfahrt sortiert hintereinander ablegen
+    for eintraege in eintraege_pro_station:
+        eintraege.sort(key=lambda x: x[0])
+        for (abfahrt, ankunft, zug, ziel, info) in eintraege:
+            kompiliert["abfahrt"].append(abfahrt)
+            kompiliert["ankunft"].append(ankunft)
+            kompiliert["zug"].append(zug)
+            kompiliert["ziel"].append(ziel)
+            kompiliert["info"].append(info)
+        kompiliert["offsets"].append(len(kompiliert["abfahrt"]))
+
+    return kompiliert
+
+# Zuletzt kompilierter Fahrplan mit seinem station_departures-Objekt (siehe kompilierter_fahrplan_fuer)
+_letzte_kompilierung = {"station_departures": None, "kompiliert": None}
+
+
+# liefert den kompilierten Fahrplan zu `station_departures`; wird für dasselbe Objekt nur einmal erstellt, damit
+# Aufrufer ohne vorkompilierten Fahrplan (z.B. replan) nicht bei jeder Suche neu kompilieren
+def kompilierter_fahrplan_fuer(station_departures):
+    if _letzte_kompilierung["station_departures"] is not station_departures:
+        _letzte_kompilierung["kompiliert"] = kompiliere_station_departures(station_departures)
+        _letzte_kompilierung["station_departures"] = station_departures
+    return _letzte_kompilierung["kompiliert"]
+
+# liest die Prognosedaten einer Verbindung aus dem kompilierten Fahrplan (oder den Linienmustern, gleiche Spalten info_*)
+def verbindungsinfo(kompilierter_fahrplan, info):
+    halt_nummer = kompilierter_fahrplan["info_halt_nummer"][info]
+    train_avg_30 = kompilierter_fahrplan["info_train_avg_30"][info]
+    station_avg_30 = kompilierter_fahrplan["info_station_avg_30"][info]
+    return {
+        "zugtyp": kompilierter_fahrplan["zugtypen"][kompilierter_fahrplan["info_zugtyp"][info]],
+        "halt_nummer": None if halt_nummer < 0 else halt_nummer,
+        "train_avg_30": None if math.isnan(train_avg_30) else train_avg_30,
+        "station_avg_30": None if math.isnan(station_avg_30) else station_avg_30
+    }
 
-    # Wird für die Weitergabe der Abfahrtszeit an den nächsten Abschnitt genutzt
-    next_dep_time = None
 
-    # Info zu einem eventuell notwendigen Umstieg
-    pending_transfer_info = None
+"""
+erstellt eine Verspätungsüberlagerung (Overlay) für den kompilierten Fahrplan, ohne diesen zu verändern.
+`delays` ordnet (from_station, to_station, train_number) eine Verspätung (Abfahrt, Ankunft) in Minuten zu.
+Gespeichert werden nur die betroffenen Bahnhöfe:
+- ersetzt[s]: Indizes der verspäteten Verbindungen von Bahnhof s im Basisfahrplan (werden übersprungen)
+- zusatz[s]: die verspäteten Verbindungen (abfahrt, ankunft, zug, ziel, info) in Minuten, über `tage` Tage wiederholt
+Die zusammengeführte Abfahrtsliste eines Bahnhofs wird erst erstellt, wenn die Suche ihn erreicht (verbindungen_mit_overlay).
+"""
 
-    # Zählt Schritte zur Nachverfolgung
-    step = 0
+def erstelle_verspaetungsoverlay(kompilierter_fahrplan, delays):
+    station_id = kompilierter_fahrplan["station_id"]
+    zug_id = kompilierter_fahrplan["zug_id"]
 
-    # Führe die Schleife aus, bis wir keinen Vorgänger mehr haben
-    while (station, arrival_time, train) in previous_stop:
-        step += 1
+    # Verspätungen je Abfahrtsbahnhof: {(ziel, zug): (dep_delay, arr_delay)} mit IDs
+    verspaetungen_pro_station = defaultdict(dict)
+    for (from_station, to_station, train_number), verspaetung in delays.items():
+        if from_station in station_id and to_station in station_id and train_number in zug_id:
+            verspaetungen_pro_station[station_id[from_station]][(station_id[to_station], zug_id[train_number])] = verspaetung
 
-        # Zyklische Referenzen abfangen – sollte nicht vorkommen
-        if (station, arrival_time, train) in visited:
-            return None
-        visited.add((station, arrival_time, train))
+    overlay = {"ersetzt": {}, "zusatz": {}, "zusammengefuehrt": {}}
+    for von, verspaetungen in verspaetungen_pro_station.items():
+        ersetzt, zusatz = verspaetete_verbindungen(kompilierter_fahrplan, von, verspaetungen)
+        if ersetzt:
+            overlay["ersetzt"][von] = ersetzt
+            overlay["zusatz"][von] = zusatz
 
-        # Hole Vorgängerstation und Vorgängerzug aus vorherigen Dictionaries
-        prev_station = previous_stop[(station, arrival_time, train)]
-        prev_train = previous_train.get((station, arrival_time, train), None)
+    return overlay
 
-        dep_time = None
-        arrival_time_prev = None
 
-        # Lade mögliche Ankünfte an der Vorgängerstation
-        arrival_list = arrival_states.get(prev_station, [])
-        
-        # Suche passende Verbindung mit dem richtigen Zug
-        for (t_arrival, t_departure, transfers, tr) in arrival_list:
-            if tr == prev_train and t_arrival <= arrival_time:
-                dep_time = t_departure
-                arrival_time_prev = t_arrival
-                break
+"""
+bestimmt für einen Bahnhof die Indizes der verspäteten Basisverbindungen und die verschobenen Verbindungen.
+`verspaetungen`: {(ziel, zug): (dep_delay, arr_delay)} mit Bahnhofs- und Zug-IDs.
+"""
+
+def verspaetete_verbindungen(kompilierter_fahrplan, von, verspaetungen):
+    ende = kompilierter_fahrplan["tage"] * MINUTEN_PRO_TAG
+
+    # Alle Tageskopien der verspäteten Verbindungen; die früheste Kopie je Originalverbindung (info) ist Tag 0
+    ersetzt = set()
+    basis = {}
+    for i in range(kompilierter_fahrplan["offsets"][von], kompilierter_fahrplan["offsets"][von + 1]):
+        key = (kompilierter_fahrplan["ziel"][i], kompilierter_fahrplan["zug"][i])
+        if key in verspaetungen:
+            ersetzt.add(i)
+            info = kompilierter_fahrplan["info"][i]
+            if info not in basis or kompilierter_fahrplan["abfahrt"][i] < basis[info][0]:
+                basis[info] = (kompilierter_fahrplan["abfahrt"][i], kompilierter_fahrplan["ankunft"][i], key)
+
+    zusatz = []
+    for info, (abfahrt, ankunft, (nach, zug)) in basis.items():
+        dep_delay, arr_delay = verspaetungen[(nach, zug)]
+        abfahrt_neu = abfahrt + dep_delay
+        fahrzeit = ankunft + arr_delay - abfahrt_neu
+
+        # Ankunft vor der Abfahrt → Tageswechsel (wie beim Kompilieren)
+        if fahrzeit < 0:
+            fahrzeit += MINUTEN_PRO_TAG
+
+        # Tageskopien wie im Basisfahrplan; über Mitternacht verschobene Abfahrten erscheinen auch am Folgetag-Beginn
+        for tag in range(-1, kompilierter_fahrplan["tage"]):
+            abfahrt_tag = abfahrt_neu + tag * MINUTEN_PRO_TAG
+            if 0 <= abfahrt_tag < ende:
+                zusatz.append((abfahrt_tag, abfahrt_tag + fahrzeit, zug, nach, info))
 
-        # Abbruch, wenn keine passende Verbindung gefunden wurde
-        if dep_time is None:
+    return ersetzt, zusatz
+
+
+"""
+liefert die Verbindungen eines Bahnhofs mit Verspätungen als eigene, nach Abfahrt sortierte Listen
+(abfahrt, ankunft, zug, ziel, info) oder None, falls der Bahnhof keine verspäteten Verbindungen hat.
+Basisverbindungen und verspätete Verbindungen werden beim ersten Zugriff zusammengeführt und im Overlay gemerkt.
+"""
+
+def verbindungen_mit_overlay(kompilierter_fahrplan, overlay, station):
+    if station not in overlay["ersetzt"]:
+        return None
+
+    zusammengefuehrt = overlay["zusammengefuehrt"]
+    if station not in zusammengefuehrt:
+        ersetzt = overlay["ersetzt"][station]
+        eintraege = [
+            (kompilierter_fahrplan["abfahrt"][i], kompilierter_fahrplan["ankunft"][i], kompilierter_fahrplan["zug"][i],
+             kompilierter_fahrplan["ziel"][i], kompilierter_fahrplan["info"][i])
+            for i in range(kompilierter_fahrplan["offsets"][station], kompilierter_fahrplan["offsets"][station + 1])
+            if i not in ersetzt
+        ]
+        eintraege.extend(overlay["zusatz"][station])
+        eintraege.sort(key=lambda x: x[0])
+        zusammengefuehrt[station] = tuple([list(spalte) for spalte in zip(*eintraege)]) if eintraege else ([], [], [], [], [])
+
+    return zusammengefuehrt[station]
+
+"""
+erstellt untere Schranken für die Fahrzeit zwischen zwei Bahnhöfen (Landmarken, Dreiecksungleichung wie bei ALT).
+Grundlage ist der Bahnhofsgraph mit der kürzesten Fahrzeit je Kante (von, ziel) ohne Warte- und Umstiegszeiten,
+schneller kann keine Route sein. Für `anzahl_landmarken` Bahnhöfe werden per Dijkstra die kürzesten Fahrzeiten
+von der Landmarke zu allen Bahnhöfen (von_landmarke) und von allen Bahnhöfen zur Landmarke (zur_landmarke) bestimmt.
+Die erste Landmarke ist der Bahnhof mit den meisten Verbindungen, jede weitere der Bahnhof, der von den bisherigen
+am weitesten entfernt ist. Anders als der Umkreis bzw. das Rechteck in experimental/ kommt das ohne Koordinaten aus
+und schließt nie eine mögliche Route aus.
+routenplanung nutzt die Schranken nur zum Verwerfen von Zuständen; die Warteschlange bleibt nach Ankunftszeit
+geordnet (eine Ordnung nach Ankunft + Schranke wie bei A* ändert die Auswahl der Alternativrouten im Puffer).
+"""
+
+def erstelle_untergrenzen(kompilierter_fahrplan, anzahl_landmarken=16):
+    offsets = kompilierter_fahrplan["offsets"]
+    abfahrten = kompilierter_fahrplan["abfahrt"]
+    ankuenfte = kompilierter_fahrplan["ankunft"]
+    ziele = kompilierter_fahrplan["ziel"]
+    anzahl_stationen = len(kompilierter_fahrplan["stationen"])
+
+    # Kürzeste Fahrzeit je Kante des Bahnhofsgraphen
+    kantengewichte = {}
+    for von in range(anzahl_stationen):
+        for i in range(offsets[von], offsets[von + 1]):
+            kante = (von, ziele[i])
+            fahrzeit = ankuenfte[i] - abfahrten[i]
+            if fahrzeit < kantengewichte.get(kante, UNERREICHBAR):
+                kantengewichte[kante] = fahrzeit
+
+    vorwaerts = [[] for _ in range(anzahl_stationen)]
+    rueckwaerts = [[] for _ in range(anzahl_stationen)]
+    for (von, nach), fahrzeit in kantengewichte.items():
+        vorwaerts[von].append((nach, fahrzeit))
+        rueckwaerts[nach].append((von, fahrzeit))
+
+    untergrenzen = {"landmarken": [], "von_landmarke": [], "zur_landmarke": [], "kantengewichte": kantengewichte}
+    if anzahl_stationen == 0:
+        return untergrenzen
+
+    # Abstand jedes Bahnhofs zur nächstgelegenen bisherigen Landmarke (hin und zurück)
+    abstand = [UNERREICHBAR] * anzahl_stationen
+    landmarke = max(range(anzahl_stationen), key=lambda s: offsets[s + 1] - offsets[s])
+    while len(untergrenzen["landmarken"]) < min(anzahl_landmarken, anzahl_stationen):
+        von_landmarke = kuerzeste_fahrzeiten(vorwaerts, landmarke)
+        zur_landmarke = kuerzeste_fahrzeiten(rueckwaerts, landmarke)
+        untergrenzen["landmarken"].append(landmarke)
+        untergrenzen["von_landmarke"].append(von_landmarke)
+        untergrenzen["zur_landmarke"].append(zur_landmarke)
+
+        for s in range(anzahl_stationen):
+            if von_landmarke[s] != UNERREICHBAR and zur_landmarke[s] != UNERREICHBAR:
+                abstand[s] = min(abstand[s], von_landmarke[s] + zur_landmarke[s])
+            elif s == landmarke:
+                abstand[s] = 0
+
+        # Nächste Landmarke: am weitesten entfernter Bahnhof (unerreichbare Bahnhöfe zählen nicht)
+        kandidaten = [s for s in range(anzahl_stationen) if abstand[s] != UNERREICHBAR and abstand[s] > 0]
+        if not kandidaten:
             break
+        landmarke = max(kandidaten, key=lambda s: abstand[s])
 
-        # Bestimme die Abfahrtszeit an der aktuellen Station
-        if next_dep_time is not None:
-            departure_used = next_dep_time
-        else:
-            departure_used = None
-            for (arrival, departure, transfers, tr) in arrival_states.get(station, []):
-                if tr == train:
-                    departure_used = departure
-                    break
+    return untergrenzen
+
+
+# kürzeste Fahrzeiten (Dijkstra) von `start` zu allen Bahnhöfen; nicht erreichbare Bahnhöfe erhalten UNERREICHBAR
+def kuerzeste_fahrzeiten(nachbarn, start):
+    fahrzeiten = array("i", [UNERREICHBAR]) * len(nachbarn)
+    fahrzeiten[start] = 0
+    queue_local = [(0, start)]
+    while queue_local:
+        fahrzeit, station = heapq.heappop(queue_local)
+        if fahrzeit > fahrzeiten[station]:
+            continue
+        for nachbar, kante in nachbarn[station]:
+            if fahrzeit + kante < fahrzeiten[nachbar]:
+                fahrzeiten[nachbar] = fahrzeit + kante
+                heapq.heappush(queue_local, (fahrzeit + kante, nachbar))
+    return fahrzeiten
+
+
+"""
+untere Schranke der Fahrzeit von `station` nach `ziel` über die Dreiecksungleichung mit jeder Landmarke L:
+d(station, ziel) >= d(station, L) - d(ziel, L) und d(station, ziel) >= d(L, ziel) - d(L, station).
+Erreicht das Ziel eine Landmarke, die von `station` aus nicht erreichbar ist, ist auch das Ziel unerreichbar.
+"""
+
+def untere_schranke(untergrenzen, station, ziel):
+    schranke = 0
+    for von_landmarke, zur_landmarke in zip(untergrenzen["von_landmarke"], untergrenzen["zur_landmarke"]):
+        if zur_landmarke[ziel] != UNERREICHBAR:
+            if zur_landmarke[station] == UNERREICHBAR:
+                return UNERREICHBAR
+            schranke = max(schranke, zur_landmarke[station] - zur_landmarke[ziel])
+        if von_landmarke[ziel] != UNERREICHBAR and von_landmarke[station] != UNERREICHBAR:
+            schranke = max(schranke, von_landmarke[ziel] - von_landmarke[station])
+    return schranke
+
+
+"""
+Verspätungen können Fahrzeiten verkürzen (Abfahrt stärker verspätet als Ankunft), die Landmarken-Distanzen
+gelten aber für den Basisfahrplan. Die Summe, um die verspätete Verbindungen die kürzeste Fahrzeit ihrer Kante
+unterschreiten, wird von jeder Schranke abgezogen; so bleiben die Schranken auch mit Overlay zulässig.
+"""
+
+def aufholzeit_im_overlay(untergrenzen, overlay):
+    kantengewichte = untergrenzen["kantengewichte"]
+    kuerzeste = {}
+    for von, zusatz in overlay["zusatz"].items():
+        for (abfahrt, ankunft, zug, nach, info) in zusatz:
+            kante = (von, nach)
+            if ankunft - abfahrt < kuerzeste.get(kante, kantengewichte.get(kante, UNERREICHBAR)):
+                kuerzeste[kante] = ankunft - abfahrt
+    return sum(kantengewichte.get(kante, fahrzeit) - fahrzeit for kante, fahrzeit in kuerzeste.items())
+
+
+# Kennung und Version des Binärformats für den kompilierten Fahrplan
+FAHRPLAN_KENNUNG = b"FPLAN001"
+
+"""
+speichert einen kompilierten Fahrplan als Binärdatei: Kennung, Länge des Kopfes, JSON-Kopf (Namenstabellen und
+Lage der Arrays), danach die Arrays als rohe Bytes (jeweils auf 8 Byte ausgerichtet). Die Datei wird zuerst
+unter einem temporären Namen geschrieben und dann ersetzt, damit laufende Prozesse nie eine halbe Datei sehen.
+"""
+
+def speichere_kompilierten_fahrplan(kompiliert, filename="station_departure.fpl"):
+    kopf = {
+        "byteorder": sys.byteorder,
+        "tage": kompiliert["tage"],
+        "stationen": kompiliert["stationen"],
+        "zuege": kompiliert["zuege"],
+        "zugtypen": kompiliert["zugtypen"],
+        "arrays": {}
+    }
+    position = 0
+    for name in FAHRPLAN_ARRAYS:
+        werte = kompiliert[name]
+        kopf["arrays"][name] = [werte.typecode, position, len(werte)]
+        position += -(-len(werte) * werte.itemsize // 8) * 8
+
+    # Zahlentypen aus pandas/numpy (z.B. numpy.int64) in einfache Python-Werte umwandeln
+    kopf_bytes = json.dumps(kopf, default=lambda wert: wert.item() if hasattr(wert, "item") else str(wert)).encode("utf-8")
+    kopf_bytes += b" " * (-len(kopf_bytes) % 8)
+
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "wb") as f:
+        f.write(FAHRPLAN_KENNUNG)
+        f.write(len(kopf_bytes).to_bytes(8, "little"))
+        f.write(kopf_bytes)
+        for name in FAHRPLAN_ARRAYS:
+            daten = kompiliert[name].tobytes()
+            f.write(daten)
+            f.write(b"\0" * (-len(daten) % 8))
+    os.replace(temp_filename, filename)
+    print(f" Kompilierter Fahrplan wurde gespeichert: {filename}")
+
+"""
+lädt einen kompilierten Fahrplan per mmap. Die Arrays werden nicht kopiert, sondern direkt als typisierte
+memoryviews auf die Datei gelesen; mehrere Worker-Prozesse teilen sich so eine physische Kopie im Page-Cache
+und der Start dauert nur so lange wie das Einlesen der Namenstabellen.
+"""
+
+def lade_kompilierten_fahrplan(filename="station_departure.fpl"):
+    if not os.path.exists(filename):
+        return None
+
+    with open(filename, "rb") as f:
+        speicher = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if speicher[:8] != FAHRPLAN_KENNUNG:
+        print(f" Unbekanntes Dateiformat: {filename}")
+        return None
+
+    kopf_laenge = int.from_bytes(speicher[8:16], "little")
+    kopf = json.loads(speicher[16:16 + kopf_laenge].decode("utf-8"))
+    if kopf["byteorder"] != sys.byteorder:
+        print(f" Byte-Reihenfolge von {filename} passt nicht zu diesem System")
+        return None
+
+    daten_start = 16 + kopf_laenge
+    ansicht = memoryview(speicher)
+
+    kompiliert = {
+        "tage": kopf["tage"],
+        "stationen": kopf["stationen"],
+        "station_id": {name: idx for idx, name in enumerate(kopf["stationen"])},
+        "zuege": kopf["zuege"],
+        "zug_id": {name: idx for idx, name in enumerate(kopf["zuege"])},
+        "zugtypen": kopf["zugtypen"],
+    }
+    for name, (typecode, position, laenge) in kopf["arrays"].items():
+        anfang = daten_start + position
+        kompiliert[name] = ansicht[anfang:anfang + laenge * array(typecode).itemsize].cast(typecode)
+
+    return kompiliert
+
+# findet per binärer Suche den Index der ersten Verbindung (im Bereich lo bis hi), deren Abfahrtszeit (Minuten) gleich oder nach der angegebenen Ankunftszeit liegt.
+def find_start_index(abfahrten, arrival_minute, lo=0, hi=None):
+    if hi is None:
+        hi = len(abfahrten)
+    return bisect.bisect_left(abfahrten, arrival_minute, lo, hi)
+
+"""
+Rekonstruiert eine Route aus den Labels der Suche und übersetzt sie zurück in Bahnhofs- und Zugnamen.
+Label n belegt die LABEL_FELDER Einträge ab n * LABEL_FELDER im flachen Array `labels`:
+(vorgaenger, von, nach, abfahrt, ankunft, zug, info, erster_zug) mit IDs und Minuten.
+Ausgehend vom Label am Ziel wird über die Vorgänger-Labels zurückgegangen (ein Schritt pro Abschnitt).
+"""
+
+def reconstruct_route_details(labels, label, kompilierter_fahrplan, travel_date):
+
+    # Abschnitte vom Ziel zum Start einsammeln und umdrehen
+    abschnitte = []
+    while label != KEIN_LABEL:
+        abschnitt = labels[label * LABEL_FELDER:(label + 1) * LABEL_FELDER]
+        abschnitte.append(abschnitt)
+        label = abschnitt[0]
+    abschnitte.reverse()
+
+    route = []
+    for idx, (_vorgaenger, von, nach, abfahrt, ankunft, zug, info, _erster_zug) in enumerate(abschnitte):
 
         # Lade Zusatzinformationen zur Prognose
-        pred_info = prediction_information.get((prev_station, station, train), {})
-        zugtyp = pred_info.get("zugtyp")
-        halt_nummer = pred_info.get("halt_nummer")
-        train_avg_30 = pred_info.get("train_avg_30")
-        station_avg_30 = pred_info.get("station_avg_30")
+        pred_info = verbindungsinfo(kompilierter_fahrplan, info)
 
-        # Falls vorher ein Umstieg gemerkt wurde, hole Infos
+        # Umstieg am Ende dieses Abschnitts, falls der nächste Abschnitt mit einem anderen Zug fährt
         umsteigeort = None
         umsteigezeit_minuten = None
-        if pending_transfer_info:
-            umsteigeort, umsteigezeit_minuten = pending_transfer_info
-            pending_transfer_info = None  # Reset für nächsten Abschnitt
-
-        # Baue einen Routeneintrag aus allen gesammelten Infos
-        route_entry = {
-            "station_name_from": prev_station,
-            "station_name_to": station,
-            "planned_departure_from": departure_used,
-            "planned_arrival_to": arrival_time,
+        if idx + 1 < len(abschnitte) and abschnitte[idx + 1][5] != zug:
+            umsteigeort = kompilierter_fahrplan["stationen"][nach]
+            umsteigezeit_minuten = float(abschnitte[idx + 1][3] - ankunft)
+
+        # Baue einen Routeneintrag aus allen gesammelten Infos (erst hier werden datetime-Objekte und Namen erzeugt)
+        departure_dt = minuten_in_datetime(abfahrt, travel_date)
+        route.append({
+            "station_name_from": kompilierter_fahrplan["stationen"][von],
+            "station_name_to": kompilierter_fahrplan["stationen"][nach],
+            "planned_departure_from": departure_dt,
+            "planned_arrival_to": minuten_in_datetime(ankunft, travel_date),
+            "train_number": kompilierter_fahrplan["zuege"][zug],
+            "planned_arrival_date_from": departure_dt.date(),
+            "zugtyp": pred_info["zugtyp"],
+            "halt_nummer": pred_info["halt_nummer"],
+            "train_avg_30": pred_info["train_avg_30"],
+            "station_avg_30": pred_info["station_avg_30"],
+            "umsteigeort": umsteigeort,
+            "umsteigezeit_minuten": umsteigezeit_minuten
+        })
+
+    return route
+
+
+"""
+erstellt aus den Labels aller Zielzustände einer Suche das Zielprofil: für jeden Bahnhof (ID) die Abfahrten, von
+denen aus der Suchbaum zum Ziel führt, als sortierte Liste von (abfahrt, ziel_ankunft, ziel_label, abschnitt_nr).
+abschnitt_nr ist die Position dieses Abschnitts in der Route von ziel_label (siehe reconstruct_route_details).
+"""
+
+def erstelle_zielprofil(labels, ziel_labels):
+    zielprofil = defaultdict(list)
+    for ziel_label in ziel_labels:
+
+        # Kette der Labels vom Ziel zurück zum Start
+        kette = []
+        label = ziel_label
+        while label != KEIN_LABEL:
+            kette.append(label)
+            label = labels[label * LABEL_FELDER]
+
+        ziel_ankunft = labels[ziel_label * LABEL_FELDER + 4]
+        for abschnitt_nr, label in enumerate(reversed(kette)):
+            von = labels[label * LABEL_FELDER + 1]
+            abfahrt = labels[label * LABEL_FELDER + 3]
+            zielprofil[von].append((abfahrt, ziel_ankunft, ziel_label, abschnitt_nr))
+
+    for eintraege in zielprofil.values():
+        eintraege.sort()
+    return dict(zielprofil)
+
+
+"""
+plant eine Route ab `umsteigeort` und `departure_time` (z.B. nach einem verpassten Umstieg) aus dem Suchkontext
+einer früheren routenplanung zum selben Ziel, ohne neue Suche: Gewählt wird die Abfahrt im Zielprofil des Umsteigeorts
+mit der frühesten Zielankunft (bei Gleichstand die spätere Abfahrt), höchstens `max_initial_wait_hours` nach
+`departure_time`. Gibt den Rest der Route ab dem Umsteigeort zurück oder None, wenn der Suchbaum keine passende
+Fortsetzung enthält.
+"""
+
+def repariere_route(suchkontext, umsteigeort, departure_time, max_initial_wait_hours=6):
+    kompilierter_fahrplan = suchkontext["kompilierter_fahrplan"]
+    station = kompilierter_fahrplan["station_id"].get(umsteigeort)
+    eintraege = suchkontext["zielprofil"].get(station)
+    if not eintraege:
+        return None
+
+    start_minuten = datetime_in_minuten(departure_time, suchkontext["travel_date"])
+    letzte_abfahrt = start_minuten + max_initial_wait_hours * 60
+
+    beste = None
+    for idx in range(bisect.bisect_left(eintraege, (start_minuten,)), len(eintraege)):
+        abfahrt, ziel_ankunft, ziel_label, abschnitt_nr = eintraege[idx]
+        if abfahrt > letzte_abfahrt:
+            break
+        if beste is None or ziel_ankunft <= beste[1]:
+            beste = eintraege[idx]
+
+    if beste is None:
+        return None
+
+    route = reconstruct_route_details(suchkontext["labels"], beste[2], kompilierter_fahrplan, suchkontext["travel_date"])
+    return route[beste[3]:]
+
+
+"""
+baut aus einer vorwärts geordneten Liste von Fahrtabschnitten die Routeneinträge im selben Format wie
+reconstruct_route_details. Wird von den alternativen Suchverfahren (z.B. Connection Scan) genutzt.
+Jeder Abschnitt: (von, nach, zugnummer, abfahrt, ankunft, verbindung) mit datetime-Zeiten; verbindung ist das
+Originaltupel aus station_departures oder bereits die Prognosedaten als Dictionary (siehe verbindungsinfo).
+"""
+
+def baue_routendetails(abschnitte):
+    route = []
+    for idx, (from_station, to_station, train, departure, arrival, connection) in enumerate(abschnitte):
+        if isinstance(connection, dict):
+            zugtyp, halt_nummer = connection["zugtyp"], connection["halt_nummer"]
+            train_avg_30, station_avg_30 = connection["train_avg_30"], connection["station_avg_30"]
+        else:
+            (_train, _next_station, _dep, _arr, zugtyp, halt_nummer, train_avg_30, station_avg_30) = connection
+
+        # Umstieg am Ende dieses Abschnitts, falls der nächste Abschnitt mit einem anderen Zug fährt
+        umsteigeort = None
+        umsteigezeit_minuten = None
+        if idx + 1 < len(abschnitte) and abschnitte[idx + 1][2] != train:
+            umsteigeort = to_station
+            umsteigezeit_minuten = (abschnitte[idx + 1][3] - arrival).total_seconds() / 60
+
+        route.append({
+            "station_name_from": from_station,
+            "station_name_to": to_station,
+            "planned_departure_from": departure,
+            "planned_arrival_to": arrival,
             "train_number": train,
-            "planned_arrival_date_from": departure_used.date(),
+            "planned_arrival_date_from": departure.date(),
             "zugtyp": zugtyp,
             "halt_nummer": halt_nummer,
             "train_avg_30": train_avg_30,
             "station_avg_30": station_avg_30,
             "umsteigeort": umsteigeort,
             "umsteigezeit_minuten": umsteigezeit_minuten
-        }
-        
-        # Füge den Eintrag zur Route hinzu
-        route.append(route_entry)
-
-        # Falls ein Zugwechsel stattgefunden hat, berechne Umsteigezeit und merke sie
-        if (train != prev_train) and (prev_train is not None):
-            umsteigezeit_minuten_jetzt = (departure_used - arrival_time_prev).total_seconds() / 60
-            pending_transfer_info = (prev_station, umsteigezeit_minuten_jetzt)
-
-
-        # Vorbereitung für nächsten Loop-Durchlauf
-        station = prev_station
-        train = prev_train
-        arrival_time = arrival_time_prev
-        next_dep_time = dep_time
-
-    # Route wurde rückwärts aufgebaut, daher umdrehen
-    route.reverse()
+        })
 
     return route
 
@@ -282,10 +939,23 @@ def reconstruct_route_details(previous_stop, previous_train, arrival_states, sou
 # Berechnet (bis zu) vier optimale Zugverbindungen von einem Start- zu einem Zielbahnhof
 def routenplanung(source, target, station_departures, departure_time, buffer_minutes=600, min_transfer_minutes=5,  
                   max_initial_wait_hours=6, max_transfer_wait_hours=2, travel_date=None,
-                  max_attempts=5, delay_hours=2, max_duration_seconds = 5, delays = None):
+                  max_attempts=5, delay_hours=2, max_duration_seconds = 5, delays = None, kompilierter_fahrplan=None,
+                  verspaetungsoverlay=None, status=None, untergrenzen=None, erlaubte_stationen=None, suchkontext=None,
+                  ankunftsschranke=None):
 
     # (1) Initialisierung und Vorbereitung
 
+    # Optionales Dictionary für Rückmeldungen an den Aufrufer (z.B. status["partial"] bei Abbruch durch das Zeitlimit,
+    # status["verworfen"] / status["durchlaeufe"] für die Anzahl verworfener Verbindungen und Schritte der Warteschlange)
+    if status is None:
+        status = {}
+    status["partial"] = False
+
+    # Kompilierten Fahrplan (Minuten statt datetime) nur erstellen, wenn er nicht übergeben wurde; das geschieht
+    # vor dem Start des Zeitlimits und für dasselbe station_departures nur einmal (kompilierter_fahrplan_fuer)
+    if kompilierter_fahrplan is None:
+        kompilierter_fahrplan = kompilierter_fahrplan_fuer(station_departures)
+
     start_time_total = time.time() # Gesamtstartzeit zur Laufzeitmessung
     deadline_time = start_time_total + max_duration_seconds # Abbruchzeitpunkt für den Algorithmus
 
@@ -293,25 +963,47 @@ def routenplanung(source, target, station_departures, departure_time, buffer_min
     if travel_date is None:
         travel_date = datetime.today().date()
 
-    min_transfer_time = timedelta(minutes=min_transfer_minutes)
+    # Alle Zeiten der Suche sind ganze Minuten seit Mitternacht des Reisedatums
+    max_initial_wait = max_initial_wait_hours * 60
+    max_transfer_wait = max_transfer_wait_hours * 60
 
     # Datenstrukturen
-    previous_stop = {} # Speichert für jeden Zustand (Bahnhof, Zeit, Zug) den vorherigen Halt
-    previous_train = {} # Speichert den Zug vor dem aktuellen Abschnitt
-    arrival_info = defaultdict(lambda: (datetime.max, float("inf"))) # Für jeden Bahnhof: Beste bekannte Ankunftszeit + Anzahl Umstiege
-    arrival_states = defaultdict(list) # Liste aller bekannten Zustände pro Bahnhof
-    prediction_information = {} # Zusätzliche Infos zu genutzten Verbindungen ( für Verspätungsprognosen)
-    first_train_used = {} # Speichert für jeden Route den ersten genutzten Zug
+    labels = array("i") # Ein Label je erreichtem Zustand (LABEL_FELDER ganze Zahlen, siehe reconstruct_route_details)
+    arrival_info = defaultdict(lambda: (float("inf"), float("inf"))) # Für jeden Bahnhof: Beste bekannte Ankunftszeit + Anzahl Umstiege
     all_target_routes = set() # Speichert alle gültigen Routen zum Zielbahnhof
+    target_labels = {} # Label je Zielzustand (Bahnhof, Zeit, Zug); bei mehreren gewinnt das zuletzt erzeugte (spätere Abfahrt)
 
     verbindung_counter = 0 # Zählt die untersuchten Verbindungen (für Analyse/Debugging)
     iteration_count = 0 # Zählt die Schritte der Hauptschleife
+    pruned_counter = 0 # Zählt die durch Ankunftsschranke, Restfahrzeit zum Ziel oder Korridor verworfenen Verbindungen
 
-    current_departure_time = departure_time # Startzeit für ersten Durchlauf
+    current_departure_time = datetime_in_minuten(departure_time, travel_date) # Startzeit für ersten Durchlauf
+
+    # Falls Verspätungsdaten angegeben sind, werden sie als Overlay über den unveränderten Fahrplan gelegt
+    # (ein fertiges Overlay, z.B. aus dem Echtzeitfahrplan, wird direkt verwendet)
+    overlay = erstelle_verspaetungsoverlay(kompilierter_fahrplan, delays) if delays else verspaetungsoverlay
+
+    # Suche arbeitet mit Bahnhofs-IDs; unbekannte Bahnhöfe haben keine Verbindungen
+    station_id = kompilierter_fahrplan["station_id"]
+    if source not in station_id or target not in station_id:
+        print("\n❌ Keine Verbindung gefunden!")
+        return None
+    source_id = station_id[source]
+    target_id = station_id[target]
+
+    # Untere Schranken der Restfahrzeit zum Ziel je Bahnhof (ALT), werden erst bei Bedarf berechnet
+    restzeiten = None
+    if untergrenzen is not None:
+        restzeiten = {}
+        aufholzeit = aufholzeit_im_overlay(untergrenzen, overlay) if overlay is not None else 0
+
+        def restzeit_zum_ziel(station):
+            restzeit = untere_schranke(untergrenzen, station, target_id)
+            if restzeit != UNERREICHBAR:
+                restzeit = max(0, restzeit - aufholzeit)
+            restzeiten[station] = restzeit
+            return restzeit
 
-    # # Falls Verspätungsdaten angegeben sind, wende diese auf die Abfahrtsdaten an
-    if delays is not None:
-        station_departures = apply_delays_to_station_departures(station_departures, delays)
 
 
 
@@ -327,7 +1019,9 @@ def routenplanung(source, target, station_departures, departure_time, buffer_min
         for (station, arrival_time, train), transfers in all_routes_set:
 
             # Ermittle den ersten Zug der Route
-            first_train = first_train_used.get((station, arrival_time, train), "?")
+            # Startzustand (Start = Ziel) hat kein Label
+            label = target_labels.get((station, arrival_time, train), KEIN_LABEL)
+            first_train = labels[label * LABEL_FELDER + 7] if label != KEIN_LABEL else KEIN_ZUG
             key = (station, arrival_time, first_train)
 
              # Speichere Route nur, wenn sie besser (weniger Umstiege) ist als die bisher gespeicherte
@@ -353,7 +1047,7 @@ def routenplanung(source, target, station_departures, departure_time, buffer_min
             # Beste Route immer behalten
             filtered.append((best_route_info, best_transfers))
             for station, arrival_time, route_info, transfers in routes[1:]:
-                delta_minutes = (arrival_time - best_arrival_time).total_seconds() / 60
+                delta_minutes = arrival_time - best_arrival_time
 
                 # Weitere Routen nur behalten, wenn sie nah (innerhalb time_window_minutes) an der besten liegen 
                 # oder weniger Umstiege haben
@@ -362,8 +1056,9 @@ def routenplanung(source, target, station_departures, departure_time, buffer_min
                 elif delta_minutes > time_window_minutes and transfers < best_transfers:
                     filtered.append((route_info, transfers))
 
-        # Gib die gefilterten Routen zurück, sortiert nach Ankunftszeit
-        return sorted(filtered, key=lambda x: x[0][1])
+        # Gib die gefilterten Routen zurück, sortiert nach Ankunftszeit (bei gleicher Ankunft nach Umstiegen und
+        # letztem Zug, damit die Reihenfolge nicht von der Reihenfolge im Set abhängt)
+        return sorted(filtered, key=lambda x: (x[0][1], x[1], x[0][2]))
     
 
 
@@ -371,80 +1066,141 @@ def routenplanung(source, target, station_departures, departure_time, buffer_min
     # (3) Methode zur eigentlichen Routenberechnung
 
     # Der eigentliche Routing-Algorithmus. Nutzt eine Priority Queue (heap) zur Routenberechnung.
-    def verarbeite_verbindungen(current_departure_time, start_idx_override=None):
+    def verarbeite_verbindungen(current_departure_time):
 
         # Zugriff auf die äußeren Zählvariablen
-        nonlocal verbindung_counter, iteration_count
+        nonlocal verbindung_counter, iteration_count, pruned_counter
+
+        # Arrays des kompilierten Fahrplans als lokale Variablen (array.array oder memoryviews auf eine mmap-Datei)
+        offsets = kompilierter_fahrplan["offsets"]
+        abfahrten = kompilierter_fahrplan["abfahrt"]
+        ankuenfte = kompilierter_fahrplan["ankunft"]
+        zuege = kompilierter_fahrplan["zug"]
+        ziele = kompilierter_fahrplan["ziel"]
+        infos = kompilierter_fahrplan["info"]
+        basis_abfahrten = abfahrten
+        basis_arrays = (abfahrten, ankuenfte, zuege, ziele, infos)
 
         # Initialisierung der lokalen Prioritätswarteschlange
-        # Enthält Tupel: (Ankunftszeit, aktueller Bahnhof, aktueller Zug, Anzahl Umstiege)
-        queue_local = [(current_departure_time, source, None, 0)]
+        # Enthält Tupel aus ganzen Zahlen: (Ankunftszeit, aktueller Bahnhof, aktueller Zug, Anzahl Umstiege, Label)
+        queue_local = [(current_departure_time, source_id, KEIN_ZUG, 0, KEIN_LABEL)]
         heapq.heapify(queue_local)
 
+        # Ankunftsschranke: Zielankünfte ab (beste Zielankunft + buffer_minutes) werden nie angenommen. Da die
+        # Ankunftszeiten entlang einer Route nicht sinken, können Zustände, die später ankommen, verworfen werden.
+        # Eine bereits bekannte Route (ankunftsschranke, z.B. beim Neuplanen) begrenzt die Suche von Anfang an.
+        schranke = float("inf") if ankunftsschranke is None else datetime_in_minuten(ankunftsschranke, travel_date)
+
+        # Zusätzlich: Sobald MAX_ROUTEN verschiedene erste Züge das Ziel erreicht haben, kann keine spätere Ankunft
+        # mehr unter die ausgegebenen Routen kommen (filter_and_sort_routes behält je erstem Zug die früheste
+        # Ankunft, ausgegeben werden die frühesten MAX_ROUTEN). Der erste Zug einer Zielankunft steht erst fest,
+        # wenn alle Zustände dieser Minute abgearbeitet sind (ein späteres Label gewinnt), daher zählen nur
+        # Zielankünfte früherer Minuten.
+        offene_ziele = []
+        zielankunft_je_erstem_zug = {}
+
         # Hauptschleife: Solange noch Zustände in der Warteschlange sind
         while queue_local:
             # Hole Zustand mit frühester Ankunftszeit
-            arrival_time, current_stop, current_train, transfers = heapq.heappop(queue_local)
+            arrival_time, current_stop, current_train, transfers, label = heapq.heappop(queue_local)
             iteration_count += 1
 
+            # Zielankünfte früherer Minuten sind endgültig: Schranke auf die MAX_ROUTEN-te erste Zugankunft senken
+            if offene_ziele and arrival_time > offene_ziele[0][1]:
+                for ziel_key in offene_ziele:
+                    ziel_label = target_labels.get(ziel_key, KEIN_LABEL)
+                    erster_zug = labels[ziel_label * LABEL_FELDER + 7] if ziel_label != KEIN_LABEL else KEIN_ZUG
+                    if ziel_key[1] < zielankunft_je_erstem_zug.get(erster_zug, float("inf")):
+                        zielankunft_je_erstem_zug[erster_zug] = ziel_key[1]
+                offene_ziele.clear()
+                if len(zielankunft_je_erstem_zug) >= MAX_ROUTEN:
+                    schranke = min(schranke, sorted(zielankunft_je_erstem_zug.values())[MAX_ROUTEN - 1])
+
+            # Alle weiteren Zustände kommen noch später an
+            if arrival_time > schranke:
+                break
+
+            # Auch mit der kürzesten Restfahrzeit wäre das Ziel erst nach der (inzwischen gesunkenen) Schranke erreicht
+            if restzeiten is not None and arrival_time + restzeiten.get(current_stop, 0) > schranke:
+                continue
+
+            # Zeitlimit auch innerhalb eines Durchlaufs prüfen; bisher gefundene Routen werden zurückgegeben
+            if iteration_count % 1000 == 0 and time.time() > deadline_time:
+                status["partial"] = True
+                break
+
             # Wenn Ziel erreicht, Route merken und keine weiteren Verbindungen von hier prüfen
-            if current_stop == target:
+            if current_stop == target_id:
                 all_target_routes.add(((current_stop, arrival_time, current_train), transfers))
+                target_key = (current_stop, arrival_time, current_train)
+                if label > target_labels.get(target_key, KEIN_LABEL):
+                    target_labels[target_key] = label
+                offene_ziele.append(target_key)
                 continue
 
-            # Wenn es vom aktuellen Bahnhof keine Verbindungen gibt, überspringen
-            if current_stop not in station_departures:
+            # Bereich der Verbindungen des aktuellen Bahnhofs; ohne Verbindungen überspringen
+            erste = offsets[current_stop]
+            letzte = offsets[current_stop + 1]
+
+            # Bahnhöfe mit verspäteten Verbindungen: zusammengeführte Listen aus dem Overlay statt der Basis-Arrays
+            if overlay is not None and current_stop in overlay["ersetzt"]:
+                abfahrten, ankuenfte, zuege, ziele, infos = verbindungen_mit_overlay(kompilierter_fahrplan, overlay, current_stop)
+                erste, letzte = 0, len(abfahrten)
+            elif abfahrten is not basis_abfahrten:
+                abfahrten, ankuenfte, zuege, ziele, infos = basis_arrays
+
+            if erste == letzte:
                 continue
 
-            connections = station_departures[current_stop]
+            # Der 48-Stunden-Fahrplan beginnt am Tag der Ankunft; Startindex per binärer Suche
+            tagesbeginn = arrival_time - arrival_time % MINUTEN_PRO_TAG
+            start_idx = find_start_index(abfahrten, arrival_time - tagesbeginn, erste, letzte)
 
-            # Extrahiere Uhrzeit aus Ankunftszeit (falls datetime-Objekt)
-            arrival_time_only = arrival_time.time() if isinstance(arrival_time, datetime) else arrival_time
+            # Bestimme zulässige maximale Wartezeit (abhängig davon, ob Start oder Umstieg)    
+            max_wait = max_initial_wait if current_train == KEIN_ZUG else max_transfer_wait
 
-            # Bestimme Startindex in der Verbindungs-Liste (optional: Override nutzen)
-            if start_idx_override is not None:
-                start_idx = start_idx_override
-            else:
-                start_idx = find_start_index(connections, arrival_time_only)
+            # Erster Zug der bisherigen Route (für die Filterlogik)
+            first_train = labels[label * LABEL_FELDER + 7] if label != KEIN_LABEL else KEIN_ZUG
 
             # Schleife über alle möglichen Verbindungen ab dem berechneten Index
-            for i in range(start_idx, len(connections)):
+            for i in range(start_idx, letzte):
                 verbindung_counter += 1
 
-                # Entpacke Verbindungsdetails
-                (train, next_station, dep_time, arr_time, zugtyp, halt_nummer, train_avg_30, station_avg_30) = connections[i]
-
-                dep_time = dep_time.time() if isinstance(dep_time, datetime) else dep_time
-                arr_time = arr_time.time() if isinstance(arr_time, datetime) else arr_time
-
-                # Kombiniere Uhrzeit mit Reisedatum zu datetime-Objekten
-                planned_departure_time = datetime.combine(travel_date, dep_time)
-                planned_arrival_time = datetime.combine(travel_date, arr_time)
-
-                # Korrektur, wenn Ankunft nach Mitternacht erfolgt (Tageswechsel)
-                if planned_arrival_time <= planned_departure_time:
-                    planned_arrival_time += timedelta(days=1)
-
-                # Folgeverbindungen müssen entsprechend verschoben werden, um zeitlich konsistente Routen zu ermöglichen
-                while planned_departure_time < arrival_time:
-                    planned_departure_time += timedelta(days=1)
-                    planned_arrival_time += timedelta(days=1)
+                # Verbindungen sind nach Abfahrt sortiert: ab zu langer Wartezeit kann abgebrochen werden
+                planned_departure_time = abfahrten[i] + tagesbeginn
+                wartezeit = planned_departure_time - arrival_time
+                if wartezeit > max_wait:
+                    break
 
-                # Bestimme zulässige maximale Wartezeit (abhängig davon, ob Start oder Umstieg)    
-                wartezeit = (planned_departure_time - arrival_time).total_seconds() / 3600
-                max_wait = max_initial_wait_hours if current_train is None else max_transfer_wait_hours
+                # Verbindungsdetails aus den Arrays lesen (Ankunft in Minuten, Zug- und Bahnhofs-ID)
+                planned_arrival_time = ankuenfte[i] + tagesbeginn
+                if planned_arrival_time > schranke:
+                    pruned_counter += 1
+                    continue
+                train = zuege[i]
+                next_station = ziele[i]
+
+                # Untere Schranke der Restfahrzeit: Ziel von dort unerreichbar oder erst nach der Schranke erreichbar
+                if restzeiten is not None:
+                    restzeit = restzeiten.get(next_station)
+                    if restzeit is None:
+                        restzeit = restzeit_zum_ziel(next_station)
+                    if restzeit == UNERREICHBAR or planned_arrival_time + restzeit > schranke:
+                        pruned_counter += 1
+                        continue
 
-                # Wenn Wartezeit zu lang, Verbindung überspringen
-                if wartezeit > max_wait:
+                # Korridor-Filter (Umkreis/Rechteck, siehe korridor.py): Bahnhöfe außerhalb werden nicht betreten
+                if erlaubte_stationen is not None and not erlaubte_stationen[next_station]:
+                    pruned_counter += 1
                     continue
 
                 # Prüfe, ob ein Umstieg stattfindet
                 new_transfers = transfers
-                if current_train is not None and train != current_train:
+                if current_train != KEIN_ZUG and train != current_train:
                     new_transfers += 1
 
                     # Wenn Umstiegszeit zu kurz ist, Verbindung überspringen
-                    if (planned_departure_time - arrival_time) < min_transfer_time:
+                    if wartezeit < min_transfer_minutes:
                         continue
 
                  # Hole bisher beste bekannte Ankunftszeit und Umstiege für den Bahnhof
@@ -460,100 +1216,100 @@ def routenplanung(source, target, station_departures, departure_time, buffer_min
 
                 # Oder ob sie sich zumindest innerhalb des Toleranz-Puffers befindet
                 within_buffer = (
-                    best_time != datetime.max and
-                    planned_arrival_time < (best_time + timedelta(minutes=buffer_minutes)) and
+                    best_time != float("inf") and
+                    planned_arrival_time < best_time + buffer_minutes and
                     new_transfers <= best_transfers 
                 )
 
                 # Falls Verbindung gut genug ist, speichern und weiterverfolgen
                 if (is_better or within_buffer):
 
-                    # Speichere neuen Zustand zur späteren Routenrekonstruktion
-                    arrival_states[next_station].append((planned_arrival_time, planned_departure_time, new_transfers, train))
-
-                    # Speichere zusätzliche Verspätungsinformationen zur Verbindung
-                    prediction_information[(current_stop, next_station, train)] = {
-                        "zugtyp": zugtyp,
-                        "halt_nummer": halt_nummer,
-                        "train_avg_30": train_avg_30,
-                        "station_avg_30": station_avg_30
-                    }
-
                     # Wenn Verbindung besser ist, aktualisiere best arrival info
                     if is_better:
                         arrival_info[next_station] = (planned_arrival_time, new_transfers)
 
-                    # Speichere vorherigen Zustand (für späteren Pfadaufbau)
-                    state_key = (next_station, planned_arrival_time, train)
-                    previous_stop[state_key] = current_stop
-                    previous_train[state_key] = current_train
+                        # Neue beste Zielankunft: Zielankünfte ab best_time + buffer_minutes werden nicht mehr angenommen
+                        if next_station == target_id:
+                            schranke = min(schranke, planned_arrival_time + buffer_minutes - 1)
 
-                    # Merke den ersten verwendeten Zug für spätere Filterlogik
-                    if current_train is None:
-                        first_train_used[state_key] = train
-                    else:
-                        first_train_used[state_key] = first_train_used.get((current_stop, arrival_time, current_train), train)
+                    # Label mit Vorgänger, genutzter Verbindung (inkl. Index der Prognosedaten) und erstem Zug speichern
+                    labels.extend((
+                        label, current_stop, next_station, planned_departure_time, planned_arrival_time,
+                        train, infos[i], train if first_train == KEIN_ZUG else first_train
+                    ))
 
                     # Neuen Zustand zur Warteschlange hinzufügen
-                    heapq.heappush(queue_local, (planned_arrival_time, next_station, train, new_transfers))
+                    heapq.heappush(queue_local, (planned_arrival_time, next_station, train, new_transfers, len(labels) // LABEL_FELDER - 1))
 
 
 
     # (4) Kontrollgerüst der Routenplanung - zentrale Schleife, die bestimmt, wie oft und mit welchen Parametern neue Routen versucht werden
     attempt = 0
     while attempt < max_attempts:
-        if time.time() > deadline_time:
+        if status["partial"] or time.time() > deadline_time:
             print(f"\n⏱️ Zeitlimit von {max_duration_seconds} Sekunden erreicht, breche ab.")
+            status["partial"] = True
             break
         # Reset für neuen Versuch
         arrival_info.clear()
-        arrival_info[source] = (current_departure_time, 0)
-        arrival_states[source].append((current_departure_time, current_departure_time, 0, None))
+        arrival_info[source_id] = (current_departure_time, 0)
 
 
-        # 1. Versuch: Normal starten ab aktueller Abfahrtszeit
+        # 1. Suche ab aktueller Abfahrtszeit (Verbindungen nach Mitternacht sind im 48-Stunden-Fahrplan enthalten)
         verarbeite_verbindungen(current_departure_time)
-        
-        # 2. Falls keine Routen gefunden, nochmal Versuch ab Mitternacht (Index 0)
-        if not all_target_routes:
-            print("🔁 Weniger als 4 Routen gefunden, erneuter Versuch ab Mitternacht (Index 0)")
-            verarbeite_verbindungen(current_departure_time, start_idx_override=0)
 
-        # 3. Prüfen, ob wir genügend Routen haben
+        # 2. Prüfen, ob wir genügend Routen haben
         filtered_routes = filter_and_sort_routes(all_target_routes)
 
-        if len(filtered_routes) >= 4:
+        if len(filtered_routes) >= MAX_ROUTEN:
             break
         else:
             print(f"❗ Nur {len(filtered_routes)} gefilterte Routen, versuche es erneut.")
 
 
-        # 4. Wenn nicht genug, Abfahrtszeit um delay_hours erhöhen für nächsten Versuch
-        current_departure_time += timedelta(hours=delay_hours)
+        # 3. Wenn nicht genug, Abfahrtszeit um delay_hours erhöhen für nächsten Versuch
+        current_departure_time += delay_hours * 60
         attempt += 1
 
+    status["verworfen"] = pruned_counter
+    status["durchlaeufe"] = iteration_count
+
     if not all_target_routes:
         print("\n❌ Keine Verbindung gefunden!")
         return None
 
     
     sorted_routes = filter_and_sort_routes(all_target_routes)
-    best_routes = sorted_routes[:4]
+    best_routes = sorted_routes[:MAX_ROUTEN]
 
     
     detailed_routes = []
     for (target_key, _transfers) in best_routes:
-        detailed = reconstruct_route_details(
-            previous_stop, previous_train, arrival_states,
-            source, target_key, station_departures, travel_date,
-            prediction_information
-        )
+        # Routen ohne Abschnitt (Start = Ziel) werden nicht ausgegeben
+        label = target_labels.get(target_key, KEIN_LABEL)
+        detailed = reconstruct_route_details(labels, label, kompilierter_fahrplan, travel_date)
         if detailed:
             detailed_routes.append(detailed)
 
+    # Optional: Suchbaum für spätere Neuplanungen ab einem Umsteigeort bereitstellen (siehe repariere_route)
+    if suchkontext is not None:
+        ziel_labels = sorted(set(target_labels.values()) - {KEIN_LABEL})
+        suchkontext.update({
+            "kompilierter_fahrplan": kompilierter_fahrplan,
+            "travel_date": travel_date,
+            "source": source,
+            "target": target,
+            "labels": labels,
+            "ziel_labels": ziel_labels,
+            "zielprofil": erstelle_zielprofil(labels, ziel_labels),
+        })
+
     print(f"\n✅ Gesamtdauer der Routenplanung: {time.time() - start_time_total:.2f} Sekunden")
     print(f"🔁 Durchläufe der Warteschlange: {iteration_count}")
     print(f"🔎 Geprüfte Verbindungen: {verbindung_counter}")
+    print(f"✂️ Durch Ankunftsschranke, Restfahrzeit und Korridor verworfen: {pruned_counter}")
+    if status["partial"]:
+        print(f"⏱️ Zeitlimit von {max_duration_seconds} Sekunden erreicht, Ergebnis ist unvollständig.")
     return detailed_routes
 
 
@@ -564,6 +1320,14 @@ if __name__ == "__main__":
     # Versuche Pickle-Datei zu laden
     station_departures = load_station_departures_pickle()
 
+    # Mit --aktualisieren nur geänderte Züge neu aus der Datenbank lesen (ohne Stand: vollständiger Neuaufbau)
+    if "--aktualisieren" in sys.argv:
+        station_departures, aktualisierungsstand, _ = aktualisiere_station_departures(
+            station_departures, lade_aktualisierungsstand()
+        )
+        save_station_departures_pickle(station_departures)
+        speichere_aktualisierungsstand(aktualisierungsstand)
+
     # Falls keine Pickle-Datei vorhanden ist, neu erstellen und speichern
     if station_departures is None:
         station_departures = create_station_departures_from_db()
@@ -581,7 +1345,8 @@ if __name__ == "__main__":
     departure_time = datetime.combine(travel_date, datetime.strptime("11:00", "%H:%M").time())
 
     # Routenberechnung aufrufen
-    detailed_routes = routenplanung(source, target, station_departures, departure_time, travel_date=travel_date)
+    detailed_routes = routenplanung(source, target, station_departures, departure_time, travel_date=travel_date,
+                                    kompilierter_fahrplan=kompiliere_station_departures(station_departures))
 
     # Ausgabe
     if detailed_routes:
@@ -0,0 +1,256 @@
+import time
+import bisect
+from datetime import datetime
+from routen_berechnung import baue_routendetails
+from fahrplan import erstelle_verbindungsliste, finde_erste_abfahrt, minuten_in_datetime, datetime_in_minuten
+
+
+# Alternative Routensuche nach dem Connection Scan Algorithm (CSA):
+# Statt einer Prioritätswarteschlange wird eine globale, nach Abfahrt sortierte Verbindungsliste
+# genau einmal linear durchlaufen.
+
+
+"""
+berechnet mit einem einzelnen Scan die früheste Ankunft am Ziel ab `start_minuten`.
+Gibt die Route als Liste von Verbindungsindizes zurück (vorwärts) oder None, falls keine Route existiert.
+Bricht der Scan am Zeitlimit ab, wird status["partial"] gesetzt (falls `status` übergeben wurde).
+`letzte_startabfahrt` (Minuten) ersetzt das Fenster aus `max_initial_wait_hours`, z.B. für Folgesuchen ab einer
+späteren Startzeit, die das ursprüngliche Fenster nicht verlängern sollen.
+"""
+
+def connection_scan(verbindungen, source, target, start_minuten, min_transfer_minutes=5,
+                    max_initial_wait_hours=6, deadline_time=None, status=None, letzte_startabfahrt=None):
+
+    abfahrt = verbindungen["abfahrt"]
+    ankunft = verbindungen["ankunft"]
+    fahrt = verbindungen["fahrt"]
+    von = verbindungen["von"]
+    nach = verbindungen["nach"]
+
+    # Früheste bekannte Ankunft je Bahnhof und die Verbindung, über die sie erreicht wurde
+    frueheste_ankunft = {source: start_minuten}
+    erreicht_ueber = {}
+
+    # Für jede erreichbare Fahrt: Index der Verbindung, an der eingestiegen wurde
+    einstieg = {}
+
+    if letzte_startabfahrt is None:
+        letzte_startabfahrt = start_minuten + max_initial_wait_hours * 60
+    ziel_ankunft = float("inf")
+
+    for i in range(finde_erste_abfahrt(abfahrt, start_minuten), len(abfahrt)):
+
+        # Alle weiteren Verbindungen fahren erst nach der besten Zielankunft ab
+        if abfahrt[i] >= ziel_ankunft:
+            break
+
+        # Zeitlimit gelegentlich prüfen
+        if deadline_time is not None and i % 10000 == 0 and time.time() > deadline_time:
+            if status is not None:
+                status["partial"] = True
+            break
+
+        f = fahrt[i]
+        if f not in einstieg:
+            station = von[i]
+            if station not in frueheste_ankunft:
+                continue
+
+            # Einstieg am Startbahnhof: keine Umstiegszeit, aber maximale Anfangswartezeit
+            if station == source:
+                if abfahrt[i] > letzte_startabfahrt:
+                    continue
+
+            # Einstieg nach Umstieg: Mindestumstiegszeit muss eingehalten werden
+            elif frueheste_ankunft[station] + min_transfer_minutes > abfahrt[i]:
+                continue
+
+            einstieg[f] = i
+
+        # Ankunft an der nächsten Station verbessern
+        next_station = nach[i]
+        if ankunft[i] < frueheste_ankunft.get(next_station, float("inf")):
+            frueheste_ankunft[next_station] = ankunft[i]
+            erreicht_ueber[next_station] = (einstieg[f], i)
+            if next_station == target:
+                ziel_ankunft = ankunft[i]
+
+    if target not in erreicht_ueber:
+        return None
+
+    # Rekonstruktion rückwärts: pro Fahrt vom Ausstieg über die Vorgänger bis zum Einstieg
+    route = []
+    station = target
+    while station != source:
+        einstieg_idx, ausstieg_idx = erreicht_ueber[station]
+        idx = ausstieg_idx
+        while idx != einstieg_idx:
+            route.append(idx)
+            idx = verbindungen["vorgaenger"][idx]
+        route.append(einstieg_idx)
+        station = von[einstieg_idx]
+
+    route.reverse()
+    return route
+
+
+# Berechnet (bis zu) vier Zugverbindungen mit dem Connection Scan Algorithm.
+# Rückgabe im selben Format wie routen_berechnung.routenplanung (Liste von detailed_routes).
+# status["partial"] wird wie bei routenplanung gesetzt, wenn das Zeitlimit die Suche abbricht.
+def routenplanung_csa(source, target, station_departures, departure_time, min_transfer_minutes=5,
+                      max_initial_wait_hours=6, travel_date=None, max_duration_seconds=5,
+                      anzahl_routen=4, verbindungen=None, status=None):
+
+    start_time_total = time.time()
+    deadline_time = start_time_total + max_duration_seconds
+    if status is None:
+        status = {}
+    status["partial"] = False
+
+    if travel_date is None:
+        travel_date = datetime.today().date()
+
+    # Verbindungsliste nur aufbauen, wenn sie nicht bereits vorberechnet übergeben wurde
+    if verbindungen is None:
+        verbindungen = erstelle_verbindungsliste(station_departures)
+
+    start_minuten = datetime_in_minuten(departure_time, travel_date)
+    letzte_startabfahrt = start_minuten + max_initial_wait_hours * 60
+
+    # Mehrere Routen: nach jeder gefundenen Route erneut ab einer Minute nach deren Abfahrt suchen,
+    # alle Folgesuchen im ursprünglichen Fenster für die Abfahrt am Start
+    gefundene_routen = []
+    while len(gefundene_routen) < anzahl_routen:
+        if time.time() > deadline_time:
+            status["partial"] = True
+            break
+        route = connection_scan(
+            verbindungen, source, target, start_minuten,
+            min_transfer_minutes=min_transfer_minutes,
+            deadline_time=deadline_time,
+            status=status,
+            letzte_startabfahrt=letzte_startabfahrt
+        )
+        if route is None or status["partial"]:
+            break
+
+        # Spätere Abfahrt mit gleicher Ankunft ersetzt die vorherige Route (diese ist dominiert)
+        if gefundene_routen and verbindungen["ankunft"][gefundene_routen[-1][-1]] == verbindungen["ankunft"][route[-1]]:
+            gefundene_routen[-1] = route
+        else:
+            gefundene_routen.append(route)
+
+        start_minuten = verbindungen["abfahrt"][route[0]] + 1
+
+    if not gefundene_routen:
+        print("\n❌ Keine Verbindung gefunden!")
+        return None
+
+    detailed_routes = [verbindungen_als_routendetails(verbindungen, route, travel_date) for route in gefundene_routen]
+
+    print(f"\n✅ Gesamtdauer der Routenplanung (CSA): {time.time() - start_time_total:.2f} Sekunden")
+    if status["partial"]:
+        print(f"⏱️ Zeitlimit von {max_duration_seconds} Sekunden erreicht, Ergebnis ist unvollständig.")
+    return detailed_routes
+
+
+# wandelt eine Route aus Verbindungsindizes (vorwärts) in Routeneinträge im Format von routenplanung um
+def verbindungen_als_routendetails(verbindungen, route, travel_date):
+    abschnitte = [(
+        verbindungen["von"][idx],
+        verbindungen["nach"][idx],
+        verbindungen["fahrt_zug"][verbindungen["fahrt"][idx]],
+        minuten_in_datetime(verbindungen["abfahrt"][idx], travel_date),
+        minuten_in_datetime(verbindungen["ankunft"][idx], travel_date),
+        verbindungen["verbindung"][idx]
+    ) for idx in route]
+    return baue_routendetails(abschnitte)
+
+
+"""
+Profilsuche zu einem festen Ziel (Profile Connection Scan): Die Verbindungsliste wird einmal rückwärts durchlaufen,
+von den Abfahrten vor `bis_minuten` bis zur ersten Abfahrt ab `von_minuten`. Danach ist für jeden Bahnhof und jede
+Abfahrtszeit in diesem Bereich die früheste Ankunft am Ziel bekannt – eine Suche beantwortet so beliebig viele
+Startbahnhöfe und Startzeiten (siehe profilroute).
+Rückgabe: (profil, naechste)
+- profil[station] = (negative Abfahrten aufsteigend, Zielankünfte, Verbindungsindex): Pareto-Einträge, spätere
+  Abfahrt ⇒ spätere Ankunft
+- naechste[idx] = Index der nächsten Verbindung der Route nach Verbindung idx (-1: Ausstieg am Ziel)
+"""
+
+def profil_zum_ziel(verbindungen, target, von_minuten, bis_minuten, min_transfer_minutes=5):
+
+    abfahrt = verbindungen["abfahrt"]
+    ankunft = verbindungen["ankunft"]
+    fahrt = verbindungen["fahrt"]
+    von = verbindungen["von"]
+    nach = verbindungen["nach"]
+
+    profil = {}
+    naechste = {}
+
+    # Für jede Fahrt: Zielankunft beim Weiterfahren und die nächste Verbindung dieser Fahrt
+    fahrt_ankunft = {}
+    fahrt_naechste = {}
+
+    erste = finde_erste_abfahrt(abfahrt, von_minuten)
+    for i in range(finde_erste_abfahrt(abfahrt, bis_minuten) - 1, erste - 1, -1):
+
+        # Aussteigen am Ziel, im Zug bleiben oder an der nächsten Station umsteigen
+        beste = ankunft[i] if nach[i] == target else float("inf")
+        weiter = -1
+
+        f = fahrt[i]
+        if fahrt_ankunft.get(f, float("inf")) < beste:
+            beste = fahrt_ankunft[f]
+            weiter = fahrt_naechste[f]
+
+        eintraege = profil.get(nach[i])
+        if eintraege is not None:
+            j = bisect.bisect_right(eintraege[0], -(ankunft[i] + min_transfer_minutes)) - 1
+            if j >= 0 and eintraege[1][j] < beste:
+                beste = eintraege[1][j]
+                weiter = eintraege[2][j]
+
+        if beste == float("inf"):
+            continue
+
+        naechste[i] = weiter
+        fahrt_ankunft[f] = beste
+        fahrt_naechste[f] = i
+
+        # Eintrag am Abfahrtsbahnhof, wenn er früher ankommt als alle späteren Abfahrten
+        eintraege = profil.setdefault(von[i], ([], [], []))
+        if not eintraege[1] or beste < eintraege[1][-1]:
+            if eintraege[0] and eintraege[0][-1] == -abfahrt[i]:
+                eintraege[1][-1] = beste
+                eintraege[2][-1] = i
+            else:
+                eintraege[0].append(-abfahrt[i])
+                eintraege[1].append(beste)
+                eintraege[2].append(i)
+
+    return profil, naechste
+
+
+"""
+liest aus einem Profil (profil_zum_ziel) die Route mit der frühesten Zielankunft ab Bahnhof `source` und Zeitpunkt
+`start_minuten` (Minuten). Von mehreren Routen mit gleicher Ankunft wird die mit der spätesten Abfahrt gewählt.
+Gibt die Route als Liste von Verbindungsindizes zurück (vorwärts) oder None, falls keine Route existiert.
+"""
+
+def profilroute(profil, naechste, source, start_minuten):
+    eintraege = profil.get(source)
+    if eintraege is None:
+        return None
+
+    j = bisect.bisect_right(eintraege[0], -start_minuten) - 1
+    if j < 0:
+        return None
+
+    route = []
+    idx = eintraege[2][j]
+    while idx != -1:
+        route.append(idx)
+        idx = naechste[idx]
+    return route
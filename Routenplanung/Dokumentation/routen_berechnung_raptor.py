@@ -0,0 +1,280 @@
+import time
+import bisect
+from datetime import datetime
+from routen_berechnung import baue_routendetails, verbindungsinfo
+from fahrplan import erstelle_linienmuster, minuten_in_datetime, datetime_in_minuten
+
+
+# Alternative Routensuche nach RAPTOR (Round-bAsed Public Transit Optimized Router):
+# In Runde k werden alle Bahnhöfe bestimmt, die mit genau k Zügen (k-1 Umstiegen) früher erreicht werden.
+# Die Linienmuster werden dabei einmal pro Runde durchlaufen. Ergebnis ist die exakte Pareto-Menge
+# aus Ankunftszeit und Anzahl der Umstiege.
+
+
+"""
+führt die RAPTOR-Runden ab `start_minuten` aus.
+Gibt pro Runde die Ankunftszeiten (tau) und die Markierungen für die Rekonstruktion (labels) zurück.
+labels[k][station] = (muster_id, fahrt, einstieg_pos, ausstieg_pos)
+
+Wird ein `zustand` aus einem vorherigen Lauf übergeben (Profilsuche, spätere Abfahrt zuerst), werden
+tau und labels weiterverwendet; dann wird nur rundenweise (tau[k]) statt global (beste) beschnitten.
+Bricht die Suche am Zeitlimit ab, wird status["partial"] gesetzt (falls `status` übergeben wurde).
+"""
+
+def raptor_runden(linienmuster, source, target, start_minuten, min_transfer_minutes=5,
+                  max_initial_wait_hours=6, max_umstiege=6, deadline_time=None, zustand=None, status=None):
+
+    muster_liste = linienmuster["muster"]
+    muster_pro_halt = linienmuster["muster_pro_halt"]
+
+    letzte_startabfahrt = start_minuten + max_initial_wait_hours * 60
+
+    # tau[k]: früheste Ankunft je Bahnhof mit höchstens k Zügen; beste: Minimum über alle Runden
+    wiederverwendet = zustand is not None
+    if zustand is None:
+        zustand = {"tau": [{}], "labels": [{}]}
+    tau = zustand["tau"]
+    labels = zustand["labels"]
+    tau[0][source] = start_minuten
+    beste = {source: start_minuten}
+    markiert = {source}
+
+    for k in range(1, max_umstiege + 2):
+        if not markiert:
+            break
+        if deadline_time is not None and time.time() > deadline_time:
+            if status is not None:
+                status["partial"] = True
+            break
+
+        if len(tau) <= k:
+            tau.append(dict(tau[k - 1]))
+            labels.append({})
+        else:
+            # Ergebnisse späterer Abfahrten bleiben erhalten, Verbesserungen aus Runde k-1 werden übernommen
+            for station, ankunft in tau[k - 1].items():
+                if ankunft < tau[k].get(station, float("inf")):
+                    tau[k][station] = ankunft
+                    labels[k].pop(station, None)
+
+        # Zu durchlaufende Muster mit der frühesten markierten Position sammeln
+        zu_pruefen = {}
+        for station in markiert:
+            for muster_id, pos in muster_pro_halt.get(station, []):
+                if muster_id not in zu_pruefen or pos < zu_pruefen[muster_id]:
+                    zu_pruefen[muster_id] = pos
+        markiert = set()
+
+        for muster_id, start_pos in zu_pruefen.items():
+            muster = muster_liste[muster_id]
+            halte = muster["halte"]
+            fahrt = None
+            einstieg_pos = None
+
+            for pos in range(start_pos, len(halte)):
+                station = halte[pos]
+
+                # Mit der aktuellen Fahrt eine frühere Ankunft erreichen (Ziel-Pruning über beste[target])
+                if fahrt is not None:
+                    ankunft = muster["ankunft"][fahrt][pos]
+                    schranke = tau[k] if wiederverwendet else beste
+                    if ankunft < schranke.get(station, float("inf")) and ankunft < schranke.get(target, float("inf")):
+                        beste[station] = ankunft
+                        tau[k][station] = ankunft
+                        labels[k][station] = (muster_id, fahrt, einstieg_pos, pos)
+                        markiert.add(station)
+
+                # Prüfen, ob an diesem Halt eine frühere Fahrt erreicht werden kann
+                vorherige_ankunft = tau[k - 1].get(station)
+                if vorherige_ankunft is None or pos == len(halte) - 1:
+                    continue
+
+                # Umstiegszeit gilt nicht am Startbahnhof
+                schwelle = vorherige_ankunft if station == source else vorherige_ankunft + min_transfer_minutes
+                if fahrt is not None and schwelle > muster["abfahrt"][fahrt][pos]:
+                    continue
+
+                neue_fahrt = bisect.bisect_left(muster["abfahrt_pro_halt"][pos], schwelle)
+                if neue_fahrt >= len(muster["zug"]) or (fahrt is not None and neue_fahrt >= fahrt):
+                    continue
+                if station == source and muster["abfahrt"][neue_fahrt][pos] > letzte_startabfahrt:
+                    continue
+
+                fahrt = neue_fahrt
+                einstieg_pos = pos
+
+    return tau, labels
+
+
+"""
+rekonstruiert die Route, die `station` in Runde `k` erreicht, als vorwärts geordnete Abschnittsliste
+im Format von baue_routendetails.
+"""
+
+def rekonstruiere_raptor_route(linienmuster, labels, source, station, k, travel_date):
+    abschnitte = []
+    while station != source:
+
+        # Letzte Runde <= k, in der der Bahnhof verbessert wurde
+        while station not in labels[k]:
+            k -= 1
+        muster_id, fahrt, einstieg_pos, ausstieg_pos = labels[k][station]
+        muster = linienmuster["muster"][muster_id]
+
+        teilstrecke = []
+        for pos in range(einstieg_pos, ausstieg_pos):
+            teilstrecke.append((
+                muster["halte"][pos],
+                muster["halte"][pos + 1],
+                muster["zug"][fahrt],
+                minuten_in_datetime(muster["abfahrt"][fahrt][pos], travel_date),
+                minuten_in_datetime(muster["ankunft"][fahrt][pos + 1], travel_date),
+                verbindungsinfo(linienmuster, muster["info"][fahrt][pos])
+            ))
+        abschnitte = teilstrecke + abschnitte
+
+        station = muster["halte"][einstieg_pos]
+        k -= 1
+
+    return abschnitte
+
+
+# Berechnet die Pareto-optimalen Zugverbindungen (Ankunftszeit vs. Umstiege) mit RAPTOR.
+# Rückgabe im selben Format wie routen_berechnung.routenplanung, sortiert nach Ankunftszeit.
+# status["partial"] wird wie bei routenplanung gesetzt, wenn das Zeitlimit die Suche abbricht.
+def routenplanung_raptor(source, target, station_departures, departure_time, min_transfer_minutes=5,
+                         max_initial_wait_hours=6, travel_date=None, max_umstiege=6,
+                         max_duration_seconds=5, linienmuster=None, status=None):
+
+    start_time_total = time.time()
+    deadline_time = start_time_total + max_duration_seconds
+    if status is None:
+        status = {}
+    status["partial"] = False
+
+    if travel_date is None:
+        travel_date = datetime.today().date()
+
+    # Linienmuster nur aufbauen, wenn sie nicht bereits vorberechnet übergeben wurden
+    if linienmuster is None:
+        linienmuster = erstelle_linienmuster(station_departures)
+
+    start_minuten = datetime_in_minuten(departure_time, travel_date)
+
+    tau, labels = raptor_runden(
+        linienmuster, source, target, start_minuten,
+        min_transfer_minutes=min_transfer_minutes,
+        max_initial_wait_hours=max_initial_wait_hours,
+        max_umstiege=max_umstiege,
+        deadline_time=deadline_time,
+        status=status
+    )
+
+    # Pareto-Menge: jede Runde, in der das Ziel früher als in allen vorherigen Runden erreicht wird
+    detailed_routes = []
+    for k in range(1, len(labels)):
+        if target in labels[k]:
+            abschnitte = rekonstruiere_raptor_route(linienmuster, labels, source, target, k, travel_date)
+            detailed_routes.append(baue_routendetails(abschnitte))
+
+    if not detailed_routes:
+        print("\n❌ Keine Verbindung gefunden!")
+        return None
+
+    detailed_routes.sort(key=lambda route: route[-1]["planned_arrival_to"])
+
+    print(f"\n✅ Gesamtdauer der Routenplanung (RAPTOR): {time.time() - start_time_total:.2f} Sekunden")
+    if status["partial"]:
+        print(f"⏱️ Zeitlimit von {max_duration_seconds} Sekunden erreicht, Ergebnis ist unvollständig.")
+    return detailed_routes
+
+
+"""
+Profilsuche (rRAPTOR): berechnet alle Pareto-optimalen Verbindungen (Abfahrt, Ankunft, Umstiege) für ein
+ganzes Abfahrtsfenster in einem Durchgang. Die Abfahrten am Startbahnhof werden von der spätesten zur
+frühesten abgearbeitet; die Ergebnisse späterer Abfahrten bleiben erhalten und beschneiden die früheren Läufe.
+Ersetzt die max_attempts-Schleife von routenplanung, die die Suche mit verschobener Abfahrtszeit wiederholt.
+status["partial"] wird wie bei routenplanung gesetzt, wenn das Zeitlimit die Suche abbricht.
+"""
+
+def routenplanung_profil(source, target, station_departures, departure_time, min_transfer_minutes=5,
+                         travel_date=None, fenster_stunden=6, anzahl_routen=4, max_umstiege=6,
+                         max_duration_seconds=5, linienmuster=None, status=None):
+
+    start_time_total = time.time()
+    deadline_time = start_time_total + max_duration_seconds
+    if status is None:
+        status = {}
+    status["partial"] = False
+
+    if travel_date is None:
+        travel_date = datetime.today().date()
+
+    if linienmuster is None:
+        linienmuster = erstelle_linienmuster(station_departures)
+
+    start_minuten = datetime_in_minuten(departure_time, travel_date)
+    ende_minuten = start_minuten + fenster_stunden * 60
+
+    # Alle Abfahrtszeiten am Startbahnhof innerhalb des Fensters
+    abfahrtszeiten = set()
+    for muster_id, pos in linienmuster["muster_pro_halt"].get(source, []):
+        abfahrten = linienmuster["muster"][muster_id]["abfahrt_pro_halt"][pos]
+        if pos == len(linienmuster["muster"][muster_id]["halte"]) - 1:
+            continue
+        for idx in range(bisect.bisect_left(abfahrten, start_minuten), len(abfahrten)):
+            if abfahrten[idx] > ende_minuten:
+                break
+            abfahrtszeiten.add(abfahrten[idx])
+
+    # Ein Lauf je Abfahrtszeit, spätere zuerst; Zustand wird zwischen den Läufen weitergegeben
+    zustand = {"tau": [{}], "labels": [{}]}
+    kandidaten = []
+    for abfahrt in sorted(abfahrtszeiten, reverse=True):
+        if time.time() > deadline_time:
+            print(f"\n⏱️ Zeitlimit von {max_duration_seconds} Sekunden erreicht, breche ab.")
+            status["partial"] = True
+            break
+
+        vorher = [runde.get(target) for runde in zustand["tau"]]
+        raptor_runden(
+            linienmuster, source, target, abfahrt,
+            min_transfer_minutes=min_transfer_minutes,
+            max_initial_wait_hours=0,
+            max_umstiege=max_umstiege,
+            deadline_time=deadline_time,
+            zustand=zustand,
+            status=status
+        )
+
+        # Am Zeitlimit abgebrochener Lauf: dessen Zwischenstand liefert keine Kandidaten
+        if status["partial"]:
+            break
+
+        # Runden, in denen das Ziel in diesem Lauf verbessert wurde, liefern neue Kandidaten
+        for k in range(1, len(zustand["labels"])):
+            if target in zustand["labels"][k] and (k >= len(vorher) or zustand["tau"][k][target] != vorher[k]):
+                abschnitte = rekonstruiere_raptor_route(linienmuster, zustand["labels"], source, target, k, travel_date)
+                kandidaten.append((abschnitte[0][3], abschnitte[-1][4], k - 1, abschnitte))
+
+    # Nur Pareto-optimale Verbindungen behalten: spätere Abfahrt, frühere Ankunft, weniger Umstiege
+    pareto = []
+    for kandidat in kandidaten:
+        abfahrt, ankunft, umstiege, _ = kandidat
+        dominiert = any(
+            a >= abfahrt and b <= ankunft and u <= umstiege and (a, b, u) != (abfahrt, ankunft, umstiege)
+            for a, b, u, _ in kandidaten
+        )
+        if not dominiert and all((a, b, u) != (abfahrt, ankunft, umstiege) for a, b, u, _ in pareto):
+            pareto.append(kandidat)
+
+    if not pareto:
+        print("\n❌ Keine Verbindung gefunden!")
+        return None
+
+    # Die ersten Verbindungen nach Abfahrtszeit
+    pareto.sort(key=lambda x: (x[0], x[1]))
+    detailed_routes = [baue_routendetails(abschnitte) for _, _, _, abschnitte in pareto[:anzahl_routen]]
+
+    print(f"\n✅ Gesamtdauer der Profilsuche: {time.time() - start_time_total:.2f} Sekunden")
+    return detailed_routes
@@ -0,0 +1,182 @@
+import time
+import bisect
+from datetime import datetime
+from routen_berechnung import baue_routendetails, verbindungsinfo
+from fahrplan import erstelle_tripindex, minuten_in_datetime, datetime_in_minuten
+
+
+# Alternative Routensuche nach Trip-Based Routing (Witt 2015):
+# Statt einzelner Halte werden ganze Fahrtabschnitte (Fahrt, Einstieg bis Ende) in Warteschlangen je Anzahl
+# Umstiege abgearbeitet. Die möglichen Umstiege zwischen Fahrten sind im Trip-Index vorberechnet; das Mitfahren
+# in einem Zug kostet daher keinen eigenen Suchschritt pro Halt. Ergebnis ist wie bei RAPTOR die exakte
+# Pareto-Menge aus Ankunftszeit und Anzahl der Umstiege.
+
+
+"""
+markiert eine Fahrt als ab `pos` erreicht und hängt den noch nicht bearbeiteten Abschnitt an `warteschlange` an.
+erreicht[muster_id][fahrt] ist der früheste bisher erreichte Halt; spätere Fahrten desselben Musters sind ab
+diesem Halt ebenfalls erreicht (sie fahren nicht früher) und werden mit markiert.
+"""
+
+def fahrt_einreihen(linienmuster, erreicht, warteschlange, muster_id, fahrt, pos, vorgaenger):
+    erreicht_muster = erreicht.get(muster_id)
+    if erreicht_muster is None:
+        muster = linienmuster["muster"][muster_id]
+        erreicht_muster = erreicht[muster_id] = [len(muster["halte"])] * len(muster["zug"])
+
+    ende = erreicht_muster[fahrt]
+    if pos >= ende:
+        return
+
+    warteschlange.append((muster_id, fahrt, pos, ende, vorgaenger))
+    for spaetere_fahrt in range(fahrt, len(erreicht_muster)):
+        if erreicht_muster[spaetere_fahrt] <= pos:
+            break
+        erreicht_muster[spaetere_fahrt] = pos
+
+
+"""
+führt die Trip-Based-Suche ab `start_minuten` aus. Gibt je Anzahl Umstiege die Warteschlange der bearbeiteten
+Abschnitte und die gefundenen Zielankünfte zurück: ziel_treffer = [(ankunft, runde, abschnitt_index, ausstieg_pos)],
+ein Eintrag je Runde, in der das Ziel früher als in allen vorherigen Runden erreicht wird.
+Bricht die Suche am Zeitlimit ab, wird status["partial"] gesetzt (falls `status` übergeben wurde).
+"""
+
+def trip_based_suche(tripindex, source, target, start_minuten, max_initial_wait_hours=6, max_umstiege=6,
+                     deadline_time=None, status=None):
+
+    linienmuster = tripindex["linienmuster"]
+    umstiege = tripindex["umstiege"]
+    muster_liste = linienmuster["muster"]
+    muster_pro_halt = linienmuster["muster_pro_halt"]
+
+    letzte_startabfahrt = start_minuten + max_initial_wait_hours * 60
+
+    # Positionen des Ziels in jedem Muster, das dort hält
+    ziel_positionen = {}
+    for muster_id, pos in muster_pro_halt.get(target, []):
+        ziel_positionen.setdefault(muster_id, []).append(pos)
+
+    # Runde 0: erste erreichbare Fahrt jedes Musters am Startbahnhof
+    erreicht = {}
+    warteschlangen = [[]]
+    for muster_id, pos in muster_pro_halt.get(source, []):
+        muster = muster_liste[muster_id]
+        if pos == len(muster["halte"]) - 1:
+            continue
+        fahrt = bisect.bisect_left(muster["abfahrt_pro_halt"][pos], start_minuten)
+        if fahrt < len(muster["zug"]) and muster["abfahrt"][fahrt][pos] <= letzte_startabfahrt:
+            fahrt_einreihen(linienmuster, erreicht, warteschlangen[0], muster_id, fahrt, pos, None)
+
+    beste_ankunft = float("inf")
+    ziel_treffer = []
+    for runde in range(max_umstiege + 1):
+        warteschlange = warteschlangen[runde]
+        if not warteschlange:
+            break
+        if deadline_time is not None and time.time() > deadline_time:
+            if status is not None:
+                status["partial"] = True
+            break
+        naechste = []
+        warteschlangen.append(naechste)
+
+        # Zielankünfte dieser Runde
+        for idx, (muster_id, fahrt, einstieg, ende, _vorgaenger) in enumerate(warteschlange):
+            for pos in ziel_positionen.get(muster_id, []):
+                if einstieg < pos <= ende:
+                    ankunft = muster_liste[muster_id]["ankunft"][fahrt][pos]
+                    if ankunft < beste_ankunft:
+                        beste_ankunft = ankunft
+                        if ziel_treffer and ziel_treffer[-1][1] == runde:
+                            ziel_treffer[-1] = (ankunft, runde, idx, pos)
+                        else:
+                            ziel_treffer.append((ankunft, runde, idx, pos))
+
+        # Umstiege aus den Abschnitten, solange die Ankunft noch vor der besten Zielankunft liegt; am Startbahnhof
+        # wird nicht umgestiegen (dort gilt nur die Anfangswartezeit, Fahrten ab dem Start enthält Runde 0)
+        for idx, (muster_id, fahrt, einstieg, ende, _vorgaenger) in enumerate(warteschlange):
+            halte = muster_liste[muster_id]["halte"]
+            ankuenfte = muster_liste[muster_id]["ankunft"][fahrt]
+            umstiege_fahrt = umstiege[muster_id][fahrt]
+            for pos in range(einstieg + 1, min(ende, len(ankuenfte) - 1) + 1):
+                if ankuenfte[pos] >= beste_ankunft:
+                    break
+                if halte[pos] == source:
+                    continue
+                for ziel_muster_id, ziel_fahrt, ziel_pos in umstiege_fahrt[pos]:
+                    fahrt_einreihen(linienmuster, erreicht, naechste, ziel_muster_id, ziel_fahrt, ziel_pos, (idx, pos))
+
+    return warteschlangen, ziel_treffer
+
+
+# rekonstruiert die Route eines Zieltreffers als vorwärts geordnete Abschnittsliste im Format von baue_routendetails
+def rekonstruiere_trip_route(linienmuster, warteschlangen, runde, idx, ausstieg, travel_date):
+    abschnitte = []
+    while True:
+        muster_id, fahrt, einstieg, _ende, vorgaenger = warteschlangen[runde][idx]
+        muster = linienmuster["muster"][muster_id]
+
+        teilstrecke = []
+        for pos in range(einstieg, ausstieg):
+            teilstrecke.append((
+                muster["halte"][pos],
+                muster["halte"][pos + 1],
+                muster["zug"][fahrt],
+                minuten_in_datetime(muster["abfahrt"][fahrt][pos], travel_date),
+                minuten_in_datetime(muster["ankunft"][fahrt][pos + 1], travel_date),
+                verbindungsinfo(linienmuster, muster["info"][fahrt][pos])
+            ))
+        abschnitte = teilstrecke + abschnitte
+
+        if vorgaenger is None:
+            return abschnitte
+        idx, ausstieg = vorgaenger
+        runde -= 1
+
+
+# Berechnet die Pareto-optimalen Zugverbindungen (Ankunftszeit vs. Umstiege) mit Trip-Based Routing.
+# Rückgabe im selben Format wie routen_berechnung.routenplanung, sortiert nach Ankunftszeit.
+# status["partial"] wird wie bei routenplanung gesetzt, wenn das Zeitlimit die Suche abbricht.
+def routenplanung_trip(source, target, station_departures, departure_time, min_transfer_minutes=5,
+                       max_initial_wait_hours=6, travel_date=None, max_umstiege=6,
+                       max_duration_seconds=5, tripindex=None, status=None):
+
+    start_time_total = time.time()
+    deadline_time = start_time_total + max_duration_seconds
+    if status is None:
+        status = {}
+    status["partial"] = False
+
+    if travel_date is None:
+        travel_date = datetime.today().date()
+
+    # Trip-Index nur aufbauen, wenn er nicht bereits vorberechnet übergeben wurde (oder andere Umstiegszeit gilt)
+    if tripindex is None or tripindex["min_transfer_minutes"] != min_transfer_minutes:
+        tripindex = erstelle_tripindex(station_departures, min_transfer_minutes)
+
+    start_minuten = datetime_in_minuten(departure_time, travel_date)
+
+    warteschlangen, ziel_treffer = trip_based_suche(
+        tripindex, source, target, start_minuten,
+        max_initial_wait_hours=max_initial_wait_hours,
+        max_umstiege=max_umstiege,
+        deadline_time=deadline_time,
+        status=status
+    )
+
+    detailed_routes = []
+    for ankunft, runde, idx, ausstieg in ziel_treffer:
+        abschnitte = rekonstruiere_trip_route(tripindex["linienmuster"], warteschlangen, runde, idx, ausstieg, travel_date)
+        detailed_routes.append(baue_routendetails(abschnitte))
+
+    if not detailed_routes:
+        print("\n❌ Keine Verbindung gefunden!")
+        return None
+
+    detailed_routes.sort(key=lambda route: route[-1]["planned_arrival_to"])
+
+    print(f"\n✅ Gesamtdauer der Routenplanung (Trip-Based): {time.time() - start_time_total:.2f} Sekunden")
+    if status["partial"]:
+        print(f"⏱️ Zeitlimit von {max_duration_seconds} Sekunden erreicht, Ergebnis ist unvollständig.")
+    return detailed_routes
@@ -0,0 +1,242 @@
+import time
+import bisect
+from datetime import datetime
+from routen_berechnung import baue_routendetails, verbindungsinfo
+from fahrplan import erstelle_linienmuster, minuten_in_datetime, datetime_in_minuten
+from zuverlaessigkeit import mittel_aus_durchschnitten, verspaetungsparameter, anschlusswahrscheinlichkeit
+
+
+# Zuverlässigkeitsorientierte Routensuche (mehrkriterielles RAPTOR, McRAPTOR):
+# Neben Ankunftszeit und Umstiegen (Runden wie in routen_berechnung_raptor) wird die Wahrscheinlichkeit optimiert,
+# alle Anschlüsse zu erreichen. Jeder Umstieg wird während der Suche mit train_avg_30 / station_avg_30 der beiden
+# Verbindungen bewertet (anschlusswahrscheinlichkeit); zu riskante Umstiege werden verworfen. Statt einer
+# Ankunftszeit hält jeder Bahnhof je Runde eine Menge nicht dominierter (Ankunft, Zuverlässigkeit)-Paare.
+# Ergebnis ist die Pareto-Menge aus Ankunftszeit, Umstiegen und Zuverlässigkeit.
+
+# Umstiege, die mit geringerer Wahrscheinlichkeit erreicht werden, werden nicht betrachtet
+MIN_ANSCHLUSSWAHRSCHEINLICHKEIT = 0.5
+
+# Zuverlässigkeiten, die sich um weniger unterscheiden, gelten als gleich (begrenzt die Größe der Pareto-Mengen)
+ZUVERLAESSIGKEIT_TOLERANZ = 0.01
+
+# Anzahl späterer Fahrten desselben Musters, die an einem Umstieg zusätzlich betrachtet werden (mehr Puffer)
+MAX_SPAETERE_FAHRTEN = 3
+
+
+# Verspätungsparameter q (siehe zuverlaessigkeit.verspaetungsparameter) zu einem Index der Prognosedaten
+def verspaetungsparameter_der_info(linienmuster, info, cache):
+    q = cache.get(info)
+    if q is None:
+        q = cache[info] = verspaetungsparameter(mittel_aus_durchschnitten(
+            linienmuster["info_train_avg_30"][info], linienmuster["info_station_avg_30"][info]
+        ))
+    return q
+
+
+# prüft, ob (ankunft, zuverlaessigkeit) von einem Eintrag der Menge mindestens so gut erreicht wird
+def ist_dominiert(menge, ankunft, zuverlaessigkeit):
+    for andere_ankunft, andere_zuverlaessigkeit in menge:
+        if andere_ankunft <= ankunft and andere_zuverlaessigkeit >= zuverlaessigkeit - ZUVERLAESSIGKEIT_TOLERANZ:
+            return True
+    return False
+
+
+"""
+führt die McRAPTOR-Runden ab `start_minuten` aus. Gibt je Runde die erreichten Bahnhöfe und die Labels für
+die Rekonstruktion zurück:
+runden[k][station] = Liste von (ankunft, zuverlaessigkeit, label, info_ankunft), nur Einträge, die in Runde k
+neu und nicht dominiert sind; labels[label] = (vorgaenger, muster_id, fahrt, einstieg_pos, ausstieg_pos).
+Bricht die Suche am Zeitlimit ab, wird status["partial"] gesetzt (falls `status` übergeben wurde).
+"""
+
+def zuverlaessige_runden(linienmuster, source, target, start_minuten, min_transfer_minutes=5,
+                         max_initial_wait_hours=6, max_transfer_wait_hours=2, max_umstiege=6,
+                         min_anschlusswahrscheinlichkeit=MIN_ANSCHLUSSWAHRSCHEINLICHKEIT, deadline_time=None,
+                         status=None):
+
+    muster_liste = linienmuster["muster"]
+    muster_pro_halt = linienmuster["muster_pro_halt"]
+
+    letzte_startabfahrt = start_minuten + max_initial_wait_hours * 60
+    max_transfer_wait = max_transfer_wait_hours * 60
+    q_cache = {}
+
+    # beste[station]: nicht dominierte (Ankunft, Zuverlässigkeit) über alle bisherigen Runden
+    labels = []
+    runden = [{source: [(start_minuten, 1.0, None, None)]}]
+    beste = {source: [(start_minuten, 1.0)]}
+
+    for k in range(1, max_umstiege + 2):
+        vorherige = runden[k - 1]
+        if not vorherige:
+            break
+        if deadline_time is not None and time.time() > deadline_time:
+            if status is not None:
+                status["partial"] = True
+            break
+        aktuelle = {}
+        runden.append(aktuelle)
+
+        # Zu durchlaufende Muster mit der frühesten Position eines in der Vorrunde erreichten Bahnhofs
+        zu_pruefen = {}
+        for station in vorherige:
+            for muster_id, pos in muster_pro_halt.get(station, []):
+                if muster_id not in zu_pruefen or pos < zu_pruefen[muster_id]:
+                    zu_pruefen[muster_id] = pos
+
+        for muster_id, start_pos in zu_pruefen.items():
+            muster = muster_liste[muster_id]
+            halte = muster["halte"]
+
+            # Fahrten, in denen man sich gerade befindet: (fahrt, einstieg_pos, zuverlaessigkeit, vorgaenger)
+            im_zug = []
+
+            for pos in range(start_pos, len(halte)):
+                station = halte[pos]
+
+                # Aussteigen: Ankunft mit jeder Fahrt, die weder am Bahnhof noch am Ziel dominiert ist
+                for fahrt, einstieg_pos, zuverlaessigkeit, vorgaenger in im_zug:
+                    ankunft = muster["ankunft"][fahrt][pos]
+                    if ist_dominiert(beste.get(target, ()), ankunft, zuverlaessigkeit):
+                        continue
+                    if ist_dominiert(beste.get(station, ()), ankunft, zuverlaessigkeit):
+                        continue
+
+                    labels.append((vorgaenger, muster_id, fahrt, einstieg_pos, pos))
+                    beste[station] = [
+                        (a, z) for a, z in beste.get(station, ()) if a < ankunft or z > zuverlaessigkeit
+                    ] + [(ankunft, zuverlaessigkeit)]
+                    aktuelle[station] = [
+                        eintrag for eintrag in aktuelle.get(station, ())
+                        if eintrag[0] < ankunft or eintrag[1] > zuverlaessigkeit
+                    ] + [(ankunft, zuverlaessigkeit, len(labels) - 1, muster["info"][fahrt][pos - 1])]
+
+                # Einsteigen: von jedem Eintrag der Vorrunde die früheste erreichbare Fahrt und, für mehr Puffer
+                # beim Umstieg, bis zu MAX_SPAETERE_FAHRTEN spätere
+                if pos == len(halte) - 1:
+                    continue
+                for ankunft, zuverlaessigkeit, label, info_ankunft in vorherige.get(station, ()):
+                    am_start = label is None
+                    schwelle = ankunft if am_start else ankunft + min_transfer_minutes
+                    erste_fahrt = bisect.bisect_left(muster["abfahrt_pro_halt"][pos], schwelle)
+
+                    for fahrt in range(erste_fahrt, min(erste_fahrt + MAX_SPAETERE_FAHRTEN + 1, len(muster["zug"]))):
+                        abfahrt = muster["abfahrt"][fahrt][pos]
+                        if am_start:
+                            if abfahrt > letzte_startabfahrt:
+                                break
+                            neue_zuverlaessigkeit = zuverlaessigkeit
+                        else:
+                            if fahrt > erste_fahrt and abfahrt - ankunft > max_transfer_wait:
+                                break
+                            wahrscheinlichkeit = anschlusswahrscheinlichkeit(
+                                verspaetungsparameter_der_info(linienmuster, info_ankunft, q_cache),
+                                verspaetungsparameter_der_info(linienmuster, muster["info"][fahrt][pos], q_cache),
+                                abfahrt - ankunft
+                            )
+                            if wahrscheinlichkeit < min_anschlusswahrscheinlichkeit:
+                                continue
+                            neue_zuverlaessigkeit = zuverlaessigkeit * wahrscheinlichkeit
+
+                        # In die Menge der Fahrten aufnehmen, falls keine frühere Fahrt mindestens so zuverlässig ist
+                        if not any(f <= fahrt and z >= neue_zuverlaessigkeit - ZUVERLAESSIGKEIT_TOLERANZ
+                                   for f, _e, z, _v in im_zug):
+                            im_zug = [
+                                eintrag for eintrag in im_zug
+                                if eintrag[0] < fahrt or eintrag[2] > neue_zuverlaessigkeit
+                            ] + [(fahrt, pos, neue_zuverlaessigkeit, label)]
+
+                        # Am Start und bei einem (nahezu) sicheren Umstieg bringen spätere Fahrten nichts mehr
+                        if am_start or neue_zuverlaessigkeit >= zuverlaessigkeit - ZUVERLAESSIGKEIT_TOLERANZ:
+                            break
+
+    return runden, labels
+
+
+# rekonstruiert die Route zu einem Label als vorwärts geordnete Abschnittsliste im Format von baue_routendetails
+def rekonstruiere_zuverlaessige_route(linienmuster, labels, label, travel_date):
+    abschnitte = []
+    while label is not None:
+        vorgaenger, muster_id, fahrt, einstieg_pos, ausstieg_pos = labels[label]
+        muster = linienmuster["muster"][muster_id]
+
+        teilstrecke = []
+        for pos in range(einstieg_pos, ausstieg_pos):
+            teilstrecke.append((
+                muster["halte"][pos],
+                muster["halte"][pos + 1],
+                muster["zug"][fahrt],
+                minuten_in_datetime(muster["abfahrt"][fahrt][pos], travel_date),
+                minuten_in_datetime(muster["ankunft"][fahrt][pos + 1], travel_date),
+                verbindungsinfo(linienmuster, muster["info"][fahrt][pos])
+            ))
+        abschnitte = teilstrecke + abschnitte
+        label = vorgaenger
+
+    return abschnitte
+
+
+# Berechnet die Pareto-optimalen Zugverbindungen (Ankunftszeit, Umstiege, Wahrscheinlichkeit alle Anschlüsse zu
+# erreichen). Rückgabe im selben Format wie routen_berechnung.routenplanung, sortiert nach Ankunftszeit. Die
+# Zuverlässigkeit aus der Suche (in Prozent) wird je Route in die optional übergebene Liste
+# `anschlusswahrscheinlichkeiten` geschrieben (gleiche Reihenfolge wie die Routen). status["partial"] wird wie
+# bei routenplanung gesetzt, wenn das Zeitlimit die Suche abbricht.
+def routenplanung_zuverlaessig(source, target, station_departures, departure_time, min_transfer_minutes=5,
+                               max_initial_wait_hours=6, max_transfer_wait_hours=2, travel_date=None, max_umstiege=6,
+                               min_anschlusswahrscheinlichkeit=MIN_ANSCHLUSSWAHRSCHEINLICHKEIT,
+                               max_duration_seconds=5, linienmuster=None, anschlusswahrscheinlichkeiten=None,
+                               status=None):
+
+    start_time_total = time.time()
+    deadline_time = start_time_total + max_duration_seconds
+    if status is None:
+        status = {}
+    status["partial"] = False
+
+    if travel_date is None:
+        travel_date = datetime.today().date()
+
+    # Linienmuster nur aufbauen, wenn sie nicht bereits vorberechnet übergeben wurden
+    if linienmuster is None:
+        linienmuster = erstelle_linienmuster(station_departures)
+
+    start_minuten = datetime_in_minuten(departure_time, travel_date)
+
+    runden, labels = zuverlaessige_runden(
+        linienmuster, source, target, start_minuten,
+        min_transfer_minutes=min_transfer_minutes,
+        max_initial_wait_hours=max_initial_wait_hours,
+        max_transfer_wait_hours=max_transfer_wait_hours,
+        max_umstiege=max_umstiege,
+        min_anschlusswahrscheinlichkeit=min_anschlusswahrscheinlichkeit,
+        deadline_time=deadline_time,
+        status=status
+    )
+
+    # Pareto-Menge: die Zieleinträge aller Runden, die von keinem Eintrag mit höchstens so vielen Umstiegen
+    # dominiert werden (beim Einfügen wurden nur Einträge derselben Runde entfernt)
+    detailed_routes = []
+    bisher = []
+    for k in range(1, len(runden)):
+        neue = []
+        for ankunft, zuverlaessigkeit, label, _info in sorted(runden[k].get(target, ())):
+            if ist_dominiert(bisher, ankunft, zuverlaessigkeit):
+                continue
+            neue.append((ankunft, zuverlaessigkeit))
+            abschnitte = rekonstruiere_zuverlaessige_route(linienmuster, labels, label, travel_date)
+            detailed_routes.append((round(zuverlaessigkeit * 100, 2), baue_routendetails(abschnitte)))
+        bisher.extend(neue)
+
+    if not detailed_routes:
+        print("\n❌ Keine Verbindung gefunden!")
+        return None
+
+    detailed_routes.sort(key=lambda eintrag: (eintrag[1][-1]["planned_arrival_to"], -eintrag[0]))
+    if anschlusswahrscheinlichkeiten is not None:
+        anschlusswahrscheinlichkeiten[:] = [wahrscheinlichkeit for wahrscheinlichkeit, _route in detailed_routes]
+    detailed_routes = [route for _wahrscheinlichkeit, route in detailed_routes]
+
+    print(f"\n✅ Gesamtdauer der Routenplanung (zuverlässig): {time.time() - start_time_total:.2f} Sekunden")
+    if status["partial"]:
+        print(f"⏱️ Zeitlimit von {max_duration_seconds} Sekunden erreicht, Ergebnis ist unvollständig.")
+    return detailed_routes
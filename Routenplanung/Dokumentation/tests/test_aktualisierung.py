@@ -0,0 +1,85 @@
+import os
+import sys
+from datetime import date
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routen_berechnung import (SOLLFAHRPLAN_SPALTEN, station_departures_aus_bloecken, erstelle_aktualisierungsstand,
+                               uebernehme_zugaenderungen)
+
+
+BASISDATUM = date(2025, 4, 15)
+
+
+# Sollfahrplan als Zeilen wie aus der Datenbank: {zug: [(halt, abfahrt, ankunft), ...]}
+def sollfahrplan(zuege):
+    return [
+        (zug, halt, abfahrt, ankunft, halt_nummer, "RE", 1.0, 2.0)
+        for zug, halte in zuege.items()
+        for halt_nummer, (halt, abfahrt, ankunft) in enumerate(halte, start=1)
+    ]
+
+
+# Prüfsumme je Zug über alle Halte (in der Datenbank per MD5)
+def pruefsummen(zeilen):
+    halte = {}
+    for zeile in zeilen:
+        halte.setdefault(zeile[0], []).append(zeile)
+    return {zug: str(zug_halte) for zug, zug_halte in halte.items()}
+
+
+# Blöcke vollständiger Züge (ein Zug je Block) wie lese_sollfahrplan_bloecke, optional nur für `zuege`
+def bloecke(zeilen, zuege=None):
+    for zug in sorted({zeile[0] for zeile in zeilen}):
+        if zuege is None or zug in zuege:
+            yield pd.DataFrame.from_records([z for z in zeilen if z[0] == zug], columns=SOLLFAHRPLAN_SPALTEN)
+
+
+ALT = sollfahrplan({
+    "1": [("A", "08:00:00", None), ("B", "08:32:00", "08:30:00"), ("C", None, "09:00:00")],
+    "2": [("B", "08:40:00", None), ("C", None, "09:10:00")],
+    "3": [("A", "08:10:00", None), ("D", None, "08:50:00")],
+})
+
+# Zug 2 fährt jetzt später und weiter bis D, Zug 3 entfällt, Zug 0 fährt wie Zug 1 um 8:00 ab A
+NEU = sollfahrplan({
+    "0": [("A", "08:00:00", None), ("C", None, "08:45:00")],
+    "1": [("A", "08:00:00", None), ("B", "08:32:00", "08:30:00"), ("C", None, "09:00:00")],
+    "2": [("B", "08:50:00", None), ("C", "09:22:00", "09:20:00"), ("D", None, "09:40:00")],
+})
+
+
+def test_aktualisierung_wie_neuaufbau():
+    station_departures = station_departures_aus_bloecken(bloecke(ALT), BASISDATUM)
+    stand = erstelle_aktualisierungsstand(station_departures, pruefsummen(ALT))
+
+    gelesen = []
+    def lese_zuege(zuege):
+        gelesen.append(set(zuege))
+        return bloecke(NEU, zuege)
+
+    station_departures, stand, betroffen = uebernehme_zugaenderungen(station_departures, stand, pruefsummen(NEU),
+                                                                     lese_zuege)
+
+    # Nur geänderte und neue Züge werden gelesen; der entfallene Zug zählt zu den betroffenen
+    assert gelesen == [{"0", "2"}]
+    assert betroffen == {"0", "2", "3"}
+
+    neuaufbau = station_departures_aus_bloecken(bloecke(NEU), BASISDATUM)
+    assert station_departures == neuaufbau
+    assert [c[0] for c in station_departures["A"]] == ["0", "1"]
+    assert stand == erstelle_aktualisierungsstand(neuaufbau, pruefsummen(NEU))
+
+
+def test_unveraenderter_fahrplan_liest_nichts():
+    station_departures = station_departures_aus_bloecken(bloecke(ALT), BASISDATUM)
+    stand = erstelle_aktualisierungsstand(station_departures, pruefsummen(ALT))
+
+    def lese_zuege(zuege):
+        raise AssertionError(zuege)
+
+    _station_departures, _stand, betroffen = uebernehme_zugaenderungen(station_departures, stand, pruefsummen(ALT),
+                                                                       lese_zuege)
+    assert betroffen == set()
@@ -0,0 +1,155 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime, date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routen_berechnung import (kompiliere_station_departures, erstelle_verspaetungsoverlay, verbindungen_mit_overlay,
+                               routenplanung)
+from echtzeit import erstelle_echtzeitfahrplan, folge_feed_datei, wende_verspaetungen_an
+
+
+# Kleiner Fahrplan: Zug 1 fährt A → B → C
+def beispiel_station_departures():
+    def zeit(stunde, minute):
+        return datetime(2025, 4, 15, stunde, minute)
+
+    return {
+        "A": [("1", "B", zeit(8, 0), zeit(8, 30), "ICE", 1, 2.0, 1.0)],
+        "B": [("1", "C", zeit(8, 35), zeit(9, 0), "ICE", 2, 2.0, 1.0)],
+    }
+
+
+def meldung(von, nach, dep_delay, arr_delay):
+    return (f'{{"from_station": "{von}", "to_station": "{nach}", "train_number": "1", '
+            f'"dep_delay": {dep_delay}, "arr_delay": {arr_delay}}}\n')
+
+
+def schreibe(pfad, text, modus="a"):
+    with open(pfad, modus, encoding="utf-8") as f:
+        f.write(text)
+
+
+# wartet, bis der Feed-Thread den Echtzeitfahrplan auf `version` gebracht hat
+def warte_auf_version(echtzeit, version, timeout=5.0):
+    ende = time.time() + timeout
+    while echtzeit["version"] < version and time.time() < ende:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    assert echtzeit["version"] == version
+
+
+def test_feed_datei_anhaengen_kuerzen_und_rotieren(tmp_path):
+    kompiliert = kompiliere_station_departures(beispiel_station_departures())
+    echtzeit = erstelle_echtzeitfahrplan(kompiliert)
+    a, b, c = (kompiliert["station_id"][s] for s in "ABC")
+    pfad = str(tmp_path / "verspaetungen.jsonl")
+
+    stop = threading.Event()
+    thread = threading.Thread(target=folge_feed_datei, args=(lambda: echtzeit, pfad, 0.01, stop), daemon=True)
+    thread.start()
+    try:
+        # Anhängen
+        schreibe(pfad, meldung("A", "B", 5, 5))
+        warte_auf_version(echtzeit, 1)
+        assert echtzeit["verspaetungen"] == {a: {(b, 0): (5, 5)}}
+
+        # Ungültige Verspätung wird übersprungen, der Feed läuft weiter
+        schreibe(pfad, meldung("B", "C", '"x"', 0) + meldung("B", "C", 3, 4))
+        warte_auf_version(echtzeit, 2)
+        assert echtzeit["verspaetungen"][b] == {(c, 0): (3, 4)}
+
+        # Kürzen: die Datei wird von vorne gelesen, alte Meldungen werden nicht erneut angewendet
+        schreibe(pfad, meldung("A", "B", 0, 0), modus="w")
+        warte_auf_version(echtzeit, 3)
+        assert echtzeit["verspaetungen"] == {b: {(c, 0): (3, 4)}}
+
+        # Rotation per Umbenennen auf eine größere Datei: die neue Datei wird gelesen
+        neu = str(tmp_path / "neu.jsonl")
+        schreibe(neu, meldung("X", "Y", 1, 1) * 5 + meldung("B", "C", 0, 0), modus="w")
+        os.replace(neu, pfad)
+        warte_auf_version(echtzeit, 4)
+        assert echtzeit["verspaetungen"] == {}
+        assert echtzeit["overlay"]["ersetzt"] == {}
+
+        # Rotation auf eine kleinere Datei
+        schreibe(neu, meldung("A", "B", 2, 2), modus="w")
+        os.replace(neu, pfad)
+        warte_auf_version(echtzeit, 5)
+        assert echtzeit["verspaetungen"] == {a: {(b, 0): (2, 2)}}
+        assert thread.is_alive()
+    finally:
+        stop.set()
+        thread.join(timeout=5)
+
+
+# Drei Züge A → B (Zug 3 kurz vor Mitternacht) und Zug 1 weiter nach C
+def fahrplan_mit_nachtzug():
+    def zeit(stunde, minute):
+        return datetime(2025, 4, 15, stunde, minute)
+
+    return {
+        "A": [
+            ("1", "B", zeit(8, 0), zeit(8, 30), "ICE", 1, 2.0, 1.0),
+            ("2", "B", zeit(8, 10), zeit(8, 40), "RE", 1, 2.0, 1.0),
+            ("3", "B", zeit(23, 55), zeit(0, 25), "RE", 1, 2.0, 1.0),
+        ],
+        "B": [("1", "C", zeit(8, 35), zeit(9, 0), "ICE", 2, 2.0, 1.0)],
+    }
+
+
+def test_verspaetungsoverlay_verschiebt_verbindungen():
+    kompiliert = kompiliere_station_departures(fahrplan_mit_nachtzug())
+    a, b = kompiliert["station_id"]["A"], kompiliert["station_id"]["B"]
+    zug_1, zug_2, zug_3 = (kompiliert["zug_id"][zug] for zug in "123")
+
+    # Unbekannte Bahnhöfe werden ignoriert
+    overlay = erstelle_verspaetungsoverlay(kompiliert, {
+        ("A", "B", "1"): (15, 12), ("A", "B", "3"): (10, 10), ("X", "B", "1"): (1, 1)
+    })
+    assert list(overlay["ersetzt"]) == [a]
+    assert verbindungen_mit_overlay(kompiliert, overlay, b) is None
+
+    # Tageskopien (2 Tage): Zug 1 um 8:15, Zug 2 unverändert, Zug 3 über Mitternacht auf 0:05 verschoben
+    # (die Kopie des Vortags erscheint am Tagesbeginn, die am Ende des zweiten Tages entfällt)
+    abfahrten, ankuenfte, zuege, ziele, _infos = verbindungen_mit_overlay(kompiliert, overlay, a)
+    assert abfahrten == [5, 490, 495, 1445, 1930, 1935]
+    assert ankuenfte == [35, 520, 522, 1475, 1960, 1962]
+    assert zuege == [zug_3, zug_2, zug_1, zug_3, zug_2, zug_1]
+    assert ziele == [b] * 6
+
+    # Zusammengeführte Listen werden im Overlay gemerkt
+    assert verbindungen_mit_overlay(kompiliert, overlay, a) is overlay["zusammengefuehrt"][a]
+
+
+def test_overlay_aus_echtzeitfeed_wie_neu_erstellt():
+    kompiliert = kompiliere_station_departures(fahrplan_mit_nachtzug())
+    echtzeit = erstelle_echtzeitfahrplan(kompiliert)
+    wende_verspaetungen_an(echtzeit, [
+        {"from_station": "A", "to_station": "B", "train_number": "1", "dep_delay": 15, "arr_delay": 12},
+        {"from_station": "A", "to_station": "B", "train_number": "3", "dep_delay": 10, "arr_delay": 10},
+    ])
+    overlay = erstelle_verspaetungsoverlay(kompiliert, {("A", "B", "1"): (15, 12), ("A", "B", "3"): (10, 10)})
+    assert echtzeit["overlay"]["ersetzt"] == overlay["ersetzt"]
+    assert sorted(echtzeit["overlay"]["zusatz"][0]) == sorted(overlay["zusatz"][0])
+
+
+def test_suche_mit_overlay_wie_mit_verschobenem_fahrplan():
+    def zeit(stunde, minute):
+        return datetime(2025, 4, 15, stunde, minute)
+
+    station_departures = fahrplan_mit_nachtzug()
+    verschoben = fahrplan_mit_nachtzug()
+    verschoben["A"][0] = ("1", "B", zeit(8, 15), zeit(8, 42), "ICE", 1, 2.0, 1.0)
+    verschoben["B"][0] = ("1", "C", zeit(8, 45), zeit(9, 10), "ICE", 2, 2.0, 1.0)
+
+    kompiliert = kompiliere_station_departures(station_departures)
+    overlay = erstelle_verspaetungsoverlay(kompiliert, {("A", "B", "1"): (15, 12), ("B", "C", "1"): (10, 10)})
+    mit_overlay = routenplanung("A", "C", station_departures, zeit(7, 0), travel_date=date(2025, 4, 15),
+                                kompilierter_fahrplan=kompiliert, verspaetungsoverlay=overlay)
+    erwartet = routenplanung("A", "C", verschoben, zeit(7, 0), travel_date=date(2025, 4, 15))
+
+    assert mit_overlay == erwartet
+    assert mit_overlay[0][-1]["planned_arrival_to"] == zeit(9, 10)
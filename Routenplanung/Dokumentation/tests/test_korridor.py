@@ -0,0 +1,126 @@
+import math
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from korridor import (erstelle_raumindex, kandidaten_im_bereich, stationen_im_radius, stationen_im_rechteck,
+                      erlaubte_stationen, ERDRADIUS_KM)
+
+
+# Minimaler kompilierter Fahrplan: nur die Bahnhofsliste und ihre IDs werden vom Raumindex gelesen
+def fahrplan_mit_stationen(stationen):
+    return {"stationen": list(stationen), "station_id": {station: i for i, station in enumerate(stationen)}}
+
+
+# Zufällige Bahnhöfe über 20 Breitengrade (auch weit polwärts der mittleren Breite) und 30 Längengrade
+def zufaellige_koordinaten(seed, anzahl=300):
+    rng = random.Random(seed)
+    breite = rng.choice([10, 47, 60])
+    return {
+        f"S{i}": (rng.uniform(breite - 8, breite + 12), rng.uniform(-5, 25))
+        for i in range(anzahl)
+    }
+
+
+def haversine_km(a, b):
+    breite_a, laenge_a, breite_b, laenge_b = map(math.radians, (*a, *b))
+    h = (math.sin((breite_b - breite_a) / 2) ** 2
+         + math.cos(breite_a) * math.cos(breite_b) * math.sin((laenge_b - laenge_a) / 2) ** 2)
+    return 2 * ERDRADIUS_KM * math.asin(math.sqrt(h))
+
+
+def test_projektion_mit_mittlerer_breite():
+    koordinaten = {"A": (50.0, 8.0), "B": (52.0, 13.0)}
+    raumindex = erstelle_raumindex(fahrplan_mit_stationen(["A", "B", "OHNE"]), koordinaten)
+
+    assert raumindex["bezugsbreite"] == pytest.approx(math.radians(51.0))
+    assert raumindex["x"][1] == pytest.approx(ERDRADIUS_KM * math.radians(13.0) * math.cos(math.radians(51.0)))
+    assert raumindex["y"][1] == pytest.approx(ERDRADIUS_KM * math.radians(52.0))
+
+    # Bahnhöfe ohne Koordinaten sind immer erlaubt
+    assert list(raumindex["grundmaske"]) == [False, False, True]
+    assert stationen_im_radius(raumindex, 0, 1, puffer_km=0)[2] == 1
+
+
+def test_kandidaten_an_streifen_und_bereichsgrenzen():
+    koordinaten = zufaellige_koordinaten(1, anzahl=200)
+    fahrplan = fahrplan_mit_stationen(list(koordinaten))
+    x_alle = erstelle_raumindex(fahrplan, koordinaten)["x"]
+
+    # Streifenbreite so, dass Bahnhöfe genau auf Streifengrenzen liegen; Bereichsgrenzen genau auf Bahnhöfen.
+    # Kandidaten sind ganze Streifen im y-Bereich: kein Bahnhof im Bereich fehlt, keiner liegt weiter als ein
+    # Streifen daneben
+    rng = random.Random(2)
+    for zellgroesse in (abs(x_alle[0]) / 7, abs(x_alle[1]) / 3, 50.0):
+        raumindex = erstelle_raumindex(fahrplan, koordinaten, zellgroesse_km=zellgroesse)
+        x, y = raumindex["x"], raumindex["y"]
+        for _ in range(100):
+            a, b, c, d = rng.sample(range(len(koordinaten)), 4)
+            x_min, x_max = sorted((x[a], x[b]))
+            y_min, y_max = sorted((y[c], y[d]))
+            kandidaten = kandidaten_im_bereich(raumindex, x_min, x_max, y_min, y_max)
+            im_bereich = np.flatnonzero((x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max))
+            assert set(im_bereich) <= set(kandidaten)
+            assert len(set(kandidaten)) == len(kandidaten)
+            assert np.all((y[kandidaten] >= y_min) & (y[kandidaten] <= y_max))
+            assert np.all((x[kandidaten] > x_min - zellgroesse) & (x[kandidaten] < x_max + zellgroesse))
+
+
+def test_radius_maske_wie_haversine():
+    for seed in range(20):
+        rng = random.Random(seed)
+        koordinaten = zufaellige_koordinaten(seed)
+        stationen = list(koordinaten)
+        raumindex = erstelle_raumindex(fahrplan_mit_stationen(stationen), koordinaten,
+                                       zellgroesse_km=rng.choice([10, 50, 200]))
+        for _ in range(20):
+            source, target = rng.sample(range(len(stationen)), 2)
+            puffer_km = rng.choice([0, 50, 200])
+            radius_km = haversine_km(koordinaten[stationen[source]], koordinaten[stationen[target]]) + puffer_km
+            entfernungen = [haversine_km(koordinaten[stationen[source]], koordinaten[s]) for s in stationen]
+            erwartet = bytes(
+                1 if i in (source, target) or entfernung <= radius_km else 0
+                for i, entfernung in enumerate(entfernungen)
+            )
+            maske = stationen_im_radius(raumindex, source, target, puffer_km=puffer_km)
+
+            # Bahnhöfe genau auf dem Kreis (Rundungsfehler) ausgenommen
+            abweichungen = [i for i in range(len(stationen))
+                            if maske[i] != erwartet[i] and abs(entfernungen[i] - radius_km) > 1e-6]
+            assert abweichungen == [], (seed, source, target, puffer_km)
+
+
+def test_rechteck_maske_wie_lineare_pruefung():
+    for seed in range(20):
+        rng = random.Random(seed)
+        koordinaten = zufaellige_koordinaten(seed)
+        raumindex = erstelle_raumindex(fahrplan_mit_stationen(list(koordinaten)), koordinaten,
+                                       zellgroesse_km=rng.choice([10, 50, 200]))
+        x, y = raumindex["x"], raumindex["y"]
+        for _ in range(20):
+            source, target = rng.sample(range(len(koordinaten)), 2)
+            puffer_km = rng.choice([0, 50, 200])
+            laenge = math.hypot(x[target] - x[source], y[target] - y[source])
+            dx, dy = (x[target] - x[source]) / laenge, (y[target] - y[source]) / laenge
+            entlang = (x - x[source]) * dx + (y - y[source]) * dy
+            seitlich = np.abs((x - x[source]) * dy - (y - y[source]) * dx)
+            erlaubt = (entlang >= -0.2 * laenge) & (entlang <= 1.2 * laenge) & (seitlich <= puffer_km)
+            erlaubt[[source, target]] = True
+            assert stationen_im_rechteck(raumindex, source, target, puffer_km=puffer_km) == erlaubt.tobytes()
+
+
+def test_erlaubte_stationen_nach_namen():
+    koordinaten = {"A": (50.0, 8.0), "B": (52.0, 13.0), "C": (60.0, 30.0)}
+    fahrplan = fahrplan_mit_stationen(["A", "B", "C", "OHNE"])
+    raumindex = erstelle_raumindex(fahrplan, koordinaten)
+
+    assert erlaubte_stationen(raumindex, fahrplan, "A", "B", "radius", puffer_km=0) == bytes([1, 1, 0, 1])
+    assert erlaubte_stationen(raumindex, fahrplan, "A", "OHNE", "rechteck") is None
+    assert erlaubte_stationen(raumindex, fahrplan, "A", "UNBEKANNT", "radius") is None
+    with pytest.raises(ValueError):
+        erlaubte_stationen(raumindex, fahrplan, "A", "B", "kreis")
@@ -0,0 +1,123 @@
+import os
+import sys
+from datetime import datetime, date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routen_berechnung import kompiliere_station_departures
+from fahrplan import erstelle_verbindungsliste
+from replan import (analyse_and_replan, erstelle_replan_cache, replan_cache_lesen, replan_cache_schreiben,
+                    plane_umstiege)
+
+
+REISEDATUM = date(2025, 4, 15)
+
+
+def zeit(stunde, minute):
+    return datetime(2025, 4, 15, stunde, minute)
+
+
+# Zug 1 fährt A → B, Anschlüsse nach C mit Zug 2 (8:35), Zug 3 (8:43) und Zug 4 (9:30)
+def beispiel_station_departures():
+    return {
+        "A": [("1", "B", zeit(8, 0), zeit(8, 30), "ICE", 1, 2.0, 1.0)],
+        "B": [
+            ("2", "C", zeit(8, 35), zeit(9, 0), "RE", 1, 2.0, 1.0),
+            ("3", "C", zeit(8, 43), zeit(9, 10), "RE", 1, 2.0, 1.0),
+            ("4", "C", zeit(9, 30), zeit(10, 0), "RE", 1, 2.0, 1.0),
+        ],
+    }
+
+
+# Route A → B → C mit Umstieg in B (5 Minuten) und der erwarteten Verspätung von Zug 1
+def route_mit_verspaetung(predicted_delay):
+    return [
+        {"station_from": "A", "station_to": "B", "train_number": "1", "departure_date": REISEDATUM,
+         "planned_departure_from": zeit(8, 0), "planned_arrival_to": zeit(8, 30),
+         "umsteigeort": "B", "umsteigezeit_minuten": 5.0, "predicted_delay": predicted_delay},
+        {"station_from": "B", "station_to": "C", "train_number": "2", "departure_date": REISEDATUM,
+         "planned_departure_from": zeit(8, 35), "planned_arrival_to": zeit(9, 0),
+         "umsteigeort": None, "umsteigezeit_minuten": None, "predicted_delay": 0},
+    ]
+
+
+# Route ab dem Umsteigeort, wie sie im Cache gespeichert wird
+def strecke(abfahrt, zug="x"):
+    return [{"planned_departure_from": abfahrt, "planned_arrival_to": zeit(10, 0), "train_number": zug}]
+
+
+def alternativer_zug(analyse):
+    return analyse["alternative_routeninfos"][0]["alternative_route"][-1]["train_number"]
+
+
+def test_abfahrt_kurz_nach_neustart_wird_gefunden():
+    station_departures = beispiel_station_departures()
+    kompiliert = kompiliere_station_departures(station_departures)
+    verbindungen = erstelle_verbindungsliste(station_departures)
+
+    for parameter in ({"station_departures": station_departures, "kompilierter_fahrplan": kompiliert},
+                      {"station_departures": None, "verbindungen": verbindungen}):
+        cache = erstelle_replan_cache()
+
+        # Neustart 8:41: Zug 3 fährt 2 Minuten später und muss gefunden werden (auch beim ersten Aufruf)
+        analyse = analyse_and_replan([route_mit_verspaetung(11)], replan_cache=cache, cache_version="v1", **parameter)
+        assert alternativer_zug(analyse[0]) == "3"
+
+        # Neustart 8:44 im selben Intervall: die gespeicherte Route mit Zug 3 gilt nicht mehr
+        analyse = analyse_and_replan([route_mit_verspaetung(14)], replan_cache=cache, cache_version="v1", **parameter)
+        assert alternativer_zug(analyse[0]) == "4"
+
+        # Derselbe Neustart nutzt den Eintrag wieder
+        def hole_verbindungen():
+            raise AssertionError("Route hätte aus dem Cache kommen müssen")
+
+        analyse = analyse_and_replan([route_mit_verspaetung(14)], None, replan_cache=cache, cache_version="v1",
+                                     hole_verbindungen=hole_verbindungen)
+        assert alternativer_zug(analyse[0]) == "4"
+
+        # Ein früherer Neustart (8:42) wird neu berechnet, die Suche ab 8:44 hätte Zug 3 nicht gesehen
+        analyse = analyse_and_replan([route_mit_verspaetung(12)], replan_cache=cache, cache_version="v1", **parameter)
+        assert alternativer_zug(analyse[0]) == "3"
+
+
+def test_replan_cache_nur_gueltige_routen():
+    cache = erstelle_replan_cache()
+    schluessel = ("v1", "B", zeit(8, 41), "C")
+    assert replan_cache_lesen(cache, schluessel) == (False, None)
+    replan_cache_schreiben(cache, schluessel, strecke(zeit(8, 43)))
+
+    # Gleiches Intervall (8:40–8:44): gültig, solange die Route nicht vor dem Neustart abfährt und die Suche nicht
+    # später begonnen hat
+    assert replan_cache_lesen(cache, ("v1", "B", zeit(8, 42), "C")) == (True, strecke(zeit(8, 43)))
+    assert replan_cache_lesen(cache, ("v1", "B", zeit(8, 44), "C")) == (False, None)
+    replan_cache_schreiben(cache, ("v1", "B", zeit(8, 44), "C"), strecke(zeit(9, 30)))
+    assert replan_cache_lesen(cache, ("v1", "B", zeit(8, 40), "C")) == (False, None)
+
+
+# Während eines Snapshot-Wechsels laufen Anfragen beider Versionen abwechselnd; keine darf die andere verdrängen
+def test_replan_cache_mit_wechselnden_versionen():
+    cache = erstelle_replan_cache()
+    for version in ("alt", "neu"):
+        schluessel = (version, "B", zeit(9, 0), "C")
+        assert replan_cache_lesen(cache, schluessel) == (False, None)
+        replan_cache_schreiben(cache, schluessel, strecke(zeit(9, 5), version))
+
+    for version in ("alt", "neu", "alt"):
+        assert replan_cache_lesen(cache, (version, "B", zeit(9, 0), "C")) == (True, strecke(zeit(9, 5), version))
+
+
+# Die Verbindungsliste wird nur geladen, wenn eine Route tatsächlich neu berechnet werden muss
+def test_verbindungsliste_nur_bei_bedarf():
+    def hole_verbindungen():
+        raise AssertionError("Verbindungsliste darf nicht geladen werden")
+
+    assert plane_umstiege({}, None, hole_verbindungen=hole_verbindungen) == {}
+
+    cache = erstelle_replan_cache()
+    schluessel = ("v1", "B", zeit(9, 0), "C")
+    replan_cache_lesen(cache, schluessel)
+    replan_cache_schreiben(cache, schluessel, strecke(zeit(9, 5)))
+    umstiege = {schluessel: (("B", "C", zeit(9, 0), REISEDATUM), None)}
+    assert plane_umstiege(umstiege, None, replan_cache=cache, hole_verbindungen=hole_verbindungen) == {
+        schluessel: strecke(zeit(9, 5))
+    }
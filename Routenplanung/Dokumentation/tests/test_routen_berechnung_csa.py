@@ -0,0 +1,157 @@
+import os
+import random
+import sys
+from datetime import datetime, date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routen_berechnung_csa import connection_scan, routenplanung_csa
+from fahrplan import erstelle_verbindungsliste, MINUTEN_PRO_TAG
+
+
+REISEDATUM = date(2025, 4, 15)
+
+
+def zeit(stunde, minute):
+    return datetime(2025, 4, 15, stunde, minute)
+
+
+# erstellt station_departures aus Zügen {zug: [(von, nach, abfahrt, ankunft), ...]} (Zeiten als datetime)
+def fahrplan_aus_zuegen(zuege):
+    station_departures = {}
+    for zug, abschnitte in zuege.items():
+        for halt_nummer, (von, nach, abfahrt, ankunft) in enumerate(abschnitte, start=1):
+            station_departures.setdefault(von, []).append((zug, nach, abfahrt, ankunft, "RE", halt_nummer, 1.0, 1.0))
+            station_departures.setdefault(nach, [])
+    for abfahrten in station_departures.values():
+        abfahrten.sort(key=lambda x: x[2])
+    return station_departures
+
+
+# Zug 1 A → B, in B Anschluss an Zug 2 (3 Minuten Umstieg) oder Zug 3 (10 Minuten); Zug 4 fährt direkt A → C
+def fahrplan_mit_umstieg():
+    return fahrplan_aus_zuegen({
+        "1": [("A", "B", zeit(8, 0), zeit(8, 30))],
+        "2": [("B", "C", zeit(8, 33), zeit(9, 0))],
+        "3": [("B", "C", zeit(8, 40), zeit(9, 20))],
+        "4": [("A", "C", zeit(8, 5), zeit(9, 30))],
+    })
+
+
+def scan_ankunft(verbindungen, start, **kwargs):
+    route = connection_scan(verbindungen, "A", "C", start, **kwargs)
+    return None if route is None else verbindungen["ankunft"][route[-1]]
+
+
+def test_connection_scan_mindestumstiegszeit_und_anfangswartezeit():
+    verbindungen = erstelle_verbindungsliste(fahrplan_mit_umstieg())
+    start = 7 * 60
+
+    # Der Umstieg auf Zug 2 braucht höchstens 3 Minuten
+    assert scan_ankunft(verbindungen, start, min_transfer_minutes=5) == 9 * 60 + 20
+    assert scan_ankunft(verbindungen, start, min_transfer_minutes=3) == 9 * 60
+
+    # Zug 1 fährt 60 Minuten nach dem Start; wer ihn verpasst, nimmt den Direktzug 4
+    assert scan_ankunft(verbindungen, start, max_initial_wait_hours=0.5) is None
+    assert scan_ankunft(verbindungen, start, max_initial_wait_hours=1) == 9 * 60 + 20
+    assert scan_ankunft(verbindungen, 8 * 60 + 1, max_initial_wait_hours=1) == 9 * 60 + 30
+
+
+"""
+bestimmt die früheste Ankunft durch Aufzählen aller Reiseketten: im Zug bleiben, am Start (ohne Umstiegszeit,
+innerhalb der Anfangswartezeit) oder nach einem Umstieg (mit Mindestumstiegszeit) in einen Zug einsteigen.
+`zuege` in Minuten: {zug: [(von, nach, abfahrt, ankunft), ...]}; wie in der Verbindungsliste fährt jeder Zug auch
+am Vortag und am Folgetag (nur Abschnitte mit Abfahrt in den zwei Tagen ab Mitternacht).
+"""
+
+def frueheste_ankunft_durch_aufzaehlen(zuege, source, target, start, min_transfer, letzte_startabfahrt):
+    zuege = {
+        (zug, tag): [
+            (von, nach, abfahrt + tag * MINUTEN_PRO_TAG, ankunft + tag * MINUTEN_PRO_TAG)
+            for von, nach, abfahrt, ankunft in abschnitte
+            if 0 <= abfahrt + tag * MINUTEN_PRO_TAG < 2 * MINUTEN_PRO_TAG
+        ]
+        for zug, abschnitte in zuege.items() for tag in (-1, 0, 1)
+    }
+
+    beste = None
+    offen = []
+    for zug, abschnitte in zuege.items():
+        for pos, (von, _nach, abfahrt, _ankunft) in enumerate(abschnitte):
+            if von == source and start <= abfahrt <= letzte_startabfahrt:
+                offen.append((zug, pos))
+
+    besucht = set()
+    while offen:
+        zug, pos = offen.pop()
+        if (zug, pos) in besucht:
+            continue
+        besucht.add((zug, pos))
+        _von, nach, _abfahrt, ankunft = zuege[zug][pos]
+        if nach == target and (beste is None or ankunft < beste):
+            beste = ankunft
+        if pos + 1 < len(zuege[zug]):
+            offen.append((zug, pos + 1))
+        for anschluss, abschnitte in zuege.items():
+            for anschluss_pos, (von, _nach, abfahrt, _ankunft) in enumerate(abschnitte):
+                if von == nach and von != source and abfahrt >= ankunft + min_transfer:
+                    offen.append((anschluss, anschluss_pos))
+    return beste
+
+
+# Zufälliger Fahrplan: Züge über 2-4 verschiedene Bahnhöfe zwischen 6:00 und etwa 12:00 (Zeiten in Minuten)
+def zufaellige_zuege(seed, anzahl_zuege=25, stationen="ABCDEF"):
+    rng = random.Random(seed)
+    zuege = {}
+    for nummer in range(anzahl_zuege):
+        halte = rng.sample(stationen, rng.randint(2, 4))
+        minuten = rng.randint(6 * 60, 10 * 60)
+        abschnitte = []
+        for von, nach in zip(halte, halte[1:]):
+            abfahrt = minuten + rng.randint(0, 3)
+            minuten = abfahrt + rng.randint(5, 40)
+            abschnitte.append((von, nach, abfahrt, minuten))
+        zuege[str(nummer)] = abschnitte
+    return zuege
+
+
+def test_connection_scan_wie_aufzaehlung():
+    for seed in range(30):
+        zuege = zufaellige_zuege(seed)
+        mitternacht = datetime(2025, 4, 15)
+        verbindungen = erstelle_verbindungsliste(fahrplan_aus_zuegen({
+            zug: [(von, nach, mitternacht + timedelta(minutes=ab), mitternacht + timedelta(minutes=an))
+                  for von, nach, ab, an in abschnitte]
+            for zug, abschnitte in zuege.items()
+        }))
+        for source, target in [("A", "B"), ("C", "F"), ("E", "D")]:
+            for start, wartezeit, umstieg in [(6 * 60, 6, 5), (7 * 60 + 30, 1, 5), (8 * 60, 2, 0), (6 * 60, 0.5, 15)]:
+                route = connection_scan(verbindungen, source, target, start, min_transfer_minutes=umstieg,
+                                        max_initial_wait_hours=wartezeit)
+                erwartet = frueheste_ankunft_durch_aufzaehlen(zuege, source, target, start, umstieg,
+                                                             start + wartezeit * 60)
+                assert (None if route is None else verbindungen["ankunft"][route[-1]]) == erwartet, \
+                    (seed, source, target, start, wartezeit, umstieg)
+
+
+# Stündlicher Direktzug A → C (Fahrzeit 60 Minuten), dazu ein schnellerer Zug um 9:30
+def stuendliche_zuege():
+    zuege = {str(stunde): [("A", "C", zeit(stunde, 0), zeit(stunde + 1, 0))] for stunde in range(8, 14)}
+    zuege["S"] = [("A", "C", zeit(9, 30), zeit(10, 0))]
+    return fahrplan_aus_zuegen(zuege)
+
+
+def test_mehrere_routen_im_anfangsfenster():
+    station_departures = stuendliche_zuege()
+
+    # 9:00 und 9:30 kommen beide um 10:00 an: nur die spätere Abfahrt bleibt
+    routes = routenplanung_csa("A", "C", station_departures, zeit(8, 0), travel_date=REISEDATUM,
+                               max_initial_wait_hours=6)
+    assert [(r[0]["planned_departure_from"], r[-1]["planned_arrival_to"]) for r in routes] == [
+        (zeit(8, 0), zeit(9, 0)), (zeit(9, 30), zeit(10, 0)), (zeit(10, 0), zeit(11, 0)), (zeit(11, 0), zeit(12, 0))
+    ]
+
+    # Folgesuchen verlängern das Fenster nicht: bis 9:45 nur die Abfahrten 8:00 und 9:30
+    routes = routenplanung_csa("A", "C", station_departures, zeit(7, 45), travel_date=REISEDATUM,
+                               max_initial_wait_hours=2)
+    assert [r[0]["planned_departure_from"] for r in routes] == [zeit(8, 0), zeit(9, 30)]
@@ -0,0 +1,107 @@
+import os
+import sys
+from datetime import datetime, date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routen_berechnung_raptor import raptor_runden, routenplanung_raptor, routenplanung_profil
+from routen_berechnung_csa import connection_scan
+from fahrplan import erstelle_linienmuster, erstelle_verbindungsliste
+from test_routen_berechnung_csa import fahrplan_aus_zuegen, zufaellige_zuege
+
+
+REISEDATUM = date(2025, 4, 15)
+
+
+def zeit(stunde, minute):
+    return datetime(2025, 4, 15, stunde, minute)
+
+
+# Minuten seit Mitternacht des Reisedatums (Ankünfte am Folgetag über 24:00)
+def minuten(zeitpunkt):
+    return int((zeitpunkt - datetime(2025, 4, 15)).total_seconds()) // 60
+
+
+# Zug 1 A → B mit Anschluss an Zug 2 B → C (Ankunft 9:20); Zug 4 fährt um 9:00 direkt A → C (Ankunft 9:40)
+def fahrplan_mit_direktzug():
+    return fahrplan_aus_zuegen({
+        "1": [("A", "B", zeit(8, 0), zeit(8, 30))],
+        "2": [("B", "C", zeit(8, 40), zeit(9, 20))],
+        "4": [("A", "C", zeit(9, 0), zeit(9, 40))],
+    })
+
+
+def test_raptor_runden_je_anzahl_zuege():
+    linienmuster = erstelle_linienmuster(fahrplan_mit_direktzug())
+    tau, labels = raptor_runden(linienmuster, "A", "C", 7 * 60)
+
+    # Runde 1: nur Direktzüge, Runde 2: ein Umstieg; danach wird nichts mehr verbessert
+    assert tau[1]["C"] == 9 * 60 + 40
+    assert tau[2]["C"] == 9 * 60 + 20
+    assert "C" in labels[1] and "C" in labels[2]
+    assert all("C" not in runde for runde in labels[3:])
+
+    muster = linienmuster["muster"][labels[2]["C"][0]]
+    assert muster["zug"][labels[2]["C"][1]] == "2"
+
+    # Pareto-Menge Ankunft / Umstiege, nach Ankunft sortiert
+    routes = routenplanung_raptor("A", "C", fahrplan_mit_direktzug(), zeit(7, 0), travel_date=REISEDATUM)
+    assert [[abschnitt["train_number"] for abschnitt in route] for route in routes] == [["1", "2"], ["4"]]
+
+
+def test_profilsuche_behaelt_zustand_spaeterer_abfahrten():
+    linienmuster = erstelle_linienmuster(fahrplan_mit_direktzug())
+
+    # Spätere Abfahrt zuerst: der Direktzug um 9:00 bleibt in Runde 1 erhalten, 8:00 verbessert nur Runde 2
+    zustand = {"tau": [{}], "labels": [{}]}
+    raptor_runden(linienmuster, "A", "C", 9 * 60, max_initial_wait_hours=0, zustand=zustand)
+    assert zustand["tau"][1]["C"] == 9 * 60 + 40
+    raptor_runden(linienmuster, "A", "C", 8 * 60, max_initial_wait_hours=0, zustand=zustand)
+    assert zustand["tau"][1]["C"] == 9 * 60 + 40
+    assert zustand["tau"][2]["C"] == 9 * 60 + 20
+
+    # Ohne Zustand sieht ein Lauf ab 8:00 ohne Wartezeit den Direktzug nicht
+    tau, _labels = raptor_runden(linienmuster, "A", "C", 8 * 60, max_initial_wait_hours=0)
+    assert "C" not in tau[1]
+
+    routes = routenplanung_profil("A", "C", fahrplan_mit_direktzug(), zeit(7, 0), travel_date=REISEDATUM)
+    assert [(route[0]["planned_departure_from"], route[-1]["planned_arrival_to"], len(route)) for route in routes] == [
+        (zeit(8, 0), zeit(9, 20), 2), (zeit(9, 0), zeit(9, 40), 1)
+    ]
+
+
+def test_raptor_und_profilsuche_wie_csa():
+    mitternacht = datetime(2025, 4, 15)
+    for seed in range(30):
+        zuege = zufaellige_zuege(seed)
+        station_departures = fahrplan_aus_zuegen({
+            zug: [(von, nach, mitternacht + timedelta(minutes=ab), mitternacht + timedelta(minutes=an))
+                  for von, nach, ab, an in abschnitte]
+            for zug, abschnitte in zuege.items()
+        })
+        verbindungen = erstelle_verbindungsliste(station_departures)
+        linienmuster = erstelle_linienmuster(station_departures)
+
+        for source, target in [("A", "B"), ("C", "F"), ("E", "D")]:
+
+            # Früheste Ankunft über alle Runden = Ergebnis des Connection Scan
+            for start, wartezeit, umstieg in [(6 * 60, 6, 5), (7 * 60 + 30, 1, 5), (8 * 60, 2, 0)]:
+                route = connection_scan(verbindungen, source, target, start, min_transfer_minutes=umstieg,
+                                        max_initial_wait_hours=wartezeit)
+                tau, _labels = raptor_runden(linienmuster, source, target, start, min_transfer_minutes=umstieg,
+                                             max_initial_wait_hours=wartezeit)
+                assert min((runde[target] for runde in tau[1:] if target in runde), default=None) == \
+                    (None if route is None else verbindungen["ankunft"][route[-1]]), (seed, source, target, start)
+
+            # Profil 7:00-10:00: für jede Abfahrt am Start ist die früheste Ankunft aller Verbindungen, die
+            # nicht früher abfahren, die Ankunft des Connection Scan ab dieser Abfahrt (Ende des Fensters wie im Profil)
+            routes = routenplanung_profil(source, target, station_departures, zeit(7, 0), travel_date=REISEDATUM,
+                                          fenster_stunden=3, anzahl_routen=len(verbindungen["abfahrt"])) or []
+            profil = [(minuten(route[0]["planned_departure_from"]), minuten(route[-1]["planned_arrival_to"]))
+                      for route in routes]
+            abfahrten = {ab for abschnitte in zuege.values() for von, _nach, ab, _an in abschnitte
+                         if von == source and 7 * 60 <= ab <= 10 * 60}
+            for abfahrt in abfahrten:
+                route = connection_scan(verbindungen, source, target, abfahrt, letzte_startabfahrt=10 * 60)
+                assert min((an for ab, an in profil if ab >= abfahrt), default=None) == \
+                    (None if route is None else verbindungen["ankunft"][route[-1]]), (seed, source, target, abfahrt)
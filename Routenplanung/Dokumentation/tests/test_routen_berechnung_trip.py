@@ -0,0 +1,84 @@
+import os
+import sys
+from datetime import datetime, date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routen_berechnung_trip import trip_based_suche, routenplanung_trip
+from routen_berechnung_raptor import raptor_runden
+from fahrplan import erstelle_tripindex
+from test_routen_berechnung_csa import fahrplan_aus_zuegen, zufaellige_zuege
+
+
+REISEDATUM = date(2025, 4, 15)
+
+
+def zeit(stunde, minute):
+    return datetime(2025, 4, 15, stunde, minute)
+
+
+# Zug 1 A → B → C; in B fahren Zug 2 nach C (kommt nach Zug 1 an) und Zug 3 nach D
+def fahrplan_mit_unnoetigem_umstieg():
+    return fahrplan_aus_zuegen({
+        "1": [("A", "B", zeit(8, 0), zeit(8, 20)), ("B", "C", zeit(8, 22), zeit(9, 0))],
+        "2": [("B", "C", zeit(8, 30), zeit(9, 10))],
+        "3": [("B", "D", zeit(8, 30), zeit(8, 50))],
+    })
+
+
+# Muster und Fahrt eines Zuges mit der Abfahrt `abfahrt` (Minuten) am ersten Halt
+def fahrt_des_zuges(linienmuster, zug, abfahrt):
+    for muster_id, muster in enumerate(linienmuster["muster"]):
+        for fahrt, nummer in enumerate(muster["zug"]):
+            if nummer == zug and muster["abfahrt"][fahrt][0] == abfahrt:
+                return muster_id, fahrt
+    return None
+
+
+def test_umstiegsreduktion_verwirft_nur_unnoetige_umstiege():
+    tripindex = erstelle_tripindex(fahrplan_mit_unnoetigem_umstieg())
+    linienmuster = tripindex["linienmuster"]
+    muster_id, fahrt = fahrt_des_zuges(linienmuster, "1", 8 * 60)
+
+    # In B (Halt 1) bleibt nur der Umstieg in Zug 3; Zug 2 kommt in C nicht früher an als Zug 1
+    ziele = [linienmuster["muster"][ziel_muster_id]["zug"][ziel_fahrt]
+             for ziel_muster_id, ziel_fahrt, _pos in tripindex["umstiege"][muster_id][fahrt][1]]
+    assert ziele == ["3"]
+
+    routes = routenplanung_trip("A", "C", fahrplan_mit_unnoetigem_umstieg(), zeit(7, 0), travel_date=REISEDATUM,
+                                tripindex=tripindex)
+    assert [[abschnitt["train_number"] for abschnitt in route] for route in routes] == [["1", "1"]]
+    routes = routenplanung_trip("A", "D", fahrplan_mit_unnoetigem_umstieg(), zeit(7, 0), travel_date=REISEDATUM,
+                                tripindex=tripindex)
+    assert [[abschnitt["train_number"] for abschnitt in route] for route in routes] == [["1", "3"]]
+
+
+# Pareto-Menge aus RAPTOR (ohne Umstiegsreduktion): [(ankunft, umstiege), ...] mit fallender Ankunft
+def raptor_pareto(linienmuster, source, target, start, wartezeit, umstieg):
+    tau, _labels = raptor_runden(linienmuster, source, target, start, min_transfer_minutes=umstieg,
+                                 max_initial_wait_hours=wartezeit)
+    pareto = []
+    for k in range(1, len(tau)):
+        if target in tau[k] and (not pareto or tau[k][target] < pareto[-1][0]):
+            pareto.append((tau[k][target], k - 1))
+    return pareto
+
+
+def test_trip_based_wie_raptor():
+    mitternacht = datetime(2025, 4, 15)
+    for seed in range(20):
+        zuege = zufaellige_zuege(seed, anzahl_zuege=40)
+        station_departures = fahrplan_aus_zuegen({
+            zug: [(von, nach, mitternacht + timedelta(minutes=ab), mitternacht + timedelta(minutes=an))
+                  for von, nach, ab, an in abschnitte]
+            for zug, abschnitte in zuege.items()
+        })
+        for umstieg in (0, 5, 15):
+            tripindex = erstelle_tripindex(station_departures, umstieg)
+            for source, target in [("A", "B"), ("A", "F"), ("C", "F"), ("E", "D"), ("F", "A")]:
+                for start, wartezeit in [(6 * 60, 6), (7 * 60 + 30, 1)]:
+                    _warteschlangen, ziel_treffer = trip_based_suche(tripindex, source, target, start,
+                                                                     max_initial_wait_hours=wartezeit)
+                    assert [(ankunft, runde) for ankunft, runde, _idx, _pos in ziel_treffer] == raptor_pareto(
+                        tripindex["linienmuster"], source, target, start, wartezeit, umstieg
+                    ), (seed, umstieg, source, target, start)
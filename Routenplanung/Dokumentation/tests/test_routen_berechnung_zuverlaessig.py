@@ -0,0 +1,55 @@
+import os
+import sys
+from datetime import datetime, date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routen_berechnung_zuverlaessig import routenplanung_zuverlaessig
+
+
+REISEDATUM = date(2025, 4, 15)
+
+
+def zeit(stunde, minute):
+    return datetime(2025, 4, 15, stunde, minute)
+
+
+# Zug 1 (A → B, im Mittel 10 Minuten verspätet) mit zwei Anschlüssen nach C: Zug 2 nach 6 Minuten (riskant),
+# Zug 3 nach 40 Minuten (sicher)
+def beispiel_station_departures():
+    return {
+        "A": [("1", "B", zeit(8, 0), zeit(8, 30), "ICE", 1, 10.0, 10.0)],
+        "B": [
+            ("2", "C", zeit(8, 36), zeit(9, 0), "RE", 1, 1.0, 1.0),
+            ("3", "C", zeit(9, 10), zeit(9, 40), "RE", 1, 1.0, 1.0),
+        ],
+    }
+
+
+def zuege(route):
+    return [abschnitt["train_number"] for abschnitt in route]
+
+
+def test_riskanter_umstieg_wird_verworfen():
+    wahrscheinlichkeiten = []
+    routes = routenplanung_zuverlaessig(
+        "A", "C", beispiel_station_departures(), zeit(7, 0), travel_date=REISEDATUM,
+        anschlusswahrscheinlichkeiten=wahrscheinlichkeiten
+    )
+
+    # Der Umstieg auf Zug 2 wird unter 50 % erreicht, es bleibt die spätere, sichere Verbindung
+    assert [zuege(route) for route in routes] == [["1", "3"]]
+    assert len(wahrscheinlichkeiten) == 1 and wahrscheinlichkeiten[0] > 95
+    assert all("anschlusswahrscheinlichkeit" not in abschnitt for abschnitt in routes[0])
+
+
+def test_pareto_menge_mit_niedrigerer_schwelle():
+    wahrscheinlichkeiten = []
+    routes = routenplanung_zuverlaessig(
+        "A", "C", beispiel_station_departures(), zeit(7, 0), travel_date=REISEDATUM,
+        min_anschlusswahrscheinlichkeit=0.3, anschlusswahrscheinlichkeiten=wahrscheinlichkeiten
+    )
+
+    # Frühere, riskante und spätere, sichere Verbindung; Wahrscheinlichkeiten parallel zu den Routen
+    assert [zuege(route) for route in routes] == [["1", "2"], ["1", "3"]]
+    assert 30 < wahrscheinlichkeiten[0] < 50 < 95 < wahrscheinlichkeiten[1]
@@ -0,0 +1,153 @@
+import math
+import os
+import sys
+from datetime import datetime, date
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routen_berechnung import (routenplanung, kompiliere_station_departures, kompilierter_fahrplan_fuer, erstelle_untergrenzen,
+                               speichere_kompilierten_fahrplan, lade_kompilierten_fahrplan, FAHRPLAN_ARRAYS)
+
+
+REISEDATUM = date(2025, 4, 15)
+
+
+# Kleiner Fahrplan: Zug 1 fährt A → B → C
+def beispiel_station_departures():
+    def zeit(stunde, minute):
+        return datetime(2025, 4, 15, stunde, minute)
+
+    return {
+        "A": [("1", "B", zeit(8, 0), zeit(8, 30), "ICE", 1, 2.0, 1.0)],
+        "B": [("1", "C", zeit(8, 35), zeit(9, 0), "ICE", 2, 2.0, 1.0)],
+        "C": [],
+    }
+
+
+def test_start_gleich_ziel_liefert_keine_route():
+    station_departures = beispiel_station_departures()
+    routes = routenplanung(
+        "A", "A", station_departures, datetime(2025, 4, 15, 8, 0), travel_date=REISEDATUM,
+        kompilierter_fahrplan=kompiliere_station_departures(station_departures)
+    )
+    assert not routes
+
+
+def test_direktverbindung():
+    station_departures = beispiel_station_departures()
+    routes = routenplanung(
+        "A", "C", station_departures, datetime(2025, 4, 15, 7, 0), travel_date=REISEDATUM,
+        kompilierter_fahrplan=kompiliere_station_departures(station_departures)
+    )
+    assert routes
+    assert routes[0][0]["station_name_from"] == "A"
+    assert routes[0][-1]["station_name_to"] == "C"
+    assert routes[0][-1]["planned_arrival_to"] == datetime(2025, 4, 15, 9, 0)
+
+
+def test_kompilierter_fahrplan_wird_wiederverwendet():
+    station_departures = beispiel_station_departures()
+    kompiliert = kompilierter_fahrplan_fuer(station_departures)
+    assert kompilierter_fahrplan_fuer(station_departures) is kompiliert
+    assert kompilierter_fahrplan_fuer(beispiel_station_departures()) is not kompiliert
+
+
+def test_suche_ohne_kompilierten_fahrplan():
+    routes = routenplanung(
+        "A", "C", beispiel_station_departures(), datetime(2025, 4, 15, 7, 0), travel_date=REISEDATUM
+    )
+    assert routes[0][-1]["planned_arrival_to"] == datetime(2025, 4, 15, 9, 0)
+
+
+def test_kompilierter_fahrplan_nach_speichern_und_laden(tmp_path):
+    station_departures = beispiel_station_departures()
+
+    # Fehlende Prognosedaten und Zahlen aus numpy (wie aus pandas) im Kopf und in den info_*-Spalten
+    station_departures["C"] = [("2", "A", datetime(2025, 4, 15, 9, 10), datetime(2025, 4, 15, 9, 50), "RE",
+                                np.int64(3), None, None)]
+    kompiliert = kompiliere_station_departures(station_departures)
+    dateiname = str(tmp_path / "fahrplan.fpl")
+    speichere_kompilierten_fahrplan(kompiliert, dateiname)
+    geladen = lade_kompilierten_fahrplan(dateiname)
+
+    for name in ("tage", "stationen", "station_id", "zuege", "zug_id", "zugtypen"):
+        assert geladen[name] == kompiliert[name]
+    for name in FAHRPLAN_ARRAYS:
+        assert geladen[name].format == kompiliert[name].typecode
+        werte = [None if isinstance(wert, float) and math.isnan(wert) else wert for wert in geladen[name]]
+        assert werte == [None if isinstance(wert, float) and math.isnan(wert) else wert for wert in kompiliert[name]]
+    assert list(geladen["info_halt_nummer"]) == [1, 2, 3]
+    assert math.isnan(geladen["info_train_avg_30"][2]) and math.isnan(geladen["info_station_avg_30"][2])
+
+    routes = routenplanung(
+        "A", "C", station_departures, datetime(2025, 4, 15, 7, 0), travel_date=REISEDATUM,
+        kompilierter_fahrplan=geladen
+    )
+    assert routes and routes == routenplanung(
+        "A", "C", station_departures, datetime(2025, 4, 15, 7, 0), travel_date=REISEDATUM,
+        kompilierter_fahrplan=kompiliert
+    )
+
+
+def test_fahrplandatei_mit_falscher_kennung_wird_abgelehnt(tmp_path):
+    dateiname = str(tmp_path / "fahrplan.fpl")
+    speichere_kompilierten_fahrplan(kompiliere_station_departures(beispiel_station_departures()), dateiname)
+    with open(dateiname, "r+b") as f:
+        f.write(b"FPLAN000")
+
+    assert lade_kompilierten_fahrplan(dateiname) is None
+    assert lade_kompilierten_fahrplan(str(tmp_path / "fehlt.fpl")) is None
+
+
+
+# Vier Direktzüge S → Z (erste Ankünfte 7:30 bis 8:00), ein späterer Direktzug, eine Sackgasse S → X → Y, eine
+# Umwegroute über W, die erst nach der vierten Ankunft weiterfährt, und ein Zug zurück nach S
+def fahrplan_mit_sackgasse():
+    def zeit(stunde, minute):
+        return datetime(2025, 4, 15, stunde, minute)
+
+    def verbindung(zug, nach, ab, an):
+        return (zug, nach, zeit(*ab), zeit(*an), "RE", 1, 1.0, 1.0)
+
+    return {
+        "S": [
+            verbindung("1", "Z", (7, 0), (7, 30)),
+            verbindung("7", "X", (7, 5), (7, 15)),
+            verbindung("2", "Z", (7, 10), (7, 40)),
+            verbindung("3", "Z", (7, 20), (7, 50)),
+            verbindung("4", "Z", (7, 30), (8, 0)),
+            verbindung("6", "W", (8, 10), (8, 20)),
+            verbindung("5", "Z", (12, 0), (13, 0)),
+        ],
+        "X": [verbindung("7", "Y", (7, 20), (7, 30))],
+        "W": [verbindung("6", "V", (8, 25), (8, 35))],
+        "V": [verbindung("6", "Z", (8, 40), (9, 0))],
+        "Z": [verbindung("8", "S", (10, 0), (10, 30))],
+    }
+
+
+def test_untere_schranken_verwerfen_zustaende():
+    station_departures = fahrplan_mit_sackgasse()
+    kompiliert = kompiliere_station_departures(station_departures)
+
+    ergebnisse = []
+    for untergrenzen in (None, erstelle_untergrenzen(kompiliert)):
+        status = {}
+        routes = routenplanung(
+            "S", "Z", station_departures, datetime(2025, 4, 15, 7, 0), travel_date=REISEDATUM,
+            kompilierter_fahrplan=kompiliert, untergrenzen=untergrenzen, status=status
+        )
+        ergebnisse.append(([[abschnitt["train_number"] for abschnitt in route] for route in routes], status))
+
+    (routen_ohne, status_ohne), (routen_mit, status_mit) = ergebnisse
+    assert routen_ohne == routen_mit == [["1"], ["2"], ["3"], ["4"]]
+
+    # Ohne Schranken: S, X, Y, die vier Zielankünfte und W; nach der vierten ersten Zugankunft endet die Suche
+    assert status_ohne["durchlaeufe"] == 8
+    assert status_ohne["verworfen"] == 0
+
+    # Mit Schranken wird die Sackgasse X (Ziel unerreichbar) gar nicht erst betreten
+    assert status_mit["durchlaeufe"] == 6
+    assert status_mit["verworfen"] == 1
@@ -0,0 +1,73 @@
+import os
+import sys
+from datetime import datetime, date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routen_berechnung import routenplanung
+from routen_berechnung_csa import routenplanung_csa
+from routen_berechnung_raptor import routenplanung_raptor, routenplanung_profil
+from routen_berechnung_trip import routenplanung_trip
+from routen_berechnung_zuverlaessig import routenplanung_zuverlaessig
+from umstiegsmuster import routenplanung_muster, erstelle_umstiegsmuster
+
+
+REISEDATUM = date(2025, 4, 15)
+
+
+def zeit(stunde, minute):
+    return datetime(2025, 4, 15, stunde, minute)
+
+
+# Zug 1 fährt A → B → C, Zug 2 fährt B → C (Umstieg in B möglich)
+def beispiel_station_departures():
+    return {
+        "A": [("1", "B", zeit(8, 0), zeit(8, 30), "ICE", 1, 2.0, 1.0)],
+        "B": [
+            ("1", "C", zeit(8, 35), zeit(9, 0), "ICE", 2, 2.0, 1.0),
+            ("2", "C", zeit(8, 40), zeit(8, 55), "ICE", 1, 1.0, 1.0),
+        ],
+        "C": [],
+    }
+
+
+# Alle Suchverfahren mit gemeinsamer Signatur (Fahrplan, Zeitlimit, status), jeweils A → C ab 7:00
+def suche_mit_muster(station_departures, max_duration_seconds, status):
+    return routenplanung_muster("A", "C", station_departures, zeit(7, 0), travel_date=REISEDATUM,
+                                umstiegsmuster=erstelle_umstiegsmuster(station_departures, ["A", "C"]),
+                                max_duration_seconds=max_duration_seconds, status=status)
+
+
+def suche_mit(funktion):
+    def suche(station_departures, max_duration_seconds, status):
+        return funktion("A", "C", station_departures, zeit(7, 0), travel_date=REISEDATUM,
+                        max_duration_seconds=max_duration_seconds, status=status)
+    return suche
+
+
+SUCHVERFAHREN = [
+    suche_mit(routenplanung),
+    suche_mit(routenplanung_csa),
+    suche_mit(routenplanung_raptor),
+    suche_mit(routenplanung_profil),
+    suche_mit(routenplanung_trip),
+    suche_mit(routenplanung_zuverlaessig),
+    suche_mit_muster,
+]
+
+
+@pytest.mark.parametrize("suche", SUCHVERFAHREN)
+def test_vollstaendige_suche_ist_nicht_partial(suche):
+    status = {"partial": True}
+    routes = suche(beispiel_station_departures(), 5, status)
+    assert status["partial"] is False
+    assert routes[0][-1]["planned_arrival_to"] == zeit(8, 55)
+
+
+@pytest.mark.parametrize("suche", SUCHVERFAHREN)
+def test_abgelaufenes_zeitlimit_setzt_partial(suche):
+    status = {}
+    suche(beispiel_station_departures(), -1, status)
+    assert status["partial"] is True
@@ -0,0 +1,36 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routen_berechnung import baue_routendetails
+from zuverlaessigkeit import bewerte_routen, anschlusswahrscheinlichkeit, verspaetungsparameter
+
+
+# Route mit einem Umstieg in B (7 Minuten); mittlere Verspätung 4 bzw. 2 Minuten
+def route_mit_umstieg():
+    def zeit(stunde, minute):
+        return datetime(2025, 4, 15, stunde, minute)
+
+    return baue_routendetails([
+        ("A", "B", "1", zeit(8, 0), zeit(8, 30), ("1", "B", None, None, "ICE", 1, 4.0, 4.0)),
+        ("B", "C", "2", zeit(8, 37), zeit(9, 0), ("2", "C", None, None, "RE", 1, 2.0, 2.0)),
+    ])
+
+
+def test_bewerte_routen_umstieg_wie_geschlossene_formel():
+    route = route_mit_umstieg()
+    ergebnis = bewerte_routen([route], anzahl=20000, korrelation=0.0, seed=1)[0]
+
+    # Ohne Korrelation entspricht das Risiko des Umstiegs der geschlossenen Formel
+    erreicht = anschlusswahrscheinlichkeit(verspaetungsparameter(4.0), verspaetungsparameter(2.0), 7)
+    umstieg = ergebnis["umstiege"][0]
+    assert umstieg["umsteigeort"] == "B"
+    assert abs(umstieg["verpasst_wahrscheinlichkeit"] - (1 - erreicht) * 100) < 1.0
+    assert ergebnis["anschluss_verpasst_wahrscheinlichkeit"] == umstieg["verpasst_wahrscheinlichkeit"]
+    assert abs(sum(ergebnis["ankunftsverspaetung"].values()) - 100) < 0.1
+
+    # Gleicher Seed, gleiches Ergebnis; die Abschnitte der Route bleiben unverändert
+    assert bewerte_routen([route], anzahl=20000, korrelation=0.0, seed=1)[0] == ergebnis
+    assert all("zuverlaessigkeit" not in abschnitt for abschnitt in route)
@@ -0,0 +1,307 @@
+import bisect
+import pickle
+import os
+import sys
+import time
+from array import array
+from collections import defaultdict
+from datetime import datetime
+from routen_berechnung import (reconstruct_route_details, kompilierter_fahrplan_fuer, load_station_departures_pickle,
+                               KEIN_LABEL, LABEL_FELDER)
+from routen_berechnung_raptor import raptor_runden, rekonstruiere_raptor_route
+from fahrplan import erstelle_linienmuster, datetime_in_minuten, MINUTEN_PRO_TAG
+
+
+# Umstiegsmuster (transfer patterns) für häufig angefragte Verbindungen zwischen großen Bahnhöfen (Hubs):
+# Offline wird für jedes Hub-Paar die Menge der Umstiegsfolgen (Start, Umstiegsbahnhöfe..., Ziel) aller
+# Pareto-optimalen Verbindungen eines ganzen Tages bestimmt. Eine Anfrage wertet nur diese wenigen Folgen aus:
+# je Abschnitt wird in einer Tabelle der direkten Zugfahrten (ohne Umstieg) per binärer Suche nachgeschlagen.
+
+
+# Maximale Haltezeit (Minuten), bis zu der ein Zug beim Weiterverfolgen noch als dieselbe Fahrt gilt
+MAX_HALTEZEIT = 120
+
+
+# wählt die `anzahl` Bahnhöfe mit den meisten Abfahrten als Hubs
+def waehle_hubs(station_departures, anzahl=30):
+    return sorted(station_departures, key=lambda station: len(station_departures[station]), reverse=True)[:anzahl]
+
+
+# Umstiegsfolge einer Route: Start, alle Bahnhöfe mit Zugwechsel und Ziel (Abschnitte im Format von baue_routendetails)
+def umstiegsfolge(abschnitte):
+    folge = [abschnitte[0][0]]
+    for idx in range(len(abschnitte) - 1):
+        if abschnitte[idx + 1][2] != abschnitte[idx][2]:
+            folge.append(abschnitte[idx][1])
+    folge.append(abschnitte[-1][1])
+    return tuple(folge)
+
+
+"""
+berechnet die Umstiegsmuster für alle Paare aus `hubs`. Je Start-Hub wird eine Profilsuche (rRAPTOR) über alle
+Abfahrten eines Tages ausgeführt, die späteste Abfahrt zuerst; nach jedem Lauf wird für jeden Ziel-Hub jede
+Runde, in der sich die Ankunft verbessert hat, rekonstruiert und ihre Umstiegsfolge gespeichert.
+Ergebnis: {"hubs": [...], "muster": {(start, ziel): [Umstiegsfolge, ...]}} mit Bahnhofsnamen.
+"""
+
+def erstelle_umstiegsmuster(station_departures, hubs, min_transfer_minutes=5, max_umstiege=6, linienmuster=None):
+    start_time = time.time()
+    if linienmuster is None:
+        linienmuster = erstelle_linienmuster(station_departures)
+
+    muster = defaultdict(set)
+    ziele = [hub for hub in hubs if hub in linienmuster["muster_pro_halt"]]
+    for source in ziele:
+
+        # Alle Abfahrtszeiten des Start-Hubs an einem Tag
+        abfahrtszeiten = set()
+        for muster_id, pos in linienmuster["muster_pro_halt"][source]:
+            linie = linienmuster["muster"][muster_id]
+            if pos == len(linie["halte"]) - 1:
+                continue
+            for abfahrt in linie["abfahrt_pro_halt"][pos]:
+                if 0 <= abfahrt < MINUTEN_PRO_TAG:
+                    abfahrtszeiten.add(abfahrt)
+
+        # Profilsuche ohne Ziel (alle Bahnhöfe); der Zustand wird zwischen den Läufen weitergegeben
+        zustand = {"tau": [{}], "labels": [{}]}
+        for abfahrt in sorted(abfahrtszeiten, reverse=True):
+            vorher = {ziel: [runde.get(ziel) for runde in zustand["tau"]] for ziel in ziele}
+            raptor_runden(
+                linienmuster, source, None, abfahrt,
+                min_transfer_minutes=min_transfer_minutes,
+                max_initial_wait_hours=0,
+                max_umstiege=max_umstiege,
+                zustand=zustand
+            )
+
+            for ziel in ziele:
+                if ziel == source:
+                    continue
+                for k in range(1, len(zustand["labels"])):
+                    if ziel in zustand["labels"][k] and (k >= len(vorher[ziel]) or zustand["tau"][k][ziel] != vorher[ziel][k]):
+                        abschnitte = rekonstruiere_raptor_route(
+                            linienmuster, zustand["labels"], source, ziel, k, datetime.today().date()
+                        )
+                        muster[(source, ziel)].add(umstiegsfolge(abschnitte))
+
+    print(f"✅ Umstiegsmuster für {len(muster)} Hub-Paare in {time.time() - start_time:.2f} Sekunden berechnet")
+    return {"hubs": list(hubs), "muster": {paar: sorted(folgen) for paar, folgen in muster.items()}}
+
+
+def load_umstiegsmuster_pickle(filename="umstiegsmuster.pkl"):
+    if os.path.exists(filename):
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+    return None
+
+
+def save_umstiegsmuster_pickle(data, filename="umstiegsmuster.pkl"):
+    with open(filename, "wb") as f:
+        pickle.dump(data, f)
+    print(f"Umstiegsmuster wurden als Pickle-Datei gespeichert: {filename}")
+
+
+"""
+liefert die Tabelle der direkten Zugfahrten von `von` nach `nach` (ohne Umstieg) aus dem kompilierten Fahrplan:
+(abfahrten, ankuenfte, fahrten), nach Abfahrt sortiert, mit allen Fahrten eines Tages (Abfahrt < 24:00).
+Eine Fahrt ist die Folge der Verbindungsindizes, über die der Zug von `von` nach `nach` fährt; die Zeiten
+gelten für den ersten Tag und werden für spätere Tage um ein Vielfaches von 24 Stunden verschoben.
+Die Tabellen werden bei der ersten Verwendung erstellt und in `cache` gemerkt.
+"""
+
+def direktverbindungen(kompilierter_fahrplan, cache, von, nach):
+    if (von, nach) in cache:
+        return cache[(von, nach)]
+
+    offsets = kompilierter_fahrplan["offsets"]
+    abfahrten = kompilierter_fahrplan["abfahrt"]
+    ankuenfte = kompilierter_fahrplan["ankunft"]
+    zuege = kompilierter_fahrplan["zug"]
+    ziele = kompilierter_fahrplan["ziel"]
+
+    tabelle = ([], [], [])
+    for i in range(offsets[von], offsets[von + 1]):
+        if abfahrten[i] >= MINUTEN_PRO_TAG:
+            break
+
+        # Dem Zug von Halt zu Halt folgen, bis er `nach` erreicht oder endet
+        fahrt = [i]
+        j = i
+        while ziele[j] != nach and len(fahrt) < len(kompilierter_fahrplan["stationen"]):
+            station = ziele[j]
+            k = bisect.bisect_left(abfahrten, ankuenfte[j], offsets[station], offsets[station + 1])
+            while k < offsets[station + 1] and abfahrten[k] <= ankuenfte[j] + MAX_HALTEZEIT and zuege[k] != zuege[j]:
+                k += 1
+            if k == offsets[station + 1] or zuege[k] != zuege[j] or abfahrten[k] > ankuenfte[j] + MAX_HALTEZEIT:
+                break
+            fahrt.append(k)
+            j = k
+
+        if ziele[j] == nach:
+            tabelle[0].append(abfahrten[i])
+            tabelle[1].append(ankuenfte[j])
+            tabelle[2].append(tuple(fahrt))
+
+    cache[(von, nach)] = tabelle
+    return tabelle
+
+
+# sucht in einer Tabelle direkter Fahrten die früheste Ankunft für eine Abfahrt zwischen `ab` und `bis` (Minuten);
+# gibt (ankunft, abfahrt, fahrt, tagesbeginn) oder None zurück, bei gleicher Ankunft gewinnt die spätere Abfahrt
+def frueheste_fahrt(tabelle, ab, bis):
+    abfahrten, ankuenfte, fahrten = tabelle
+    beste = None
+    for tag in range(ab // MINUTEN_PRO_TAG, bis // MINUTEN_PRO_TAG + 1):
+        tagesbeginn = tag * MINUTEN_PRO_TAG
+        for idx in range(bisect.bisect_left(abfahrten, ab - tagesbeginn), len(abfahrten)):
+            if abfahrten[idx] + tagesbeginn > bis:
+                break
+            kandidat = (ankuenfte[idx] + tagesbeginn, abfahrten[idx] + tagesbeginn, fahrten[idx], tagesbeginn)
+            if beste is None or kandidat[0] < beste[0] or (kandidat[0] == beste[0] and kandidat[1] > beste[1]):
+                beste = kandidat
+    return beste
+
+
+"""
+wertet eine Umstiegsfolge (Bahnhofs-IDs) ab `start_minuten` aus: je Abschnitt die direkte Fahrt mit der
+frühesten Ankunft unter Einhaltung von Mindestumstiegszeit und maximaler Wartezeit.
+Gibt (abfahrt, ankunft, [(fahrt, tagesbeginn), ...]) oder None zurück.
+"""
+
+def werte_umstiegsfolge_aus(kompilierter_fahrplan, cache, folge, start_minuten, min_transfer_minutes,
+                            max_initial_wait, max_transfer_wait):
+    zeit = start_minuten
+    abschnitte = []
+    for idx in range(len(folge) - 1):
+        if idx == 0:
+            ab, bis = zeit, zeit + max_initial_wait
+        else:
+            ab, bis = zeit + min_transfer_minutes, zeit + max_transfer_wait
+        treffer = frueheste_fahrt(direktverbindungen(kompilierter_fahrplan, cache, folge[idx], folge[idx + 1]), ab, bis)
+        if treffer is None:
+            return None
+        ankunft, abfahrt, fahrt, tagesbeginn = treffer
+        if idx == 0:
+            erste_abfahrt = abfahrt
+        abschnitte.append((fahrt, tagesbeginn))
+        zeit = ankunft
+    return erste_abfahrt, zeit, abschnitte
+
+
+# schreibt die Abschnitte einer ausgewerteten Umstiegsfolge als Labels (siehe reconstruct_route_details);
+# gibt das Label-Array und das letzte Label zurück
+def umstiegsfolge_als_labels(kompilierter_fahrplan, folge, abschnitte):
+    ziele = kompilierter_fahrplan["ziel"]
+    labels = array("i")
+    label = KEIN_LABEL
+    erster_zug = kompilierter_fahrplan["zug"][abschnitte[0][0][0]]
+    for (fahrt, tagesbeginn), von in zip(abschnitte, folge):
+        for i in fahrt:
+            labels.extend((
+                label, von, ziele[i],
+                kompilierter_fahrplan["abfahrt"][i] + tagesbeginn, kompilierter_fahrplan["ankunft"][i] + tagesbeginn,
+                kompilierter_fahrplan["zug"][i], kompilierter_fahrplan["info"][i], erster_zug
+            ))
+            label = len(labels) // LABEL_FELDER - 1
+            von = ziele[i]
+    return labels, label
+
+
+"""
+Berechnet (bis zu) `anzahl_routen` Verbindungen zwischen zwei Hubs über die vorberechneten Umstiegsmuster.
+Wie bei routenplanung_csa wird nach jeder gefundenen Verbindung ab einer Minute nach deren Abfahrt weitergesucht;
+je Abfahrt gewinnt die Umstiegsfolge mit der frühesten Ankunft (bei Gleichstand weniger Umstiege).
+Gibt None zurück, wenn für das Paar keine Umstiegsmuster vorliegen (der Aufrufer sucht dann mit routenplanung).
+status["partial"] wird wie bei routenplanung gesetzt, wenn das Zeitlimit die Suche abbricht.
+"""
+
+def routenplanung_muster(source, target, station_departures, departure_time, min_transfer_minutes=5,
+                         max_initial_wait_hours=6, max_transfer_wait_hours=2, travel_date=None,
+                         anzahl_routen=4, umstiegsmuster=None, kompilierter_fahrplan=None, direktverbindungen_cache=None,
+                         max_duration_seconds=5, status=None):
+
+    start_time_total = time.time()
+    deadline_time = start_time_total + max_duration_seconds
+    if status is None:
+        status = {}
+    status["partial"] = False
+
+    if travel_date is None:
+        travel_date = datetime.today().date()
+
+    if umstiegsmuster is None or (source, target) not in umstiegsmuster["muster"]:
+        print(f"\n⚠️ Keine Umstiegsmuster für {source} → {target}")
+        return None
+
+    if kompilierter_fahrplan is None:
+        kompilierter_fahrplan = kompilierter_fahrplan_fuer(station_departures)
+    if direktverbindungen_cache is None:
+        direktverbindungen_cache = {}
+
+    # Umstiegsfolgen in Bahnhofs-IDs (Folgen mit unbekannten Bahnhöfen entfallen)
+    station_id = kompilierter_fahrplan["station_id"]
+    folgen = [
+        tuple(station_id[station] for station in folge)
+        for folge in umstiegsmuster["muster"][(source, target)]
+        if all(station in station_id for station in folge)
+    ]
+
+    start_minuten = datetime_in_minuten(departure_time, travel_date)
+    letzte_abfahrt = start_minuten + max_initial_wait_hours * 60
+
+    gefundene_routen = []
+    while len(gefundene_routen) < anzahl_routen and start_minuten <= letzte_abfahrt:
+        if time.time() > deadline_time:
+            status["partial"] = True
+            break
+        beste = None
+        for folge in folgen:
+            ergebnis = werte_umstiegsfolge_aus(
+                kompilierter_fahrplan, direktverbindungen_cache, folge, start_minuten, min_transfer_minutes,
+                letzte_abfahrt - start_minuten, max_transfer_wait_hours * 60
+            )
+            if ergebnis is None:
+                continue
+            abfahrt, ankunft, abschnitte = ergebnis
+            if beste is None or (ankunft, len(folge), -abfahrt) < (beste[1], len(beste[3]), -beste[0]):
+                beste = (abfahrt, ankunft, abschnitte, folge)
+        if beste is None:
+            break
+
+        # Spätere Abfahrt mit gleicher Ankunft ersetzt die vorherige Route (diese ist dominiert)
+        if gefundene_routen and gefundene_routen[-1][1] == beste[1]:
+            gefundene_routen[-1] = beste
+        else:
+            gefundene_routen.append(beste)
+
+        start_minuten = beste[0] + 1
+
+    if not gefundene_routen:
+        print("\n❌ Keine Verbindung gefunden!")
+        return None
+
+    detailed_routes = []
+    for abfahrt, ankunft, abschnitte, folge in gefundene_routen:
+        labels, label = umstiegsfolge_als_labels(kompilierter_fahrplan, folge, abschnitte)
+        detailed_routes.append(reconstruct_route_details(labels, label, kompilierter_fahrplan, travel_date))
+
+    print(f"\n✅ Gesamtdauer der Routenplanung (Umstiegsmuster): {time.time() - start_time_total:.2f} Sekunden")
+    if status["partial"]:
+        print(f"⏱️ Zeitlimit von {max_duration_seconds} Sekunden erreicht, Ergebnis ist unvollständig.")
+    return detailed_routes
+
+
+if __name__ == "__main__":
+
+    # Umstiegsmuster für die `anzahl` größten Bahnhöfe offline berechnen und neben dem Fahrplan speichern
+    # (python umstiegsmuster.py 30 fahrplaene/<version>/station_departure.pkl)
+    anzahl = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    pfad_pkl = sys.argv[2] if len(sys.argv) > 2 else "station_departure.pkl"
+    station_departures = load_station_departures_pickle(pfad_pkl)
+    if station_departures is None:
+        print(f"❌ {pfad_pkl} fehlt.")
+        sys.exit(1)
+
+    umstiegsmuster = erstelle_umstiegsmuster(station_departures, waehle_hubs(station_departures, anzahl))
+    save_umstiegsmuster_pickle(umstiegsmuster, os.path.join(os.path.dirname(pfad_pkl), "umstiegsmuster.pkl"))
@@ -0,0 +1,216 @@
+import numpy as np
+
+
+# Zuverlässigkeit von Routen per Monte-Carlo-Simulation:
+# Für jede Fahrt einer Route (Abschnitte desselben Zuges zwischen zwei Umstiegen) wird die Verspätung aus einer
+# Verteilung je Abschnitt gezogen – aus category_probabilities, falls die Prognose vorliegt, sonst aus den
+# Durchschnittswerten train_avg_30 / station_avg_30. Tausende Reisen werden gleichzeitig mit numpy simuliert;
+# ein gemeinsamer Zufallsanteil je simulierter Reise bildet ab, dass Verspätungen an einem Tag zusammenhängen.
+# Alle Routen einer Anfrage werden mit denselben simulierten Tagen bewertet und sind damit direkt vergleichbar.
+
+# Anzahl simulierter Reisen je Bewertung
+ANZAHL_SIMULATIONEN = 2000
+
+# Anteil der Abschnitte, deren Verspätung dem gemeinsamen Tageszustand folgt (0 = unabhängig, 1 = vollständig)
+KORRELATION = 0.3
+
+# Größte simulierte Verspätung in Minuten (der Rest der Verteilung wird hier zusammengefasst)
+MAX_VERSPAETUNG_MINUTEN = 180
+
+# Mittlere Verspätung, wenn zu einem Abschnitt weder Prognose noch Durchschnittswerte vorliegen
+STANDARD_VERSPAETUNG_MINUTEN = 3.0
+
+# Mittlere Verspätung über 30 Minuten hinaus in der Kategorie "30+ min"
+VERSPAETUNG_30_PLUS_MITTEL_MINUTEN = 15.0
+
+# Ankunft gilt bis zu dieser Verspätung als pünktlich (wie in berechne_gesamtverspaetungswahrscheinlichkeit)
+PUENKTLICH_BIS_MINUTEN = 19
+
+# Verspätungskategorien der Prognose mit ihren Minutenbereichen (jeweils einschließlich)
+KATEGORIEN = (
+    ("On time", 0, 0),
+    ("1-9 min", 1, 9),
+    ("10-19 min", 10, 19),
+    ("20-29 min", 20, 29),
+    ("30+ min", 30, MAX_VERSPAETUNG_MINUTEN),
+)
+
+
+# mittlere Verspätung aus train_avg_30 und station_avg_30 (Mittel der vorhandenen Werte, None/NaN fehlen)
+def mittel_aus_durchschnitten(train_avg_30, station_avg_30):
+    werte = [float(wert) for wert in (train_avg_30, station_avg_30) if wert is not None and not np.isnan(float(wert))]
+    if not werte:
+        return STANDARD_VERSPAETUNG_MINUTEN
+    return max(sum(werte) / len(werte), 0.0)
+
+
+# mittlere Verspätung eines Abschnitts (Routeneintrag)
+def mittlere_verspaetung(abschnitt):
+    return mittel_aus_durchschnitten(abschnitt.get("train_avg_30"), abschnitt.get("station_avg_30"))
+
+
+# Parameter q der geometrischen Verspätungsverteilung P(k) = (1 - q) q^k mit Mittelwert `mittel`
+def verspaetungsparameter(mittel):
+    return mittel / (1.0 + mittel)
+
+
+"""
+Wahrscheinlichkeit, einen Umstieg zu schaffen, im Modell von bewerte_routen ohne Korrelation: Ankunfts- (X) und
+Abfahrtsverspätung (Y) geometrisch verteilt mit den Parametern `q_ankunft` und `q_abfahrt`; verpasst, wenn
+X - Y >= umsteigezeit_minuten. Geschlossen berechnet, z.B. für die Bewertung von Umstiegen während der Suche.
+"""
+
+def anschlusswahrscheinlichkeit(q_ankunft, q_abfahrt, umsteigezeit_minuten):
+    t = int(umsteigezeit_minuten)
+    nenner = 1.0 - q_ankunft * q_abfahrt
+    if t >= 1:
+        # P(X - Y >= t) = q_ankunft^t (1 - q_abfahrt) / (1 - q_ankunft q_abfahrt)
+        return 1.0 - q_ankunft ** t * (1.0 - q_abfahrt) / nenner
+    # P(X - Y < t) = P(Y - X >= 1 - t)
+    return q_abfahrt ** (1 - t) * (1.0 - q_ankunft) / nenner
+
+
+"""
+erstellt die Verspätungsverteilungen (ganze Minuten 0..MAX_VERSPAETUNG_MINUTEN) für eine Liste von Abschnitten.
+Ohne Prognose ist die Verspätung geometrisch verteilt, P(k) = (1 - q) q^k, mit der mittleren Verspätung
+q / (1 - q) aus train_avg_30 / station_avg_30. Mit category_probabilities wird jede Kategorie gleichmäßig auf
+ihren Minutenbereich verteilt ("30+ min" mit geometrisch abfallendem Ende).
+Gibt (q je Abschnitt, {Abschnittsindex: kumulierte Verteilung} für die Abschnitte mit Prognose) zurück.
+"""
+
+def verspaetungsverteilungen(abschnitte):
+    mittel = np.array([mittlere_verspaetung(abschnitt) for abschnitt in abschnitte])
+    q = mittel / (1.0 + mittel)
+
+    q_ende = VERSPAETUNG_30_PLUS_MITTEL_MINUTEN / (1.0 + VERSPAETUNG_30_PLUS_MITTEL_MINUTEN)
+    kategorien_cdf = {}
+    for zeile, abschnitt in enumerate(abschnitte):
+        category_probabilities = abschnitt.get("category_probabilities")
+        if not category_probabilities:
+            continue
+        dichte = np.zeros(MAX_VERSPAETUNG_MINUTEN + 1)
+        for kategorie, von, bis in KATEGORIEN:
+            anteil = category_probabilities.get(kategorie, 0)
+            if kategorie == "30+ min":
+                gewichte = q_ende ** np.arange(bis - von + 1)
+            else:
+                gewichte = np.ones(bis - von + 1)
+            dichte[von:bis + 1] += anteil * gewichte / gewichte.sum()
+        if dichte.sum() > 0:
+            cdf = np.cumsum(dichte) / dichte.sum()
+            cdf[-1] = 1.0
+            kategorien_cdf[zeile] = cdf
+
+    return q, kategorien_cdf
+
+
+"""
+zieht `anzahl` Verspätungen je Abschnitt (Matrix [Simulation, Abschnitt], ganze Minuten) aus den Verteilungen
+von verspaetungsverteilungen. Jeder Wert folgt mit Wahrscheinlichkeit `korrelation` dem gemeinsamen Zufallswert
+seiner Simulation, sonst einem eigenen (Inversionsmethode).
+"""
+
+def ziehe_verspaetungen(q, kategorien_cdf, anzahl, korrelation=KORRELATION, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+
+    zufall = rng.random((anzahl, len(q)))
+    gemeinsam = rng.random((anzahl, 1))
+    np.copyto(zufall, gemeinsam, where=rng.random((anzahl, len(q))) < korrelation)
+
+    # Geometrische Verteilung geschlossen invertiert: k = floor(log(1 - u) / log(q)); q = 0 heißt immer pünktlich
+    with np.errstate(divide="ignore"):
+        log_q = np.log(q)
+    verspaetungen = np.floor(np.log1p(-zufall) / np.where(log_q < 0, log_q, -np.inf))
+    verspaetungen = np.minimum(verspaetungen, MAX_VERSPAETUNG_MINUTEN).astype(np.int64)
+
+    # Abschnitte mit Prognose über ihre kumulierte Verteilung
+    for zeile, cdf in kategorien_cdf.items():
+        verspaetungen[:, zeile] = np.searchsorted(cdf, zufall[:, zeile], side="right")
+    return verspaetungen
+
+
+# teilt eine Route an ihren Umstiegen (Abschnitte mit umsteigezeit_minuten) in Fahrten auf:
+# Liste von (erster Abschnitt, letzter Abschnitt) je Fahrt
+def fahrten_der_route(route):
+    fahrten = []
+    erster = 0
+    for idx, abschnitt in enumerate(route):
+        if abschnitt.get("umsteigezeit_minuten") is not None or idx == len(route) - 1:
+            fahrten.append((erster, idx))
+            erster = idx + 1
+    return fahrten
+
+
+# Anteil in Prozent (gerundet, als Python-float für JSON)
+def prozent(anteil):
+    return round(float(anteil) * 100, 2)
+
+
+"""
+bewertet alle Routen einer Anfrage mit `anzahl` simulierten Reisen (gemeinsame Ziehung für alle Routen).
+Modell je Route:
+- Ankunftsverspätung einer Fahrt = Verspätung ihres letzten Abschnitts,
+- Abfahrtsverspätung des Anschlusszugs ≈ Verspätung seines ersten Abschnitts,
+- ein Umstieg wird verpasst, wenn Ankunftsverspätung - Abfahrtsverspätung >= umsteigezeit_minuten;
+  nach einem verpassten Umstieg endet die simulierte Reise.
+Gibt je Route ein Dictionary zurück mit der Wahrscheinlichkeit pünktlich anzukommen (alle Umstiege erreicht und
+höchstens PUENKTLICH_BIS_MINUTEN Verspätung), dem Risiko je Umstieg (verpasst, falls er erreicht wird), der
+Verteilung der Ankunftsverspätung nach Kategorien und deren Median / 90%-Quantil (None, wenn das Quantil in die
+verpassten Anschlüsse fällt). Alle Wahrscheinlichkeiten in Prozent.
+"""
+
+def bewerte_routen(routes, anzahl=ANZAHL_SIMULATIONEN, korrelation=KORRELATION, seed=0):
+    # Benötigte Abschnitte aller Routen in einer gemeinsamen Matrix: je Fahrt (Spalte des ersten Abschnitts,
+    # Spalte des letzten Abschnitts, letzter Abschnitt); die Abfahrt der ersten Fahrt wird nicht gebraucht
+    abschnitte = []
+    spalten_je_route = []
+    for route in routes:
+        spalten = []
+        for erster, letzter in fahrten_der_route(route):
+            anfang = None
+            if spalten:
+                anfang = len(abschnitte)
+                abschnitte.append(route[erster])
+            spalten.append((anfang, len(abschnitte), route[letzter]))
+            abschnitte.append(route[letzter])
+        spalten_je_route.append(spalten)
+
+    q, kategorien_cdf = verspaetungsverteilungen(abschnitte)
+    verspaetungen = ziehe_verspaetungen(q, kategorien_cdf, anzahl, korrelation, np.random.default_rng(seed))
+
+    ergebnisse = []
+    for spalten in spalten_je_route:
+        erreicht = np.ones(anzahl, dtype=bool)
+        umstiege = []
+        for (_anfang, ende, umstieg), (anschluss_anfang, _ende, _letzter) in zip(spalten, spalten[1:]):
+            puffer = verspaetungen[:, ende] - verspaetungen[:, anschluss_anfang]
+            verpasst = erreicht & (puffer >= umstieg["umsteigezeit_minuten"])
+            anzahl_erreicht = int(erreicht.sum())
+            umstiege.append({
+                "umsteigeort": umstieg["umsteigeort"],
+                "umsteigezeit_minuten": umstieg["umsteigezeit_minuten"],
+                "verpasst_wahrscheinlichkeit": prozent(verpasst.sum() / anzahl_erreicht) if anzahl_erreicht else None
+            })
+            erreicht &= ~verpasst
+
+        # Ankunftsverspätung am Ziel; verpasste Anschlüsse zählen als unendlich verspätet
+        ankunft = np.where(erreicht, verspaetungen[:, spalten[-1][1]], np.inf)
+        verteilung = {
+            kategorie: prozent(np.mean((ankunft >= von) & (ankunft <= bis)))
+            for kategorie, von, bis in KATEGORIEN
+        }
+        verteilung["Anschluss verpasst"] = prozent(np.mean(~erreicht))
+        median, p90 = np.quantile(ankunft, [0.5, 0.9], method="inverted_cdf")
+
+        ergebnisse.append({
+            "simulationen": anzahl,
+            "puenktlichkeitswahrscheinlichkeit": prozent(np.mean(ankunft <= PUENKTLICH_BIS_MINUTEN)),
+            "anschluss_verpasst_wahrscheinlichkeit": verteilung["Anschluss verpasst"],
+            "umstiege": umstiege,
+            "ankunftsverspaetung": verteilung,
+            "ankunftsverspaetung_median_minuten": None if np.isinf(median) else int(median),
+            "ankunftsverspaetung_p90_minuten": None if np.isinf(p90) else int(p90),
+        })
+
+    return ergebnisse